@@ -0,0 +1,286 @@
+"""
+Streaming aggregation of the daily statistics of many runs.
+
+The runs of an ensemble are added one at a time (as they finish or while reading a results file),
+for every statistic and every day the aggregate keeps:
+    - the number of runs, the mean and the sum of squared deviations (Welford's online algorithm)
+    - a P² sketch of each quantile (Jain and Chlamtac, 1985): 5 markers per day, whatever the number of runs
+so the memory depends on the number of days, not on the number of runs, and a results file is read only once
+even when it holds several configurations to compare.
+
+Runs end at different days, and averaging only the runs still going would show the survivors alone:
+    - an extinct run keeps its final state (0 for the extinct species) up to the horizon of the run
+    - a run stopped by its timeout contributes only the days it simulated, the days left by too many of
+      the runs (less than MIN_COVERAGE of them) are not shown
+    - a run without statistics (error, killed) is counted in the status only
+
+Usage (from the project folder):
+    python aggregate.py sweeps/growing.jsonl --by GROWING --save growing.png
+"""
+
+import argparse
+import json
+import numpy as np
+from world import STATISTICS
+
+QUANTILES = (0.05, 0.5, 0.95)
+
+MIN_COVERAGE = 0.5 # fraction of the runs a day needs to be shown
+
+Z_SCORES = {0.9: 1.645, 0.95: 1.96, 0.99: 2.576} # normal approximation of the confidence interval of the mean
+
+def _grow(array:np.ndarray, size:int) -> np.ndarray:
+    """array with at least size rows, doubling its capacity"""
+    if size <= len(array):
+        return array
+    capacity = max(size, 2 * len(array))
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+class P2Quantile():
+    """
+    P² estimate of the p-quantile of the values of every day.
+    The first 5 values of a day are kept, then 5 markers (heights and positions) are adjusted at every new value
+    """
+
+    def __init__(self, p:float, capacity:int = 64):
+        if not 0 < p < 1:
+            raise ValueError(f"p must be between 0 and 1, received {p}")
+        self.p = p
+        self.increments = np.array([0, p / 2, p, (1 + p) / 2, 1])
+        self.initialDesired = np.array([1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5])
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.heights = np.zeros((capacity, 5))
+        self.positions = np.tile(np.arange(1.0, 6.0), (capacity, 1))
+        self.desired = np.tile(self.initialDesired, (capacity, 1))
+
+    def _reserve(self, size:int):
+        previous = len(self.count)
+        if size <= previous:
+            return
+        self.count = _grow(self.count, size)
+        self.heights = _grow(self.heights, size)
+        self.positions = _grow(self.positions, size)
+        self.desired = _grow(self.desired, size)
+        self.positions[previous:] = np.arange(1.0, 6.0)
+        self.desired[previous:] = self.initialDesired
+
+    def update(self, days:np.ndarray, values:np.ndarray):
+        """add one value to each of the given days"""
+        self._reserve(int(days.max()) + 1 if len(days) else 0)
+        count = self.count[days]
+
+        filling = count < 5 # the first values of a day are stored as they are
+        if filling.any():
+            d = days[filling]
+            self.heights[d, count[filling]] = values[filling]
+            self.count[d] += 1
+            full = d[self.count[d] == 5]
+            self.heights[full] = np.sort(self.heights[full], axis=1)
+
+        d, x = days[~filling], values[~filling]
+        if len(d) == 0:
+            return
+        self.count[d] += 1
+        q, n, nd = self.heights[d], self.positions[d], self.desired[d]
+        q[:, 0] = np.minimum(q[:, 0], x)
+        q[:, 4] = np.maximum(q[:, 4], x)
+        k = (x[:, None] >= q[:, 1:4]).sum(axis=1) # cell of the new value
+        n += np.arange(5) > k[:, None]
+        nd += self.increments
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for i in (1, 2, 3):
+                delta = nd[:, i] - n[:, i]
+                move = ((delta >= 1) & (n[:, i + 1] - n[:, i] > 1)) | ((delta <= -1) & (n[:, i - 1] - n[:, i] < -1))
+                if not move.any():
+                    continue
+                s = np.sign(delta)
+                parabolic = q[:, i] + s / (n[:, i + 1] - n[:, i - 1]) * (
+                    (n[:, i] - n[:, i - 1] + s) * (q[:, i + 1] - q[:, i]) / (n[:, i + 1] - n[:, i])
+                    + (n[:, i + 1] - n[:, i] - s) * (q[:, i] - q[:, i - 1]) / (n[:, i] - n[:, i - 1]))
+                neighbor = np.where(s > 0, i + 1, i - 1)
+                rows = np.arange(len(d))
+                linear = q[:, i] + s * (q[rows, neighbor] - q[:, i]) / (n[rows, neighbor] - n[:, i])
+                height = np.where((q[:, i - 1] < parabolic) & (parabolic < q[:, i + 1]), parabolic, linear)
+                q[:, i] = np.where(move, height, q[:, i])
+                n[:, i] += np.where(move, s, 0)
+
+        self.heights[d], self.positions[d], self.desired[d] = q, n, nd
+
+    def estimate(self, size:int) -> np.ndarray:
+        """estimated quantile of the first size days, nan for the days without values"""
+        self._reserve(size)
+        estimate = self.heights[:size, 2].copy()
+        for day in np.flatnonzero(self.count[:size] < 5): # exact on the few stored values
+            count = self.count[day]
+            estimate[day] = np.quantile(self.heights[day, :count], self.p) if count else np.nan
+        return estimate
+
+class SeriesAggregate():
+    """Mean, variance and quantiles of a statistic, day by day, over the runs added so far"""
+
+    def __init__(self, quantiles:tuple = QUANTILES, capacity:int = 64):
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.mean = np.zeros(capacity)
+        self.m2 = np.zeros(capacity) # sum of the squared deviations from the mean
+        self.quantiles = {p: P2Quantile(p, capacity) for p in quantiles}
+        self.size = 0 # days with at least one value
+
+    def update(self, days:np.ndarray, values:np.ndarray):
+        """add the values of a run, one per day"""
+        if len(days) == 0:
+            return
+        self.size = max(self.size, int(days.max()) + 1)
+        self.count = _grow(self.count, self.size)
+        self.mean = _grow(self.mean, self.size)
+        self.m2 = _grow(self.m2, self.size)
+        self.count[days] += 1
+        delta = values - self.mean[days]
+        self.mean[days] += delta / self.count[days]
+        self.m2[days] += delta * (values - self.mean[days])
+        for sketch in self.quantiles.values():
+            sketch.update(days, values)
+
+    def getCount(self) -> np.ndarray:
+        return self.count[:self.size]
+
+    def getMean(self) -> np.ndarray:
+        return np.where(self.getCount() > 0, self.mean[:self.size], np.nan)
+
+    def getVariance(self) -> np.ndarray:
+        """sample variance, nan for the days with less than two runs"""
+        count = self.getCount()
+        out = np.full(self.size, np.nan)
+        np.divide(self.m2[:self.size], count - 1, out=out, where=count > 1)
+        return out
+
+    def getConfidence(self, level:float = 0.95) -> tuple[np.ndarray, np.ndarray]:
+        """confidence interval of the mean of every day"""
+        halfWidth = Z_SCORES[level] * np.sqrt(self.getVariance() / np.maximum(self.getCount(), 1))
+        mean = self.getMean()
+        return mean - halfWidth, mean + halfWidth
+
+    def getQuantile(self, p:float) -> np.ndarray:
+        return self.quantiles[p].estimate(self.size)
+
+class EnsembleAggregate():
+    """Aggregates of every statistic over the runs of a configuration"""
+
+    def __init__(self, statistics:list[str] = STATISTICS, quantiles:tuple = QUANTILES):
+        self.series = {name: SeriesAggregate(quantiles) for name in statistics}
+        self.runs = 0 # runs with statistics
+        self.status = {} # status -> number of runs, with or without statistics
+
+    def add(self, run:dict):
+        """add a run of a results file (see ensemble.py), an extinct run is extended to its horizon with its final values"""
+        self.status[run["status"]] = self.status.get(run["status"], 0) + 1
+        statistics = run.get("statistics")
+        if not statistics:
+            return
+        days = np.asarray(statistics["day"], dtype=np.int64)
+        valid = days >= 0
+        days = days[valid]
+        if len(days) == 0:
+            return
+        self.runs += 1
+        last = int(days.max())
+        padding = np.arange(last + 1, run.get("horizon", 0)) if run["status"] == "extinct" else np.arange(0)
+        for name, series in self.series.items():
+            values = np.asarray(statistics[name], dtype=np.float64)[valid]
+            series.update(np.concatenate([days, padding]), np.concatenate([values, np.full(len(padding), values[days == last][-1])]))
+
+    def getCoverage(self) -> np.ndarray:
+        """fraction of the runs with a value on every day"""
+        return next(iter(self.series.values())).getCount() / max(self.runs, 1)
+
+    def __getitem__(self, name:str) -> SeriesAggregate:
+        return self.series[name]
+
+    def getDays(self) -> np.ndarray:
+        return np.arange(max(series.size for series in self.series.values()))
+
+def groupKey(run:dict, by:list[str] = None) -> str:
+    """label of the configuration of a run: the values of the overrides (all of them if by is None), map and seed can also be used"""
+    if by is None:
+        return json.dumps(run["overrides"], sort_keys=True)
+    return ", ".join(f"{name}={run['overrides'].get(name, run.get(name))}" for name in by)
+
+def aggregateResults(runs, by:list[str] = None, statistics:list[str] = STATISTICS, quantiles:tuple = QUANTILES) -> dict[str, EnsembleAggregate]:
+    """aggregate the runs (e.g. ensemble.loadResults(path)) by configuration in a single pass"""
+    aggregates = {}
+    for run in runs:
+        key = groupKey(run, by)
+        if key not in aggregates:
+            aggregates[key] = EnsembleAggregate(statistics, quantiles)
+        aggregates[key].add(run)
+    return aggregates
+
+PANELS = [
+    "Number of Erbasts",
+    "Number of Carvizes",
+    "Number of Herds",
+    "Number of Prides",
+    "Average Erbast Energy",
+    "Average Carviz Energy",
+    "Average Vegetob Density",
+    "Average Erbast Social Attitude",
+    "Average Carviz Social Attitude",
+] # statistics of the 3x3 figure of showEnsemble
+
+def showEnsemble(aggregates:dict[str, EnsembleAggregate], panels:list[str] = PANELS, level:float = 0.95, band:tuple = (0.05, 0.95),
+                 minCoverage:float = MIN_COVERAGE, path:str = None):
+    """
+    Figure in the style of Interface.show_stats: for every configuration the mean of the statistic,
+    its confidence interval (dark band) and the band between two quantiles of the runs (light band),
+    on the days with values from at least minCoverage of the runs.
+    The figure is saved to path if given, otherwise it is shown
+    """
+    import matplotlib.pyplot as plt
+    from interface import Interface # the colors of the interface
+
+    fig = plt.figure(figsize=(15, 12), dpi=100)
+    fig.set_facecolor(Interface.COLORS)
+    colors = [Interface.ERBAST_COLOR, Interface.CARVIZ_COLOR, Interface.HERD_COLOR, Interface.PRIDE_COLOR, Interface.FONT_COLOR]
+    for i, name in enumerate(panels):
+        ax = fig.add_subplot(3, 3, i + 1)
+        ax.grid(True, alpha=0.3)
+        for j, (label, aggregate) in enumerate(aggregates.items()):
+            series = aggregate[name]
+            days = np.arange(series.size)
+            hidden = aggregate.getCoverage()[:series.size] < minCoverage
+            shown = lambda values: np.where(hidden, np.nan, values)
+            color = colors[j % len(colors)]
+            low, high = series.getConfidence(level)
+            ax.fill_between(days, shown(series.getQuantile(band[0])), shown(series.getQuantile(band[1])), color=color, alpha=0.15, linewidth=0)
+            ax.fill_between(days, shown(low), shown(high), color=color, alpha=0.4, linewidth=0)
+            ax.plot(days, shown(series.getMean()), color=color, label=f"{label} ({aggregate.runs} runs)")
+        ax.set_title(name, fontsize=10, color=Interface.FONT_COLOR)
+        ax.set_xlabel("Days", fontsize=8, color=Interface.FONT_COLOR)
+        if i == 0:
+            ax.legend(fontsize=6)
+    fig.suptitle(f"Mean, {int(level * 100)}% confidence interval and {int(band[0] * 100)}-{int(band[1] * 100)}% quantiles of the runs",
+                 fontsize=12, color=Interface.FONT_COLOR)
+    fig.tight_layout()
+    if path is not None:
+        fig.savefig(path, facecolor=fig.get_facecolor())
+        plt.close(fig)
+    else:
+        plt.show()
+
+if __name__ == "__main__":
+    from ensemble import loadResults
+
+    parser = argparse.ArgumentParser(description="Planisuss ensemble aggregation")
+    parser.add_argument("results", help=".jsonl file written by ensemble.py")
+    parser.add_argument("--by", nargs="+", default=None, help="parameters (or map, seed) that identify a configuration, all the overrides by default")
+    parser.add_argument("--level", type=float, choices=sorted(Z_SCORES), default=0.95, help="confidence level of the mean")
+    parser.add_argument("--min-coverage", type=float, default=MIN_COVERAGE, help="fraction of the runs a day needs to be shown")
+    parser.add_argument("--save", default=None, help="image file of the figure, shown if not given")
+    args = parser.parse_args()
+
+    aggregates = aggregateResults(loadResults(args.results), by=args.by)
+    for label, aggregate in aggregates.items():
+        print(f"{label}: {aggregate.runs} runs with statistics {aggregate.status}")
+    showEnsemble(aggregates, level=args.level, minCoverage=args.min_coverage, path=args.save)
@@ -0,0 +1,384 @@
+"""
+Benchmarks of the Planisuss hot paths.
+Each benchmark compares the current implementation against the reference one and
+checks that both give the same result.
+
+Usage (from the project folder):
+    python benchmarks.py terrain --size 100 --maps 5
+    python benchmarks.py movement --days 30 --seed 0
+    python benchmarks.py votes --days 30 --seed 0
+    python benchmarks.py quorum --days 20 --seeds 3
+    python benchmarks.py relocation --days 20 --seed 0
+"""
+
+import argparse
+import copy
+import json
+import logging
+import sys
+import time
+from collections import defaultdict
+import numpy as np
+import noise
+from planisuss_constants import *
+from terrain import fbmNoiseGrid, landMask
+from world import Environment
+from creatures import Animal, SocialGroup
+from movement import ErbastBatch, CarvizBatch
+from tests.helpers import populatedEnvironment, escapeState, setEscapeState, sameState, consistentCells
+
+MAPS_FILE = "files//maps_file.json"
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def _loadMapConfigs(maxMaps = None):
+    with open(MAPS_FILE, 'r') as f:
+        configs = json.load(f)
+    names = list(configs.keys())[:maxMaps]
+    return {name: configs[name] for name in names}
+
+def fbmNoiseLoop(n, threshold = 0.2, seed = None, octaves=8, persistence=0.4, lacunarity=1.8, scale=40.0, dynamic=False):
+    """ Reference scalar implementation of WorldGrid.__fbmNoise, one noise.pnoise2 call per cell and octave """
+    grid = np.zeros((n, n))
+    center = n // 2
+    max_dist = center * np.sqrt(2)
+    for i in range(n):
+        for j in range(n):
+            x = i / scale
+            y = j / scale
+            fbm_value = 0.0
+            amplitude = 1.0
+            frequency = 1.0
+            for _ in range(octaves):
+                fbm_value += amplitude * noise.pnoise2(x * frequency, y * frequency, base = seed)
+                amplitude *= persistence
+                frequency *= lacunarity
+
+            grid[i][j] = fbm_value
+
+    min_val = np.min(grid)
+    max_val = np.max(grid)
+    grid = (grid - min_val) / (max_val - min_val)
+
+    if dynamic:
+        for i in range(n):
+            for j in range(n):
+                distance = np.sqrt((i - center) ** 2 + (j - center) ** 2)
+                distance_weight = distance / max_dist
+                dynamic_treshold = threshold + (1 - threshold) * distance_weight
+                grid[i][j] = 1 if grid[i][j] > dynamic_treshold else 0
+    else:
+        grid = np.where(grid > threshold, 1, 0)
+
+    return grid
+
+def benchmarkTerrain(size = NUMCELLS, maxMaps = None):
+    """
+    Scalar loop vs whole-grid fbm terrain generation on the map presets.
+    The land masks differ near the lattice corners the C extension hashes out of its table (see terrain.py),
+    the number of cells that differ is reported
+    """
+    print(f"Terrain generation, grid {size}x{size}")
+    print(f"{'map':<8}{'seed':>6}{'octaves':>9}{'dynamic':>9}{'loop (s)':>12}{'grid (s)':>12}{'speedup':>10}{'differing':>11}")
+    totLoop = 0
+    totGrid = 0
+    totDiffering = 0
+    for name, config in _loadMapConfigs(maxMaps).items():
+        params = {key: config[key] for key in ("threshold", "seed", "octaves", "persistence", "lacunarity", "scale", "dynamic")}
+        loopMask, loopTime = _timed(fbmNoiseLoop, size, **params)
+        values, gridTime = _timed(fbmNoiseGrid, size, params["seed"], params["octaves"], params["persistence"], params["lacunarity"], params["scale"])
+        gridMask = landMask(values, params["threshold"], params["dynamic"])
+        differing = int(np.count_nonzero(loopMask != gridMask))
+        totLoop += loopTime
+        totGrid += gridTime
+        totDiffering += differing
+        print(f"{name:<8}{params['seed']:>6}{params['octaves']:>9}{str(params['dynamic']):>9}{loopTime:>12.3f}{gridTime:>12.3f}{loopTime / gridTime:>10.1f}{differing:>11}")
+    print(f"{'total':<32}{totLoop:>12.3f}{totGrid:>12.3f}{totLoop / totGrid:>10.1f}{totDiffering:>11}")
+
+def objectMoves(erbasts, carvizes, grid):
+    """Reference path, moveChoice of every alone individual"""
+    choices = dict()
+    for ind in erbasts + carvizes:
+        choices.update(ind.moveChoice(grid))
+    return choices
+
+def batchMoves(erbasts, carvizes, grid):
+    return {**ErbastBatch(erbasts).moveChoice(grid), **CarvizBatch(carvizes).moveChoice(grid)}
+
+def benchmarkMovement(days = 30, seed = 0, numErbast = 300, numCarviz = 150):
+    """
+    Per-object vs batch movement of the alone individuals.
+    Every day both paths start from the same random state, they are identical if they choose the same moves,
+    leave the random generator in the same state and update the erbasts escape directions in the same way
+    """
+    logging.disable(logging.CRITICAL)
+    env = populatedEnvironment(numErbast, numCarviz, seed)
+    grid = env.getGrid()
+    rng = env.rng.movement
+    print(f"Movement of the alone individuals, seed {seed}")
+    print(f"{'day':<6}{'erbasts':>9}{'carvizes':>10}{'object (s)':>12}{'batch (s)':>11}{'speedup':>10}{'identical':>11}")
+    totObject = 0
+    totBatch = 0
+    allIdentical = True
+    for day in range(days):
+        erbasts, carvizes = env.getAloneErbasts(), env.getAloneCarviz()
+        if not erbasts and not carvizes:
+            break
+        randomState, escapes = rng.getstate(), escapeState(erbasts)
+
+        objectChoices, objectTime = _timed(objectMoves, erbasts, carvizes, grid)
+        objectState, objectEscape = rng.getstate(), escapeState(erbasts)
+
+        rng.setstate(randomState)
+        setEscapeState(erbasts, escapes)
+        batchChoices, batchTime = _timed(batchMoves, erbasts, carvizes, grid)
+
+        identical = objectChoices == batchChoices and rng.getstate() == objectState and escapeState(erbasts) == objectEscape
+        allIdentical &= identical
+        totObject += objectTime
+        totBatch += batchTime
+        print(f"{day:<6}{len(erbasts):>9}{len(carvizes):>10}{objectTime:>12.4f}{batchTime:>11.4f}{objectTime / batchTime:>10.1f}{str(identical):>11}")
+        env.nextDay()
+    print(f"{'total':<25}{totObject:>12.4f}{totBatch:>11.4f}{totObject / totBatch:>10.1f}{str(allIdentical):>11}")
+    return allIdentical
+
+def groupMoves(groups, grid, sharedFeatures):
+    SocialGroup.SHARED_FEATURES = sharedFeatures
+    try:
+        choices = dict()
+        for group in groups:
+            choices.update(group.moveChoice(grid))
+        return choices
+    finally:
+        SocialGroup.SHARED_FEATURES = True
+
+def benchmarkVotes(days = 30, seed = 0, numErbast = 600, numCarviz = 200):
+    """
+    Herds and prides decisions, components votes with their own rankMoves vs the cell features shared by the group.
+    Every day both paths start from the same random state, as in benchmarkMovement
+    """
+    logging.disable(logging.CRITICAL)
+    env = populatedEnvironment(numErbast, numCarviz, seed)
+    grid = env.getGrid()
+    rng = env.rng.movement
+    print(f"Social groups decisions, seed {seed}")
+    print(f"{'day':<6}{'groups':>8}{'members':>9}{'object (s)':>12}{'shared (s)':>12}{'speedup':>10}{'identical':>11}")
+    totObject = 0
+    totShared = 0
+    allIdentical = True
+    for day in range(days):
+        groups = env.getHerds() + env.getPrides()
+        groups.sort(key=lambda group: (type(group).__name__, group.id))
+        if not groups:
+            break
+        members = [c for group in groups for c in group.getComponents()] + env.getHerds()
+        randomState, escapes = rng.getstate(), escapeState(members)
+
+        objectChoices, objectTime = _timed(groupMoves, groups, grid, False)
+        objectState, objectEscape = rng.getstate(), escapeState(members)
+
+        rng.setstate(randomState)
+        setEscapeState(members, escapes)
+        sharedChoices, sharedTime = _timed(groupMoves, groups, grid, True)
+
+        identical = objectChoices == sharedChoices and rng.getstate() == objectState and escapeState(members) == objectEscape
+        allIdentical &= identical
+        totObject += objectTime
+        totShared += sharedTime
+        print(f"{day:<6}{len(groups):>8}{sum(group.numComponents for group in groups):>9}{objectTime:>12.4f}{sharedTime:>12.4f}{objectTime / sharedTime:>10.1f}{str(identical):>11}")
+        env.nextDay()
+    print(f"{'total':<23}{totObject:>12.4f}{totShared:>12.4f}{totObject / totShared:>10.1f}{str(allIdentical):>11}")
+    return allIdentical
+
+def _trajectory(env, days):
+    """runs the simulation, returns the time per day and the number of erbasts, carvizes and herds of each day"""
+    elapsed = []
+    for _ in range(days):
+        _, dayTime = _timed(env.nextDay)
+        elapsed.append(dayTime)
+    stats = env.statistics
+    return np.array(elapsed), np.array([stats["Number of Erbasts"], stats["Number of Carvizes"], stats["Number of Herds"]], dtype=float)
+
+def _quorumSpeedup(herdSizes, seeds, numCarviz, herdCells):
+    """
+    Decision time of herds of the given sizes in exact and sampled mode, every herd from the same random state in both modes.
+    A herd whose sampled components (nearly) all leave is evaluated exactly, it disbands: its speedup is reported apart
+    """
+    print(f"{'herd size':<11}{'herds':>7}{'exact (s)':>11}{'sampled (s)':>13}{'speedup':>9}{'disbanding':>12}{'speedup':>9}")
+    for size in herdSizes:
+        times = {(disbands, sampled): 0.0 for disbands in (False, True) for sampled in (False, True)}
+        counts = {False: 0, True: 0}
+        for seed in range(seeds):
+            env = populatedEnvironment(size * herdCells, numCarviz, seed, herdCells)
+            for herd in env.getHerds():
+                randomState = env.rng.getstate()
+                for sampled in (False, True):
+                    env.rng.setstate(randomState)
+                    SocialGroup.SAMPLED_QUORUM = sampled
+                    try:
+                        choices, elapsed = _timed(groupMoves, [herd], env.getGrid(), True)
+                    finally:
+                        SocialGroup.SAMPLED_QUORUM = False
+                    if not sampled:
+                        disbands = herd not in choices
+                    times[(disbands, sampled)] += elapsed
+                counts[disbands] += 1
+        speedup = lambda disbands: times[(disbands, False)] / times[(disbands, True)] if counts[disbands] else float("nan")
+        print(f"{size:<11}{counts[False]:>7}{times[(False, False)]:>11.3f}{times[(False, True)]:>13.3f}{speedup(False):>9.1f}{counts[True]:>12}{speedup(True):>9.1f}")
+
+def benchmarkQuorum(days = 20, seeds = 3, numErbast = 4000, numCarviz = 100, herdCells = 4, herdSizes = (100, 250, 500, 1000, 2000, 4000)):
+    """
+    Accuracy / speed report of the sampled quorum mode of the social groups.
+    The decision time is first measured for herds of growing sizes (see _quorumSpeedup).
+    Then the erbasts start in a few thousand-strong herds, the same populations are simulated in exact and sampled mode
+    and the population trajectories are compared across the seeds: the difference of the means of the two modes,
+    its standard error (from the spread across the seeds) and the spread of the runs of each mode.
+    The sampled mode is biased (see SocialGroup._sampledQuorum), a difference larger than 2 standard errors is reported
+    """
+    logging.disable(logging.CRITICAL)
+    print(f"Sampled quorum, confidence interval of the leaving fraction {SocialGroup.QUORUM_ERROR}, {seeds} seeds")
+    _quorumSpeedup(herdSizes, seeds, numCarviz, herdCells)
+    print(f"Simulation of {numErbast} erbasts and {numCarviz} carvizes")
+    print(f"{'seed':<6}{'mode':<9}{'decision (s)':>14}{'day (s)':>9}{'largest herd':>14}{'erbasts':>9}{'carvizes':>10}{'herds':>7}")
+    decisionTimes = {False: [], True: []}
+    times = {False: [], True: []}
+    trajectories = {False: [], True: []}
+    for seed in range(seeds):
+        for sampled in (False, True):
+            SocialGroup.SAMPLED_QUORUM = sampled
+            try:
+                env = populatedEnvironment(numErbast, numCarviz, seed, herdCells)
+                herds = env.getHerds()
+                largest = max((herd.numComponents for herd in herds), default=0)
+                randomState = env.rng.getstate()
+                _, decisionTime = _timed(groupMoves, herds, env.getGrid(), True) # decisions of the initial herds only
+                env.rng.setstate(randomState)
+                elapsed, trajectory = _trajectory(env, days)
+            finally:
+                SocialGroup.SAMPLED_QUORUM = False
+            decisionTimes[sampled].append(decisionTime)
+            times[sampled].append(elapsed.mean())
+            trajectories[sampled].append(trajectory)
+            final = trajectory[:, -1]
+            print(f"{seed:<6}{'sampled' if sampled else 'exact':<9}{decisionTime:>14.3f}{elapsed.mean():>9.3f}{largest:>14}{final[0]:>9.0f}{final[1]:>10.0f}{final[2]:>7.0f}")
+
+    exact, sampled = np.array(trajectories[False]), np.array(trajectories[True]) # seed, quantity, day
+    difference = sampled.mean(axis=0) - exact.mean(axis=0)
+    ddof = 1 if seeds > 1 else 0
+    standardError = np.sqrt((exact.var(axis=0, ddof=ddof) + sampled.var(axis=0, ddof=ddof)) / seeds)
+    print(f"speedup of the herds decisions {np.mean(decisionTimes[False]) / np.mean(decisionTimes[True]):.2f}, of the whole day {np.mean(times[False]) / np.mean(times[True]):.2f}")
+    print(f"{'':<10}{'final exact':>18}{'final sampled':>18}{'mean rel. difference':>22}{'days beyond 2 s.e.':>20}")
+    for i, name in enumerate(("erbasts", "carvizes", "herds")):
+        relative = np.abs(difference[i]) / np.maximum(exact[:, i].mean(axis=0), 1)
+        beyond = np.abs(difference[i]) > 2 * standardError[i]
+        print(f"{name:<10}{exact[:, i, -1].mean():>10.0f} ± {exact[:, i, -1].std(ddof=ddof):<5.0f}{sampled[:, i, -1].mean():>10.0f} ± {sampled[:, i, -1].std(ddof=ddof):<5.0f}"
+              f"{relative.mean():>22.3f}{f'{beyond.sum()}/{days}':>20}")
+
+def baselineMove(env, nextCoords):
+    """
+    Reference path, Environment.move before the bulk relocation:
+    every mover is removed from its cell and added to the new one, one at a time in moving order
+    """
+    for o, c in nextCoords.items():
+        if isinstance(o, SocialGroup) and len(o.getComponents()) < 2:
+            logging.warning(f"SocialGroup {o} has less than 2 components, removing it")
+            env.remove(o)
+            continue
+        env.remove(o)
+        env._changeCoords(o, c)
+        env.add(o)
+
+def orderFreeMoves(env, nextCoords):
+    """
+    The moves of the day whose result does not depend on the order they are applied in.
+    A mover arriving in a cell before someone else leaves it is dropped, one at a time it joins
+    the creatures of the cell and a herd leaving later carries it along, the bulk relocation
+    applies all the departures first. The dead movers, the groups with less than 2 components,
+    the components whose leaving disbands their group and the movers leaving a cell with an emptied pride
+    are dropped too, the bulk relocation skips the first, disbands the second and drops the emptied prides
+    from the cells it departs
+    """
+    grid = env.getGrid()
+    leaving = defaultdict(int) # group -> components leaving it
+    for o in nextCoords:
+        if isinstance(o, Animal) and o.socialGroup is not None:
+            leaving[o.socialGroup] += 1
+    movers = [(o, tuple(c)) for o, c in nextCoords.items()
+              if not (isinstance(o, Animal) and not o.alive)
+              and not (isinstance(o, SocialGroup) and len(o.getComponents()) < 2)
+              and not (isinstance(o, Animal) and o.socialGroup is not None
+                       and len(o.socialGroup.getComponents()) - leaving[o.socialGroup] < 2)
+              and all(len(pride.getComponents()) >= 2 for pride in grid[o.getCoords()].prides)]
+    lastDeparture = {o.getCoords(): i for i, (o, _) in enumerate(movers)}
+    return {o: c for i, (o, c) in enumerate(movers) if lastDeparture.get(c, -1) <= i}
+
+def benchmarkRelocation(days = 20, seed = 0, numErbast = 3000, numCarviz = 300, herdCells = 30):
+    """
+    Baseline vs bulk relocation of the movers in the movement phase.
+    Every day the moves chosen by the simulation whose result does not depend on their order
+    are applied by both paths to copies of the same environment, they are identical if the copies end
+    with the same cells (inhabitants, counters, herd and prides) and the same registries,
+    and the cells of the bulk copy are consistent
+    """
+    logging.disable(logging.CRITICAL)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20000)) # deep copies of the creatures graph
+    env = populatedEnvironment(numErbast, numCarviz, seed, herdCells)
+    captured = dict()
+    bulkMove = env.move
+    def capture(nextCoords):
+        captured["state"] = copy.deepcopy((env, nextCoords))
+        bulkMove(nextCoords)
+    env.move = capture
+    print(f"Relocation of the movers, seed {seed}")
+    print(f"{'day':<6}{'movers':>8}{'applied':>9}{'baseline (s)':>14}{'bulk (s)':>10}{'speedup':>10}{'identical':>11}")
+    totBaseline = 0
+    totBulk = 0
+    allIdentical = True
+    for day in range(days):
+        env.nextDay()
+        if "state" not in captured:
+            break
+        bulkEnv, nextCoords = captured.pop("state")
+        bulkCoords = orderFreeMoves(bulkEnv, nextCoords)
+        baselineEnv, baselineCoords = copy.deepcopy((bulkEnv, bulkCoords))
+        _, baselineTime = _timed(baselineMove, baselineEnv, baselineCoords)
+        _, bulkTime = _timed(Environment.move, bulkEnv, bulkCoords)
+        identical = sameState(bulkEnv, baselineEnv) and consistentCells(bulkEnv)
+        allIdentical &= identical
+        totBaseline += baselineTime
+        totBulk += bulkTime
+        print(f"{day:<6}{len(nextCoords):>8}{len(bulkCoords):>9}{baselineTime:>14.4f}{bulkTime:>10.4f}{baselineTime / bulkTime:>10.1f}{str(identical):>11}")
+    print(f"{'total':<23}{totBaseline:>14.4f}{totBulk:>10.4f}{totBaseline / totBulk:>10.1f}{str(allIdentical):>11}")
+    return allIdentical
+
+BENCHMARKS = {
+    "terrain": benchmarkTerrain,
+    "movement": benchmarkMovement,
+    "votes": benchmarkVotes,
+    "quorum": benchmarkQuorum,
+    "relocation": benchmarkRelocation,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Planisuss benchmarks")
+    parser.add_argument("benchmark", choices=BENCHMARKS.keys())
+    parser.add_argument("--size", type=int, default=NUMCELLS, help="number of rows and columns of the grid")
+    parser.add_argument("--maps", type=int, default=None, help="number of map presets to use")
+    parser.add_argument("--days", type=int, default=30, help="number of simulated days")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generators")
+    parser.add_argument("--seeds", type=int, default=3, help="number of seeds of the quorum report")
+    args = parser.parse_args()
+
+    if args.benchmark == "terrain":
+        benchmarkTerrain(args.size, args.maps)
+    elif args.benchmark == "movement":
+        benchmarkMovement(args.days, args.seed)
+    elif args.benchmark == "votes":
+        benchmarkVotes(args.days, args.seed)
+    elif args.benchmark == "quorum":
+        benchmarkQuorum(args.days, args.seeds)
+    elif args.benchmark == "relocation":
+        benchmarkRelocation(args.days, args.seed)
@@ -1,12 +1,13 @@
 from planisuss_constants import *
 import numpy as np
-import sys
 import random
 import math
 import logging
+from typing import Union
 from typing import TYPE_CHECKING # to avoid vscode telling me i'm not including libraries that would cause a circular import
 if TYPE_CHECKING:
     from world import WorldGrid
+    from randomstreams import RandomPool
 
 def getDirection(myCoords:tuple ,otherCoords:tuple):
     """given to coords tuple return direction"""
@@ -63,6 +64,8 @@ def checkCoordsInBoundary(coords):
         return False
     
 def logDesirabilityMatrix(worldGrid, desirabilityScores, animal):
+    if not logging.getLogger().isEnabledFor(logging.DEBUG):
+        return # building the matrix visits every cell of the grid
     logging.debug(f"Desirability matrix for {animal}")
     for row in worldGrid:
         row_str = ""
@@ -83,25 +86,19 @@ class Species():
 
     def getNeighborhood(self, worldGrid:'WorldGrid', d = None):
         """
-        This method return the neighborhood of the animal or socialGroup considered, this approach requires storing the worldGrid
+        This method return the land cells in the neighborhood of the animal or socialGroup considered, this approach requires storing the worldGrid
         
         The worldGrid is passed as an argument to keep the Animal/ SocialGroup class loosely coupled 
         and focused solely on animal-specific behavior. This approach enhances flexibility, 
         maintainability, and testability by avoiding direct dependencies between Animal and 
         a specific WorldGrid instance.
+        The neighborhoods are read from the landIds of the worldGrid at fixed offsets
         """
-        x, y = self.coords[0], self.coords[1]
         d = d if d is not None else self.neighborhoodDistance
-        x_min = max(0, x - d)
-        x_max = min(NUMCELLS_R, x + d + 1)
-        y_min = max(0, y - d)
-        y_max = min(NUMCELLS_C, y + d + 1)
-        cands = worldGrid[x_min:x_max, y_min:y_max].reshape(-1)
+        cands = worldGrid.getLandNeighborhood(self.coords, d)
 
-        logging.debug(f"{self}, in position {self.getCoords()}, with neighborhood distance {d} was looking for its neighborhood, i returned {cands}")
+        logging.debug("%s, in position %s, with neighborhood distance %s was looking for its neighborhood, i returned %s", self, self.getCoords(), d, cands)
 
-        # print(f"{self} was looking for its neighborhood, i returned {cands}, with neighborhood {d}")
-        # cands = np.delete(cands,len(cands)//2)
         return cands
 
     def changeEnergy(self, amount:int):
@@ -115,14 +112,20 @@ class Species():
 
 class Animal(Species):
 
-    def __init__(self, coordinates: tuple, energy:int = MAX_ENERGY, lifetime:int = MAX_LIFE, age:int = 0, SocialAttitude:float = 0.5, neighborhoodDistance = NEIGHBORHOOD, name:str = None):
+    # the defaults of the constants are read when the animal is created (None), so that overridden parameters apply, see ensemble.py
+    def __init__(self, coordinates: tuple, energy:int = None, lifetime:int = None, age:int = 0, SocialAttitude:float = 0.5, neighborhoodDistance = None, name:str = None):
+        energy = MAX_ENERGY if energy is None else energy
+        lifetime = MAX_LIFE if lifetime is None else lifetime
+        neighborhoodDistance = NEIGHBORHOOD if neighborhoodDistance is None else neighborhoodDistance
         super().__init__()
+        self.totals = None # set by the environment hosting the animal, running sums of the energies and social attitudes
+        self.groupRegistry = None # set by the environment hosting the animal, it follows the changes of social group
         self.coords = coordinates
         self.energy = energy
         self.lifetime = lifetime
         self.age = age
         self.socialAttitude = SocialAttitude
-        self.socialGroup = None
+        self._socialGroup = None
         self.inSocialGroup = False
         self.alive = True
         self.neighborhoodDistance = neighborhoodDistance
@@ -130,6 +133,37 @@ class Animal(Species):
         self.preferredDirectionIntensity = 1 # number from 0 to 1
         self.name = name
 
+    @property
+    def energy(self) -> int:
+        return self._energy
+
+    @energy.setter
+    def energy(self, value:int):
+        if self.totals is not None:
+            self.totals.energy += value - self._energy
+        self._energy = value
+
+    @property
+    def socialAttitude(self) -> float:
+        return self._socialAttitude
+
+    @socialAttitude.setter
+    def socialAttitude(self, value:float):
+        if self.totals is not None:
+            self.totals.socialAttitude += value - self._socialAttitude
+        self._socialAttitude = value
+
+    @property
+    def socialGroup(self) -> Union['SocialGroup', None]:
+        return self._socialGroup
+
+    @socialGroup.setter
+    def socialGroup(self, group:Union['SocialGroup', None]):
+        previous = self._socialGroup
+        self._socialGroup = group
+        if self.groupRegistry is not None and group is not previous:
+            self.groupRegistry.regroup(self, previous, group)
+
     def getSocialAttitude(self):
         return self.socialAttitude
     
@@ -148,13 +182,15 @@ class Animal(Species):
         elif self.energy + amount < 0:
             self.energy = 0
             self.alive = False
-            logging.info(f"{self} died of starvation")
         else:
             self.energy = MAX_ENERGY
         return {self:self.alive}
 
-    def ageStep(self, days:int = 1) -> tuple[bool, list[Species]]:
-        """Increase the age of the animal by the specified number of days. returns if the animal is alive (True) or dead (False) and the offsprings if any"""
+    def ageStep(self, days:int = 1, rng:random.Random = random) -> tuple[bool, list[Species]]:
+        """
+        Increase the age of the animal by the specified number of days. returns if the animal is alive (True) or dead (False) and the offsprings if any,
+        rng is the random generator of the reproduction (the reproduction stream of the environment)
+        """
         
         if self.alive:
             offsprings = None
@@ -167,8 +203,7 @@ class Animal(Species):
             else: 
                 self.age = self.lifetime
                 self.alive = False
-                offsprings = self.reproduce()
-                logging.info(f"{self} died of old age and produced {offsprings}")
+                offsprings = self.reproduce(rng)
                 return self.alive, offsprings
 
             if self.age % MONTH == 0:
@@ -181,18 +216,17 @@ class Animal(Species):
                 if self.energy <= 0:
                     self.energy = 0
                     self.alive = False
-                    logging.info(f"{self} died of starvation due to aging")
         else:
             logging.error(f"Cannot age a dead animal: {self}, age: {self.age}, lifetime: {self.lifetime}")
             offsprings = None
         
         return self.alive, offsprings
     
-    def reproduce(self):
+    def reproduce(self, rng:random.Random = random):
         """Reproduce an Animal, returns 2 offspring"""
         age = 0
         energy = max(5, self.energy // 2)
-        socialAttitude = min(1, max(0, self.socialAttitude + random.uniform(-0.2, 0.2)))
+        socialAttitude = min(1, max(0, self.socialAttitude + rng.uniform(-0.2, 0.2)))
         coords = self.getCoords()
         neighboordhoodDistance = self.neighborhoodDistance
         if isinstance(self, Erbast):
@@ -220,30 +254,22 @@ class Vegetob():
 
     """
     Our cute plants, growing each day... unable to move...
+    Vegetob densities are stored in the WorldGrid vegetob array, this class holds their growth rules
     """
-    
-    def __init__(self, density = 0):
-        super().__init__()
-        self.density = density
 
-    def grow(self, times:int = 1):
-        """Grow the Vegetob"""
-        if not isinstance(times, int):
+    @staticmethod
+    def grow(density, times:int = 1):
+        """Grow the Vegetob density (a number or an array of densities) for times days, up to MAX_GROWTH"""
+        if not isinstance(times, (int, np.integer)) and not (isinstance(times, np.ndarray) and np.issubdtype(times.dtype, np.integer)):
             raise ValueError("times must be an integer")
-        for _ in range(times):
-            if self.density + GROWING <= MAX_GROWTH:
-                self.density += GROWING
-            else:
-                self.density = MAX_GROWTH
+        return np.minimum(density + GROWING * times, MAX_GROWTH)
 
-    def reduce(self, amount:int = 5):
-        """Apply Grazing Effect"""
+    @staticmethod
+    def reduce(density, amount:int = 5):
+        """Apply Grazing Effect on the Vegetob density, down to 0"""
         if not isinstance(amount, int):
             raise ValueError("amount must be an integer")
-        if self.density - amount >= 0:
-            self.density -= amount
-        else:
-            self.density = 0
+        return np.maximum(density - amount, 0)
 
     def __repr__(self):
         return "Vegetob"
@@ -256,13 +282,19 @@ class Erbast(Animal):
     ID = 1
 
     CARVIZ_DANGER = 0.6
+    # how much the carvizes in a cell and in the nearby cells are dangerous, see WorldGrid.getRingField.
+    # The rings are counted around every cell of the neighborhood, also the carvizes just beyond it and for the cells
+    # that are not reachable: before the shared fields only the carvizes in view spread danger, to the reachable cells
+    DANGER_RINGS = (1, 0.6)
     VEG_NEED = 0.01
 
     ESCAPE_DECAY = 0.5 #for how much time an erbast wants to go in the opposite direction of the last saw carviz
     ESCAPE_THRESHOLD = 0.3 #Under which value erbast no longer run away
     NOT_EATING_SA_REDUCTION = 0.05
 
-    def __init__(self, coordinates: tuple, energy:int = MAX_ENERGY_E, lifetime:int = MAX_LIFE_E, age:int = 0, SocialAttitude:float = 0.5, name:str = None):
+    def __init__(self, coordinates: tuple, energy:int = None, lifetime:int = None, age:int = 0, SocialAttitude:float = 0.5, name:str = None):
+        energy = MAX_ENERGY_E if energy is None else energy
+        lifetime = MAX_LIFE_E if lifetime is None else lifetime
         super().__init__(coordinates, energy, lifetime, age, SocialAttitude, name = name)
         self.id = Erbast.ID
         Erbast.ID += 1
@@ -275,38 +307,29 @@ class Erbast(Animal):
         """
 
         neighborhood = self.getNeighborhood(worldGrid, self.neighborhoodDistance)
-        LandCell = getattr(sys.modules['world'], 'LandCell')
-        neighborhood = [cell for cell in neighborhood if isinstance(cell, LandCell)]
         desirabilityScores = {cell:0 for cell in neighborhood}
         presentCell = self.getCell(worldGrid) # presentCell should be in neighborhood
+        rng = worldGrid.rng.movement # random stream of the environment
         energy = self.getEnergy()
+        carvizDanger = worldGrid.getRingField("numCarviz", Erbast.DANGER_RINGS) # shared by all the erbasts of the day
 
 
         for cell in desirabilityScores:
 
             # Carviz danger evaluation --------------------------------
 
-            carvizDangerValue = cell.numCarviz * Erbast.CARVIZ_DANGER
-            desirabilityScores[cell] -= carvizDangerValue
+            desirabilityScores[cell] -= float(carvizDanger[cell.coords]) * Erbast.CARVIZ_DANGER
 
             if(cell.numCarviz > 0):
-                x,y = cell.getCoords()
-
-                self.preferredDirection = getOppositeDirection(presentCell.getCoords(), (x,y)) #store last escape direction
+                self.preferredDirection = getOppositeDirection(presentCell.getCoords(), cell.getCoords()) #store last escape direction
                 self.preferredDirectionIntensity = 1 # raise intensity
 
-                nearbyCords = [(x-1, y-1),(x, y-1),(x+1, y-1),(x-1, y+1),(x, y+1),(x+1, y+1),(x-1, y),(x+1, y)]
-                nearbyCells = [worldGrid[coords] for coords in nearbyCords if checkCoordsInBoundary(coords)]
-                CellsInRange = [c for c in nearbyCells if c in neighborhood]
-                for c in CellsInRange:
-                    desirabilityScores[c] -= carvizDangerValue * 0.6
-
 
             if presentCell != cell:
 
                  # Other Erbast evaluation --------------------------------
 
-                individualTolerance = self.socialAttitude * 5 + random.randint(0,10) # tolerance for the maximum number of erbasts (too many won't be able to share resources)
+                individualTolerance = self.socialAttitude * 5 + rng.randint(0,10) # tolerance for the maximum number of erbasts (too many won't be able to share resources)
 
                 ourErbasts = presentCell.numErbast
                 theirErbasts = cell.numErbast
@@ -320,7 +343,7 @@ class Erbast(Animal):
 
                     # if we are the same number we can join or stay still by random choice
                     elif ourErbasts == theirErbasts:
-                        if random.random() > 0.5:
+                        if rng.random() > 0.5:
                             desirabilityScores[cell] += theirErbasts * self.socialAttitude
                         else:
                             desirabilityScores[presentCell] += theirErbasts * self.socialAttitude
@@ -385,12 +408,17 @@ class Carviz(Animal):
 
     VEG_NEED = 0.005 # carvist do not need vegetob, but it makes sense for them to look for erbast in food rich zones #TODO but maybe it is more reasonable to look where food has been eaten?
     ERBAST_NEED = 4
+    # how much the erbasts in a cell and in the nearby cells are attractive, erbasts out of view count too (see Erbast.DANGER_RINGS)
+    PREY_RINGS = (1, 0.6)
     
     ENERGY_WEIGHT = 0.1 # scales how much energy matters overall
     ENERGY_WEIGHT2 = 0.8 # lower value -> more likely to stay even at high energy levels
     ENERGY_EXPONENT = 0.65 # regulates how much the percentage of energy matters
 
-    def __init__(self, coordinates: tuple, energy:int = MAX_ENERGY_C, lifetime:int = MAX_LIFE_C, age:int = 0, SocialAttitude:float = 0.5, neighborhoodDistance = NEIGHBORHOOD_C, name:str = None):
+    def __init__(self, coordinates: tuple, energy:int = None, lifetime:int = None, age:int = 0, SocialAttitude:float = 0.5, neighborhoodDistance = None, name:str = None):
+        energy = MAX_ENERGY_C if energy is None else energy
+        lifetime = MAX_LIFE_C if lifetime is None else lifetime
+        neighborhoodDistance = NEIGHBORHOOD_C if neighborhoodDistance is None else neighborhoodDistance
         super().__init__(coordinates, energy, lifetime, age, SocialAttitude, neighborhoodDistance, name = name)
         self.id = Carviz.ID
         Carviz.ID += 1
@@ -399,37 +427,23 @@ class Carviz(Animal):
         """Ranks the moves in the neighborhood based on desirability scores."""
         neighborhood = self.getNeighborhood(worldGrid, d = self.neighborhoodDistance)
         reachableCells = self.getNeighborhood(worldGrid, d = 1)
-        LandCell = getattr(sys.modules['world'], 'LandCell')
-        neighborhood = [cell for cell in neighborhood if isinstance(cell, LandCell)]
-        reachableCells = [el for el in reachableCells if isinstance(el, LandCell)]
         desirabilityScores = {cell:0 for cell in neighborhood}
         presentCell = self.getCell(worldGrid) # presentCell should be in neighborhood
+        rng = worldGrid.rng.movement # random stream of the environment
+        preyAttraction = worldGrid.getRingField("numErbast", Carviz.PREY_RINGS) # shared by all the carvizes of the day
 
         # Carviz are very hungry and they want to eat Erbasts
+        # also neighbouring cells should become more attractive, but a bit less
         for cell in desirabilityScores:
 
-            cellInterest = cell.numErbast * Carviz.ERBAST_NEED
-            desirabilityScores[cell] += cellInterest
-
-            # also neighbouring cells, if in range, should become more attractive, but a bit less
-            if(cell.numErbast > 0):
-
-                x,y = cell.getCoords()
-
-                nearbyCords = [(x-1, y-1),(x, y-1),(x+1, y-1),(x-1, y+1),(x, y+1),(x+1, y+1),(x-1, y),(x+1, y)]
-                nearbyCells = [worldGrid[coords] for coords in nearbyCords if checkCoordsInBoundary(coords)]
-                CellsInRange = [c for c in nearbyCells if c in reachableCells]
-
-                for c in CellsInRange:
-                    desirabilityScores[c] += cellInterest * 0.6
-
+            desirabilityScores[cell] += float(preyAttraction[cell.coords]) * Carviz.ERBAST_NEED
             desirabilityScores[cell] += cell.getVegetobDensity() * Carviz.VEG_NEED
 
             if presentCell != cell:
             
                 # other carvizes evaluation --------------------------------
 
-                individualTolerance = self.socialAttitude * 4 + random.randint(0,7) # tolerance for the maximum number of carvizes (too many won't be able to share resources)
+                individualTolerance = self.socialAttitude * 4 + rng.randint(0,7) # tolerance for the maximum number of carvizes (too many won't be able to share resources)
 
                 ourCarvizes = presentCell.numCarviz
                 theirCarvizes = cell.numCarviz
@@ -443,7 +457,7 @@ class Carviz(Animal):
 
                     # if we are the same number we can join or stay still by random choice
                     elif ourCarvizes == theirCarvizes:
-                        if random.random() > 0.5:
+                        if rng.random() > 0.5:
                             desirabilityScores[cell] += theirCarvizes * self.socialAttitude
                         else:
                             desirabilityScores[presentCell] += theirCarvizes * self.socialAttitude
@@ -472,8 +486,16 @@ class SocialGroup(Species): # TODO what particular information may be stored by
     """   
 
     GOING_BACK_PENALTY = 0.3
+    SHARED_FEATURES = True # components votes reuse the cell features gathered once by the group, see movement.py
 
-    def __init__(self, components : list[Animal], neighborhoodDistance = NEIGHBORHOOD_SOCIAL, memory = MEMORY_SOCIAL):
+    # sampled quorum: large groups decide from the votes of a sample of their components
+    SAMPLED_QUORUM = False
+    QUORUM_ERROR = 0.1 # half width of the confidence interval of the estimated fraction of leaving components, not a bound on the decisions
+    QUORUM_Z = 1.96 # 95% confidence
+
+    def __init__(self, components : list[Animal], neighborhoodDistance = None, memory = None):
+        neighborhoodDistance = NEIGHBORHOOD_SOCIAL if neighborhoodDistance is None else neighborhoodDistance
+        memory = MEMORY_SOCIAL if memory is None else memory
 
         super().__init__()
         self.coords = (-1,-1)
@@ -497,8 +519,6 @@ class SocialGroup(Species): # TODO what particular information may be stored by
         self.neighborhoodDistance = neighborhoodDistance
         self.memory = memory
 
-        logging.info(f"SocialGroup creation -> SocialGroup with components: {self.components}, current coords: {self.coords}, last coords: {self.lastCoords}")
-
     def updateCoords(self, newCoords:tuple[int,int]):
         """Should always be used to update Coords"""
         self.lastCoords.append(self.coords)
@@ -611,6 +631,38 @@ class SocialGroup(Species): # TODO what particular information may be stored by
         self.numComponents = 0
         return self
 
+    def loseComponents(self, animals:set[Animal]) -> list[Animal]:
+        """
+        Remove several components at once, if less than 2 components remain the group is disbanded.
+        Returns the components that are left alone by the disbanding
+        """
+        for el in animals:
+            el.socialGroup = None
+            el.inSocialGroup = False
+        self.components = [el for el in self.components if el not in animals]
+        self.numComponents = len(self.components)
+        if self.numComponents >= 2:
+            return []
+        individuals = self.components
+        self.disband()
+        self.components = []
+        return individuals
+
+    def absorb(self, others:list[Species]):
+        """Join at once individuals and whole groups to this group, the absorbed groups are left empty"""
+        for other in others:
+            if isinstance(other, SocialGroup):
+                members = other.components
+                other.components = []
+                other.numComponents = 0
+            else:
+                members = [other]
+            for el in members:
+                el.socialGroup = self
+                el.inSocialGroup = True
+            self.components.extend(members)
+        self.numComponents = len(self.components)
+
     def moveChoice(self, worldGrid: 'WorldGrid') -> dict['Species', tuple[int, int]]:
         """
         In this method the group decision is assessed and eventual leaving components are identified with their preferred direction,
@@ -618,50 +670,126 @@ class SocialGroup(Species): # TODO what particular information may be stored by
         """
 
 
+        from movement import batchOf # movement imports creatures
+
         moveValues = self.rankMoves(worldGrid)
         groupdecidedCoords = max(moveValues, key=moveValues.get)
+        rng = worldGrid.rng.movement
+
+        # the features of the cells around the group are gathered once, each component only adds its own attitude on top
+        votes = batchOf(self.getComponents())
+        if SocialGroup.SHARED_FEATURES and votes.neighborhoodDistance is not None:
+            votes.prepare(worldGrid)
+        componentIndex = {c: i for i, c in enumerate(self.getComponents())}
+        rankMoves = lambda c: votes.vote(componentIndex[c]) if votes.features is not None else c.rankMoves(worldGrid)
 
-        logging.info(f"Group {self}, components: {self.getComponents()} want to go in {groupdecidedCoords}")
+        decisions = dict() # component -> coords if it leaves the group, None if it stays
+        if SocialGroup.SAMPLED_QUORUM:
+            choices = self._sampledQuorum(rankMoves, groupdecidedCoords, decisions, rng)
+            if choices is not None:
+                return choices
 
         leavingIndividualsAndDirection = dict()
-        for c in self.getComponents():
-            individualValues = c.rankMoves(worldGrid)
+        tolerances = rng.randints(0, 10, len(self.getComponents())) # drawn at once for all the components
+        for c, tolerance in zip(self.getComponents(), tolerances):
+            individualDecidedCoords = decisions[c] if c in decisions else self._componentDecision(c, rankMoves(c), groupdecidedCoords, tolerance, rng)
+
+            if individualDecidedCoords is not None:
+                leavingIndividualsAndDirection[c] = individualDecidedCoords # get individual preferred movement
+
+                if len(leavingIndividualsAndDirection) == len(self.getComponents()) - 1:
+                    components = self.getComponents()
+                    lastAnimal = [x for x in components if x not in leavingIndividualsAndDirection.keys()][0]
+                    lAValues = rankMoves(lastAnimal)
+                    leavingIndividualsAndDirection[lastAnimal] = max(lAValues, key=lAValues.get)
+                    return leavingIndividualsAndDirection
+        
+        choices = {**leavingIndividualsAndDirection, self:groupdecidedCoords}
+        return choices
+
+    def _componentDecision(self, c:Animal, individualValues:dict, groupdecidedCoords:tuple[int, int], tolerance:int, rng:'RandomPool') -> tuple[int, int]:
+        """
+        returns the coords where the component wants to go if it leaves the group, None if it follows the group.
+        tolerance is the random part, between 0 and 10, of the number of other components the individual is able to tolerate
+        """
 
-            if groupdecidedCoords not in individualValues.keys():
-                logging.error(f"Individual {c} in {c.getCoords()} neighborhood is {individualValues.keys()}")
+        if groupdecidedCoords not in individualValues.keys():
+            logging.error(f"Individual {c} in {c.getCoords()} neighborhood is {individualValues.keys()}")
 
-            individualDesiredValue = individualValues[groupdecidedCoords]
-            individualTolerance = c.socialAttitude * 5 + random.randint(0,10) # how many other components is the individual able to tolerate
-            
-            # if there are too many individuals in the same cell they will probably die due to lack of resources
-            tooManyIndividualsPenalty = 0
-            if len(self.getComponents()) > individualTolerance:
-                tooManyIndividualsPenalty = 10 * (1.5 - c.socialAttitude)
-            
-            maximumTolerance = (tooManyIndividualsPenalty - c.socialAttitude)
+        individualDesiredValue = individualValues[groupdecidedCoords]
+        individualTolerance = c.socialAttitude * 5 + tolerance # how many other components is the individual able to tolerate
+        
+        # if there are too many individuals in the same cell they will probably die due to lack of resources
+        tooManyIndividualsPenalty = 0
+        if len(self.getComponents()) > individualTolerance:
+            tooManyIndividualsPenalty = 10 * (1.5 - c.socialAttitude)
+        
+        maximumTolerance = (tooManyIndividualsPenalty - c.socialAttitude)
 
-            if individualDesiredValue < maximumTolerance: #if individual preference is lower than maximum tolerance
+        if individualDesiredValue < maximumTolerance: #if individual preference is lower than maximum tolerance
 
-                individualDesiredCoordsSorted = sorted(individualValues, key=individualValues.get, reverse=True)
+            individualDesiredCoordsSorted = sorted(individualValues, key=individualValues.get, reverse=True)
 
-                top_3_choices = individualDesiredCoordsSorted[:3]
-                individualDecidedCoords = random.choice(top_3_choices) # stochasticity!
+            top_3_choices = individualDesiredCoordsSorted[:3]
+            individualDecidedCoords = rng.choice(top_3_choices) # stochasticity!
 
-                if groupdecidedCoords != individualDecidedCoords: #and the individual choice is different from the group choice
+            if groupdecidedCoords != individualDecidedCoords: #and the individual choice is different from the group choice
+                return individualDecidedCoords
+        return None
 
-                    leavingIndividualsAndDirection[c] = individualDecidedCoords # get individual preferred movement
-                    logging.info(f"{c} in {c.getCoords()}, differently from the group, wants to go at: {max(individualValues, key=individualValues.get)}")
+    def quorumSampleSize(self) -> int:
+        """
+        number of components to evaluate to estimate the fraction of leaving components within QUORUM_ERROR,
+        worst case variance with finite population correction
+        """
+        n = len(self.getComponents())
+        n0 = (SocialGroup.QUORUM_Z / SocialGroup.QUORUM_ERROR) ** 2 * 0.25
+        return min(n, math.ceil(n0 / (1 + (n0 - 1) / n)))
 
-                    if len(leavingIndividualsAndDirection) == len(self.getComponents()) - 1:
-                        logging.info(f"The group {self} disbanded, the individuals {self.getComponents()} are now free to go")
-                        components = self.getComponents()
-                        lastAnimal = [x for x in components if x not in leavingIndividualsAndDirection.keys()][0]
-                        lAValues = lastAnimal.rankMoves(worldGrid)
-                        leavingIndividualsAndDirection[lastAnimal] = max(lAValues, key=lAValues.get)
-                        return leavingIndividualsAndDirection
-        
-        choices = {**leavingIndividualsAndDirection, self:groupdecidedCoords}
-        return choices
+    def _sampledQuorum(self, rankMoves, groupdecidedCoords:tuple[int, int], decisions:dict, rng:'RandomPool') -> dict['Species', tuple[int, int]]:
+        """
+        Approximate decision of a large group from a random sample of its components.
+        Only the sampled components rank their moves. The others leave with the fraction of leaving components
+        of the sample, each one towards a cell drawn like a leaving component of _componentDecision would draw it,
+        from the 3 preferred cells (other than the group choice) of a random sampled leaver.
+        The sampled leavers are a random sample of the leavers, so the destinations follow on average the ones
+        of the exact evaluation, but an unsampled component does not use its own preferences and which components
+        leave does not depend on their own tolerance: only the fraction is estimated within QUORUM_ERROR
+        (with QUORUM_Z confidence), see benchmarks.benchmarkQuorum for the difference it makes.
+        Returns None, leaving the sampled decisions in decisions, when the group is too small to be sampled
+        or the disband threshold is within the confidence interval of the estimate: the exact evaluation is needed
+        """
+        components = self.getComponents()
+        sampleSize = self.quorumSampleSize()
+        if sampleSize >= len(components):
+            return None
+
+        sample = rng.sample(components, sampleSize)
+        leavingChoices = [] # 3 preferred cells of each sampled leaver, other than the group choice
+        for c, tolerance in zip(sample, rng.randints(0, 10, sampleSize)):
+            individualValues = rankMoves(c)
+            decisions[c] = self._componentDecision(c, individualValues, groupdecidedCoords, tolerance, rng)
+            if decisions[c] is not None:
+                top_3_choices = sorted(individualValues, key=individualValues.get, reverse=True)[:3]
+                leavingChoices.append([coords for coords in top_3_choices if coords != groupdecidedCoords])
+
+        sampledLeaving = {c: coords for c, coords in decisions.items() if coords is not None}
+        leavingFraction = len(sampledLeaving) / sampleSize
+        # confidence interval from the variance of the sample, tighter than QUORUM_ERROR when almost all the components leave
+        n = len(components)
+        halfWidth = SocialGroup.QUORUM_Z * math.sqrt(leavingFraction * (1 - leavingFraction) / sampleSize * (n - sampleSize) / (n - 1))
+        if leavingFraction + halfWidth >= (n - 1) / n: # might disband
+            logging.info(f"{type(self).__name__} {self.id} sampled quorum is close to disband, evaluating all the components")
+            return None
+
+        leavingIndividualsAndDirection = dict(sampledLeaving)
+        if leavingChoices:
+            unsampled = [c for c in components if c not in decisions]
+            for c, draw in zip(unsampled, rng.randoms(len(unsampled))):
+                if draw < leavingFraction:
+                    leavingIndividualsAndDirection[c] = rng.choice(rng.choice(leavingChoices))
+
+        return {**leavingIndividualsAndDirection, self:groupdecidedCoords}
 
     def __repr__(self):
         return f"SocialGroup, components:{self.components}"
@@ -678,15 +806,15 @@ class Herd(SocialGroup): # TODO - Add Herd Escape rankMoves logic
 
     ID = 1
 
+    DANGER_RINGS = (1, 0.6, 0.4) # herds sense carvizes at a longer distance, up to 2 cells beyond their neighborhood (see Erbast.DANGER_RINGS)
+
     def __init__(self, components: list[Erbast]):
-        super().__init__(components, neighborhoodDistance = NEIGHBORHOOD_HERD)
-        self.id = Herd.ID
+        self.id = Herd.ID # before the components join, the id identifies the group in the event trace
         Herd.ID += 1
+        super().__init__(components, neighborhoodDistance = NEIGHBORHOOD_HERD)
         self.preferredDirection = None
         self.preferredDirectionIntensity = 1 # number from 0 to 1
 
-        logging.info(f"HERD CREATION -> Herd {self.id} with components: {self.components}, current coords: {self.coords}, last coords: {self.lastCoords}, neighborhood distance: {self.neighborhoodDistance}, memory: {self.memory}")
-
 
     def rankMoves(self, worldGrid:'WorldGrid'):
         """
@@ -699,52 +827,32 @@ class Herd(SocialGroup): # TODO - Add Herd Escape rankMoves logic
 
         neighborhood = self.getNeighborhood(worldGrid, d = self.neighborhoodDistance)
         reachableCells = self.getNeighborhood(worldGrid, d = 1)
-        LandCell = getattr(sys.modules['world'], 'LandCell')
-        neighborhood = [el for el in neighborhood if isinstance(el, LandCell)]
-        reachableCells = [el for el in reachableCells if isinstance(el, LandCell)]
         # print(f"neighborhood Cells: {[cell.getCoords() for cell in neighborhood]}\nreachableCells: {[cell.getCoords() for cell in reachableCells]}")
         desirabilityScores = {cell:0 for cell in neighborhood}
         groupSociality = self.getGroupSociality()
         groupEnergy = self.getGroupEnergy()
         presentCell = self.getCell(worldGrid) # presentCell should be in neighborhood
+        rng = worldGrid.rng.movement # random stream of the environment
+        carvizDanger = worldGrid.getRingField("numCarviz", Herd.DANGER_RINGS) # shared by all the herds of the day
+        visitedCells = {worldGrid[coords] for coords in self.lastCoords[max(-len(self.lastCoords),-self.memory):]}
 
         for cell in desirabilityScores:
 
             # Carviz danger evaluation --------------------------------
 
-            carvizDangerValue = cell.numCarviz * Erbast.CARVIZ_DANGER
-            desirabilityScores[cell] -= carvizDangerValue
-
-            # also neighbouring cells, if in range, should become more dangerous, but a bit less
+            # also neighbouring cells should become more dangerous, but a bit less
             # herd has a better sense of danger and try to stay as far as possible from carvizes
+            desirabilityScores[cell] -= float(carvizDanger[cell.coords]) * Erbast.CARVIZ_DANGER
 
             if(cell.numCarviz > 0):
-                x,y = cell.getCoords()
-
-                self.preferredDirection = getOppositeDirection(presentCell.getCoords(), (x,y)) #store last escape direction
+                self.preferredDirection = getOppositeDirection(presentCell.getCoords(), cell.getCoords()) #store last escape direction
                 self.preferredDirectionIntensity = 1 # raise intensity
 
-                nearbyCords = [(x-1, y-1),(x, y-1),(x+1, y-1),(x-1, y+1),(x, y+1),(x+1, y+1),(x-1, y),(x+1, y)]
-                nearbyCords_2 = [(x-2, y-2),(x-1, y-2),(x, y-2),(x+1, y-2),(x+2, y-2),
-                                 (x-2, y+2),(x-1, y+2),(x, y+2),(x+1, y+2),(x+2, y+2),
-                                 (x-2, y-1),(x+2, y-1),(x-2, y),(x+2, y),(x-2, y+1),(x+2, y+1)]
-
-                nearbyCells = [worldGrid[coords] for coords in nearbyCords if checkCoordsInBoundary(coords)]
-                nearbyCells_2 = [worldGrid[coords] for coords in nearbyCords_2 if checkCoordsInBoundary(coords)]
-
-                CellsInRange = [c for c in nearbyCells if c in reachableCells]
-                CellsInRange_2 = [c for c in nearbyCells_2 if c in reachableCells]
-
-                for c in CellsInRange:
-                    desirabilityScores[c] -= carvizDangerValue * 0.6
-                for c in CellsInRange_2:
-                    desirabilityScores[c] -= carvizDangerValue * 0.4
-
             if presentCell != cell:
 
                 # Other Erbast evaluation --------------------------------
 
-                individualTolerance = groupSociality * 5 + random.randint(0,10)# tolerance for the maximum number of erbasts (too many won't be able to share resources)
+                individualTolerance = groupSociality * 5 + rng.randint(0,10)# tolerance for the maximum number of erbasts (too many won't be able to share resources)
 
                 ourErbasts = presentCell.numErbast
                 theirErbasts = cell.numErbast
@@ -758,7 +866,7 @@ class Herd(SocialGroup): # TODO - Add Herd Escape rankMoves logic
 
                     # if we are the same number we can join or stay still by random choice
                     elif ourErbasts == theirErbasts:
-                        if random.random() > 0.5:
+                        if rng.random() > 0.5:
                             desirabilityScores[cell] += theirErbasts * groupSociality
                         else:
                             desirabilityScores[presentCell] += theirErbasts * groupSociality
@@ -776,7 +884,7 @@ class Herd(SocialGroup): # TODO - Add Herd Escape rankMoves logic
 
             # avoid going back --------------------------------
 
-            if cell in {worldGrid[coords] for coords in self.lastCoords[max(-len(self.lastCoords),-self.memory):]}: 
+            if cell in visitedCells: 
                 desirabilityScores[cell] -= SocialGroup.GOING_BACK_PENALTY
 
         
@@ -862,56 +970,29 @@ class Pride(SocialGroup):
 
     ID = 1
 
+    PREY_RINGS = (1, 0.6, 0.4, 0.3) # prides track erbasts at a longer distance, up to 3 cells beyond their neighborhood (see Erbast.DANGER_RINGS)
+
     def __init__(self, components: list[Carviz]):
-        super().__init__(components, neighborhoodDistance = NEIGHBORHOOD_PRIDE)
-        self.id = Carviz.ID
+        self.id = Carviz.ID # before the components join, the id identifies the group in the event trace
         Carviz.ID += 1
+        super().__init__(components, neighborhoodDistance = NEIGHBORHOOD_PRIDE)
 
     def rankMoves(self, worldGrid:'WorldGrid'): #done, ig
 
         neighborhood = self.getNeighborhood(worldGrid, d = self.neighborhoodDistance)
         reachableCells = self.getNeighborhood(worldGrid, d = 1)
-        LandCell = getattr(sys.modules['world'], 'LandCell')
-        neighborhood = [el for el in neighborhood if isinstance(el, LandCell)]
-        reachableCells = [el for el in reachableCells if isinstance(el, LandCell)]
         # print(f"neighborhood Cells: {[cell.getCoords() for cell in neighborhood]}\nreachableCells: {[cell.getCoords() for cell in reachableCells]}")
         desirabilityScores = {cell:0 for cell in neighborhood}
         groupSociality = self.getGroupSociality()
         groupEnergy = self.getGroupEnergy()
         presentCell = self.getCell(worldGrid) # presentCell should be in neighborhood
+        rng = worldGrid.rng.movement # random stream of the environment
+        preyAttraction = worldGrid.getRingField("numErbast", Pride.PREY_RINGS) # shared by all the prides of the day
 
         for cell in desirabilityScores:
 
-            cellInterest = cell.numErbast * Carviz.ERBAST_NEED
-            desirabilityScores[cell] += cellInterest
-
-            # also neighbouring cells, if in range, should become more attractive, but a bit less
-            if(cell.numErbast > 0):
-                x,y = cell.getCoords()
-                # TODO - should use a function...
-                nearbyCords = [(x-1, y-1),(x, y-1),(x+1, y-1),(x-1, y+1),(x, y+1),(x+1, y+1),(x-1, y),(x+1, y)]
-                nearbyCords_2 = [(x-2, y-2),(x-1, y-2),(x, y-2),(x+1, y-2),(x+2, y-2),
-                                 (x-2, y+2),(x-1, y+2),(x, y+2),(x+1, y+2),(x+2, y+2),
-                                 (x-2, y-1),(x+2, y-1),(x-2, y),(x+2, y),(x-2, y+1),(x+2, y+1)]
-                nearbyCoords_3 = [(x-3, y-3),(x-2, y-3),(x-1, y-3),(x, y-3),(x+1, y-3),(x+2, y-3),(x+3, y-3),
-                                    (x-3, y+3),(x-2, y+3),(x-1, y+3),(x, y+3),(x+1, y+3),(x+2, y+3),(x+3, y+3),
-                                    (x-3, y-2),(x+3, y-2),(x-3, y-1),(x+3, y-1),(x-3, y),(x+3, y),(x-3, y+1),(x+3, y+1),(x-3, y+2),(x+3, y+2)]
-                nearbyCells = [worldGrid[coords] for coords in nearbyCords if checkCoordsInBoundary(coords)]
-                nearbyCells_2 = [worldGrid[coords] for coords in nearbyCords_2 if checkCoordsInBoundary(coords)]
-                nearbyCells_3 = [worldGrid[coords] for coords in nearbyCoords_3 if checkCoordsInBoundary(coords)]
-
-                CellsInRange = [c for c in nearbyCells if c in reachableCells]
-                CellsInRange_2 = [c for c in nearbyCells_2 if c in reachableCells]
-                CellsInRange_3 = [c for c in nearbyCells_3 if c in reachableCells]
-
-                for c in CellsInRange:
-                    desirabilityScores[c] += cellInterest * 0.6
-
-                for c in CellsInRange_2:
-                    desirabilityScores[c] += cellInterest * 0.4
-
-                for c in CellsInRange_3:
-                    desirabilityScores[c] += cellInterest * 0.3
+            # also neighbouring cells should become more attractive, but a bit less
+            desirabilityScores[cell] += float(preyAttraction[cell.coords]) * Carviz.ERBAST_NEED
 
             # Vegetob is not a priority for Carvizes, but it makes sense for them to look for Erbasts in food rich zones
             desirabilityScores[cell] += cell.getVegetobDensity() * Carviz.VEG_NEED
@@ -921,7 +1002,7 @@ class Pride(SocialGroup):
 
                 # other carvizes evaluation --------------------------------
 
-                individualTolerance = groupSociality * 4 + random.randint(0,7) # tolerance for the maximum number of carvizes (too many won't be able to share resources)
+                individualTolerance = groupSociality * 4 + rng.randint(0,7) # tolerance for the maximum number of carvizes (too many won't be able to share resources)
 
                 ourCarvizes = presentCell.numCarviz
                 theirCarvizes = cell.numCarviz
@@ -935,7 +1016,7 @@ class Pride(SocialGroup):
 
                     # if we are the same number we can join or stay still by random choice
                     elif ourCarvizes == theirCarvizes:
-                        if random.random() > 0.5:
+                        if rng.random() > 0.5:
                             desirabilityScores[cell] += theirCarvizes * groupSociality
                         else:
                             desirabilityScores[presentCell] += theirCarvizes * groupSociality
@@ -0,0 +1,116 @@
+"""
+Streams of simulated days.
+
+Environment.days yields a DayRecord for every simulated day. The records only hold copies of the
+state of the environment, so they can be passed to consumers (statistics writers, renderers,
+analyzers) chained as generators:
+
+    for record in pipeline(environment.days(100, changes=True), stage1, stage2):
+        ...
+
+buffered runs the simulation in a background thread ahead of its consumer, keeping at most `size`
+records: with skip=True a slow consumer skips the oldest days instead of stalling the engine.
+"""
+
+import threading
+from collections import deque
+
+class DayRecord():
+    """
+    State of the environment at the end of a day:
+        - day: number of the day
+        - statistics: the statistics of the day, as in Environment.statistics
+        - changedCells: (n, 2) array with the coords of the cells whose vegetob or creatures changed during the day, if requested
+        - snapshot: the layers of WorldGrid.snapshot at the end of the day, if requested
+    """
+
+    __slots__ = ("day", "statistics", "changedCells", "snapshot")
+
+    def __init__(self, day:int, statistics:dict[str, float], changedCells = None, snapshot:dict = None):
+        self.day = day
+        self.statistics = statistics
+        self.changedCells = changedCells
+        self.snapshot = snapshot
+
+    def __repr__(self):
+        changed = f", {len(self.changedCells)} changed cells" if self.changedCells is not None else ""
+        return f"DayRecord(day {self.day}{changed})"
+
+def pipeline(records, *stages):
+    """chain generator stages, each stage takes an iterable of records and yields records"""
+    for stage in stages:
+        records = stage(records)
+    return records
+
+class BufferedDays():
+    """Iterator over records produced in a background thread, see buffered"""
+
+    def __init__(self, records, size:int, skip:bool):
+        if size < 1:
+            raise ValueError(f"size must be a positive number of records, received {size}")
+        self.size = size
+        self.skip = skip
+        self.skipped = 0 # records discarded because the consumer was behind
+        self._buffer = deque()
+        self._condition = threading.Condition()
+        self._done = False
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(target=self._produce, args=(records,), daemon=True)
+        self._thread.start()
+
+    def _produce(self, records):
+        try:
+            for record in records:
+                with self._condition:
+                    while not self.skip and len(self._buffer) >= self.size and not self._closed:
+                        self._condition.wait()
+                    if self._closed:
+                        return
+                    if len(self._buffer) >= self.size: # skip the oldest day
+                        self._buffer.popleft()
+                        self.skipped += 1
+                    self._buffer.append(record)
+                    self._condition.notify_all()
+        except BaseException as e:
+            self._error = e
+        finally:
+            with self._condition:
+                self._done = True
+                self._condition.notify_all()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._condition:
+            while not self._buffer and not self._done:
+                self._condition.wait()
+            if self._buffer:
+                record = self._buffer.popleft()
+                self._condition.notify_all()
+                return record
+        if self._error is not None:
+            raise self._error
+        raise StopIteration
+
+    def close(self):
+        """stop the producer after the record it is working on, the records in the buffer are discarded"""
+        with self._condition:
+            self._closed = True
+            self._buffer.clear()
+            self._condition.notify_all()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def buffered(records, size:int = 8, skip:bool = True) -> BufferedDays:
+    """
+    Produce the records in a background thread, at most `size` of them wait for the consumer.
+    When the buffer is full the oldest record is discarded (skip=True) or the producer waits (skip=False)
+    """
+    return BufferedDays(records, size, skip)
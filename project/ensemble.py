@@ -0,0 +1,261 @@
+"""
+Parameter sweeps and seed ensembles of headless runs.
+
+The runs are the product of a grid of parameter overrides, a list of maps and a list of seeds,
+they are simulated across worker processes and every finished run is appended to a single
+.jsonl results file (one JSON object per line, with the outcome and the daily statistics of the run).
+
+A parameter is either a constant of planisuss_constants.py (e.g. GROWING, ENERGY_LOSS_E) or a class
+attribute of creatures.py (e.g. Erbast.CARVIZ_DANGER, Carviz.ERBAST_NEED). The override rebinds the
+constant in the modules that import it, so a constant copied at import time (a default argument or a
+class attribute) would silently keep its value: such constants are refused.
+A run stops early when a species goes extinct (unless disabled) or when it exceeds its timeout.
+Every run has its own worker process: the run checks its timeout at the end of every day and returns the
+days simulated so far, the parent kills a run still going KILL_GRACE seconds after its timeout (a runaway day)
+and reports the runs whose worker crashed, so a single run never blocks the ensemble.
+
+Usage (from the project folder):
+    python ensemble.py --param GROWING=1,2,4 --param Erbast.CARVIZ_DANGER=0.3,0.6 --maps map1 map2 --seeds 10 --days 300 --output sweeps/growing.jsonl
+"""
+
+import argparse
+import ast
+import functools
+import itertools
+import json
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+import creatures
+from planisuss_constants import *
+from headless import MAPS_FILE, loadMapPreset, createEnvironment, isExtinct
+
+KILL_GRACE = 10.0 # seconds a run can exceed its timeout to end its day and return its statistics before it is killed
+
+PARAMETER_MODULES = ("planisuss_constants", "creatures", "world", "movement", "terrain") # modules importing the constants with *
+
+@functools.lru_cache(maxsize=None)
+def _frozenConstants(module:str) -> frozenset[str]:
+    """names evaluated once when the module is imported: default arguments and class attributes"""
+    with open(sys.modules[module].__file__, "r") as f:
+        tree = ast.parse(f.read())
+    frozen = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            values = node.args.defaults + [d for d in node.args.kw_defaults if d is not None]
+        elif isinstance(node, ast.ClassDef):
+            values = [statement.value for statement in node.body if isinstance(statement, (ast.Assign, ast.AnnAssign)) and statement.value is not None]
+        else:
+            continue
+        frozen.update(n.id for value in values for n in ast.walk(value) if isinstance(n, ast.Name))
+    return frozenset(frozen)
+
+def _parameterTargets(name:str) -> list[tuple[object, str]]:
+    """objects holding a parameter and the name of the attribute"""
+    if "." in name:
+        className, attribute = name.split(".", 1)
+        cls = getattr(creatures, className, None)
+        if not isinstance(cls, type) or not hasattr(cls, attribute):
+            raise KeyError(f"{name} is not a class attribute of creatures.py")
+        return [(cls, attribute)]
+    targets = [(sys.modules[module], name) for module in PARAMETER_MODULES if module in sys.modules and hasattr(sys.modules[module], name)]
+    if not targets:
+        raise KeyError(f"{name} is not a constant of planisuss_constants.py")
+    frozenIn = [module for module in PARAMETER_MODULES if module in sys.modules and name in _frozenConstants(module)]
+    if frozenIn:
+        raise KeyError(f"{name} is bound at import time (default argument or class attribute) in {', '.join(frozenIn)}, it can't be overridden")
+    return targets
+
+@contextmanager
+def overrideParameters(overrides:dict):
+    """set the parameters for the duration of the context, the previous values are restored afterwards"""
+    saved = [] # target, attribute, previous value or None if the attribute was inherited
+    try:
+        for name, value in overrides.items():
+            for target, attribute in _parameterTargets(name):
+                own = attribute in vars(target)
+                saved.append((target, attribute, getattr(target, attribute) if own else None, own))
+                setattr(target, attribute, value)
+        yield
+    finally:
+        for target, attribute, value, own in reversed(saved):
+            if own:
+                setattr(target, attribute, value)
+            else:
+                delattr(target, attribute)
+
+def buildRuns(grid:dict[str, list], maps:list, seeds:list[int], mapsFile:str = MAPS_FILE) -> list[dict]:
+    """
+    One run for every combination of parameter values, map and seed.
+    grid maps each parameter to its values, maps are names of map presets or map configurations
+    """
+    names = list(grid)
+    mapConfigs = [(m, loadMapPreset(m, mapsFile)) if isinstance(m, str) else (m.get("name", f"map{i}"), m) for i, m in enumerate(maps)]
+    runs = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        for (mapName, mapConfig), seed in itertools.product(mapConfigs, seeds):
+            runs.append({
+                "run" : len(runs),
+                "overrides" : dict(zip(names, values)),
+                "map" : mapName,
+                "mapConfig" : mapConfig,
+                "seed" : seed,
+            })
+    return runs
+
+def runMember(run:dict, days:int = NUMDAYS, numErbast:int = 50, numCarviz:int = 50, timeout:float = None, stopWhenExtinct:bool = True) -> dict:
+    """
+    Worker task: simulate a run, returns its outcome and its daily statistics.
+    status is completed, extinct (a species died out) or timeout, horizon is the number of days the run was meant to last
+    """
+    start = time.perf_counter()
+    with overrideParameters(run["overrides"]):
+        environment = createEnvironment(run["mapConfig"], randomSeed=run["seed"])
+        environment.populate(numErbast, numCarviz)
+        status = "completed"
+        for record in environment.days(days):
+            if stopWhenExtinct and isExtinct(environment):
+                status = "extinct"
+                break
+            if timeout is not None and time.perf_counter() - start > timeout:
+                status = "timeout"
+                break
+        environment.close()
+
+    statistics = {"day": environment.statistics.getDays().tolist()}
+    statistics.update({name: values.tolist() for name, values in environment.statistics.items()})
+    return {
+        **{key: run[key] for key in ("run", "overrides", "map", "seed")},
+        "status" : status,
+        "days" : environment.day + 1,
+        "horizon" : days,
+        "finalErbasts" : environment.totErbast,
+        "finalCarvizes" : environment.totCarviz,
+        "seconds" : round(time.perf_counter() - start, 3),
+        "statistics" : statistics,
+    }
+
+def _failedRun(run:dict, status:str, error:str) -> dict:
+    """result of a run that returned no statistics"""
+    return {**{key: run[key] for key in ("run", "overrides", "map", "seed")}, "status": status, "error": error}
+
+def _worker(connection, run:dict, arguments:tuple, logLevel:int):
+    """process of a run, sends its result to the parent"""
+    logging.getLogger().setLevel(logLevel)
+    try:
+        result = runMember(run, *arguments)
+    except Exception as e:
+        result = _failedRun(run, "error", repr(e))
+    connection.send(result)
+    connection.close()
+
+def runEnsemble(runs:list[dict], resultsPath:str, days:int = NUMDAYS, numErbast:int = 50, numCarviz:int = 50, workers:int = None,
+                timeout:float = None, stopWhenExtinct:bool = True, logLevel:int = logging.ERROR, onResult = None) -> dict[str, int]:
+    """
+    Simulate the runs in at most `workers` processes at a time, each finished run is appended to resultsPath as soon as it is done
+    and passed to onResult if given (e.g. the add of an aggregate.EnsembleAggregate, or a progress report).
+    Runs that fail or whose worker crashes are written with status error, runs killed KILL_GRACE seconds after their timeout
+    with status timeout, both without statistics. Returns the number of runs by status
+    """
+    directory = os.path.dirname(resultsPath)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    workers = workers or os.cpu_count()
+    arguments = (days, numErbast, numCarviz, timeout, stopWhenExtinct)
+    pending = deque(runs)
+    running = {} # connection -> (process, run, time after which the process is killed or None)
+    outcomes = {}
+    with open(resultsPath, "a") as results:
+
+        def finish(result:dict):
+            results.write(json.dumps(result) + "\n")
+            results.flush()
+            outcomes[result["status"]] = outcomes.get(result["status"], 0) + 1
+            logging.info(f"run {result['run']} ({sum(outcomes.values())}/{len(runs)}): {result['status']} after {result.get('days')} days")
+            if onResult is not None:
+                onResult(result)
+
+        try:
+            while pending or running:
+                while pending and len(running) < workers:
+                    run = pending.popleft()
+                    receiver, sender = multiprocessing.Pipe(duplex=False)
+                    process = multiprocessing.Process(target=_worker, args=(sender, run, arguments, logLevel), daemon=True)
+                    process.start()
+                    sender.close()
+                    running[receiver] = (process, run, time.monotonic() + timeout + KILL_GRACE if timeout is not None else None)
+
+                deadlines = [deadline for _, _, deadline in running.values() if deadline is not None]
+                wait = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+                for receiver in multiprocessing.connection.wait(list(running), timeout=wait):
+                    process, run, _ = running.pop(receiver)
+                    try:
+                        result = receiver.recv()
+                    except EOFError: # the worker died before sending its result
+                        process.join()
+                        logging.error(f"Run {run['run']} failed: worker exited with code {process.exitcode}")
+                        result = _failedRun(run, "error", f"worker exited with code {process.exitcode}")
+                    receiver.close()
+                    process.join()
+                    finish(result)
+
+                now = time.monotonic()
+                for receiver, (process, run, deadline) in list(running.items()):
+                    if deadline is not None and now >= deadline:
+                        process.kill()
+                        process.join()
+                        receiver.close()
+                        del running[receiver]
+                        logging.warning(f"Run {run['run']} killed {KILL_GRACE} s after its timeout of {timeout} s")
+                        finish(_failedRun(run, "timeout", f"killed {KILL_GRACE} s after the timeout"))
+        finally: # interrupted, e.g. by KeyboardInterrupt
+            for receiver, (process, _, _) in running.items():
+                process.kill()
+                receiver.close()
+    return outcomes
+
+def loadResults(resultsPath:str):
+    """yields the runs of a results file one at a time"""
+    with open(resultsPath, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def _parseParameter(text:str) -> tuple[str, list]:
+    """NAME=v1,v2,... with JSON values"""
+    name, _, values = text.partition("=")
+    if not values:
+        raise argparse.ArgumentTypeError(f"parameters are given as NAME=v1,v2,..., received {text}")
+    return name, [json.loads(value) for value in values.split(",")]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Planisuss parameter sweeps and seed ensembles")
+    parser.add_argument("--param", type=_parseParameter, action="append", default=[], help="NAME=v1,v2,... values of a parameter to sweep")
+    parser.add_argument("--maps", nargs="+", default=["map1"], help="names of the map presets")
+    parser.add_argument("--maps-file", default=MAPS_FILE)
+    parser.add_argument("--seeds", type=int, default=5, help="number of seeds of every configuration")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--days", type=int, default=NUMDAYS)
+    parser.add_argument("--erbasts", type=int, default=50)
+    parser.add_argument("--carvizes", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=None, help="number of processes, all the cpus by default")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds after which a run is stopped")
+    parser.add_argument("--keep-extinct", action="store_true", help="keep simulating after a species goes extinct")
+    parser.add_argument("--output", required=True, help=".jsonl file the results are appended to")
+    args = parser.parse_args()
+
+    runs = buildRuns(dict(args.param), args.maps, list(range(args.first_seed, args.first_seed + args.seeds)), args.maps_file)
+    start = time.perf_counter()
+    done = 0
+    def progress(result:dict):
+        global done
+        done += 1
+        print(f"run {result['run']} ({done}/{len(runs)}): {result['status']} after {result.get('days')} days")
+    outcomes = runEnsemble(runs, args.output, days=args.days, numErbast=args.erbasts, numCarviz=args.carvizes, workers=args.workers,
+                           timeout=args.timeout, stopWhenExtinct=not args.keep_extinct, onResult=progress)
+    print(f"{len(runs)} runs in {time.perf_counter() - start:.1f} s: {outcomes}, results in {args.output}")
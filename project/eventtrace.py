@@ -0,0 +1,206 @@
+"""
+Structured trace of the events of the simulation.
+
+Every event is a row of fixed size columns (day, kind, subject, other creature, coordinates, value)
+kept in preallocated numpy arrays, no text is produced while the simulation runs.
+An Environment records events only when it has been given an EventTrace, otherwise the call sites
+are skipped by a single `is not None` check.
+
+The events can be streamed to a .npz file, a block of events every chunkEvents events (and when
+the trace is closed), so that long runs use a bounded amount of memory.
+
+Reader:
+    python eventtrace.py trace.npz [--kind hunt] [--day 10] [--id 42] [--species Herd] [--summary]
+"""
+
+import argparse
+import os
+import zipfile
+import numpy as np
+
+EVENTS = ["move", "graze", "hunt", "death", "join", "split"]
+MOVE, GRAZE, HUNT, DEATH, JOIN, SPLIT = range(len(EVENTS))
+
+SPECIES = ["Erbast", "Carviz", "Herd", "Pride"]
+NONE = -1 # id, species and coordinates of the fields an event does not use
+
+COLUMNS = {
+    "day" : np.int32,
+    "kind" : np.uint8,
+    "species" : np.int8,
+    "id" : np.int32,
+    "otherSpecies" : np.int8,
+    "otherId" : np.int32,
+    "x" : np.int16,
+    "y" : np.int16,
+    "toX" : np.int16,
+    "toY" : np.int16,
+    "value" : np.float32,
+}
+
+# meaning of the columns for each kind of event
+#   move:  subject moves from (x, y) to (toX, toY), value is the number of individuals moving
+#   graze: subject grazes in (x, y), value is the amount of vegetob eaten
+#   hunt:  subject (Carviz or Pride) attacks other (Erbast) in (x, y), value is 1 if the erbast is killed, 0 otherwise
+#   death: subject dies in (x, y), other is the creature that killed it (if any), value is its age
+#   join:  subject joins the group other in (x, y)
+#   split: subject leaves the group other in (x, y), it is alone afterwards
+
+_speciesCodes = {} # class -> index in SPECIES
+
+def speciesCode(creature) -> int:
+    cls = type(creature)
+    code = _speciesCodes.get(cls)
+    if code is None:
+        code = _speciesCodes[cls] = SPECIES.index(cls.__name__)
+    return code
+
+class EventTrace():
+    """
+    Columnar buffer of the events of a simulation.
+    trace[column] returns the values of a column for the events in memory, in order of recording
+    """
+
+    def __init__(self, path:str = None, capacity:int = 4096, chunkEvents:int = 65536):
+        self.columns = {name: np.zeros(max(1, capacity), dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.size = 0 # events in memory
+        self.totalEvents = 0 # events recorded since the creation of the trace
+        self.day = 0 # day of the events being recorded, set by the environment
+
+        self.path = path
+        self.chunkEvents = chunkEvents
+        self._chunks = 0
+        if path is not None:
+            if os.path.splitext(path)[1] != ".npz":
+                raise ValueError(f"events can be streamed to .npz files, received {path}")
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with zipfile.ZipFile(path, "w") as zf:
+                _writeArray(zf, "events.npy", np.array(EVENTS))
+                _writeArray(zf, "species.npy", np.array(SPECIES))
+
+    def record(self, kind:int, subject, other = None, coords:tuple = (NONE, NONE), to:tuple = (NONE, NONE), value:float = 0):
+        """add an event, subject and other are creatures or social groups"""
+        i = self.size
+        columns = self.columns
+        if i == len(columns["day"]):
+            if self.path is not None and i >= self.chunkEvents:
+                self.flush()
+                i = 0
+            else:
+                for name, column in columns.items():
+                    columns[name] = np.concatenate((column, np.zeros_like(column)))
+        columns["day"][i] = self.day
+        columns["kind"][i] = kind
+        columns["species"][i] = speciesCode(subject)
+        columns["id"][i] = subject.id
+        if other is None:
+            columns["otherSpecies"][i] = NONE
+            columns["otherId"][i] = NONE
+        else:
+            columns["otherSpecies"][i] = speciesCode(other)
+            columns["otherId"][i] = other.id
+        columns["x"][i], columns["y"][i] = coords
+        columns["toX"][i], columns["toY"][i] = to
+        columns["value"][i] = value
+        self.size = i + 1
+        self.totalEvents += 1
+
+    def flush(self):
+        """write the events in memory to the .npz file"""
+        if self.path is None or self.size == 0:
+            return
+        with zipfile.ZipFile(self.path, "a") as zf:
+            for name, column in self.columns.items():
+                _writeArray(zf, f"{name}_{self._chunks:08d}.npy", column[:self.size])
+        self._chunks += 1
+        self.size = 0
+
+    def close(self):
+        """flush the events still in memory"""
+        self.flush()
+
+    def __getitem__(self, name:str) -> np.ndarray:
+        return self.columns[name][:self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+def _writeArray(zf:zipfile.ZipFile, name:str, array:np.ndarray):
+    with zf.open(name, "w") as f:
+        np.lib.format.write_array(f, array)
+
+def loadTrace(path:str) -> dict[str, np.ndarray]:
+    """read the events streamed by an EventTrace, returns the columns"""
+    with np.load(path) as data:
+        columns = {}
+        for name, dtype in COLUMNS.items():
+            blocks = [data[key] for key in sorted(data.files) if key.startswith(f"{name}_")]
+            columns[name] = np.concatenate(blocks) if blocks else np.zeros(0, dtype=dtype)
+    return columns
+
+def select(columns:dict[str, np.ndarray], kind:str = None, day:int = None, id:int = None, species:str = None) -> dict[str, np.ndarray]:
+    """events of a kind, of a day and/or involving a creature (as subject or other), species narrows the creature down"""
+    mask = np.ones(len(columns["day"]), dtype=bool)
+    if kind is not None:
+        mask &= columns["kind"] == EVENTS.index(kind)
+    if day is not None:
+        mask &= columns["day"] == day
+    if id is not None or species is not None:
+        subject, other = np.ones_like(mask), np.ones_like(mask)
+        if id is not None:
+            subject &= columns["id"] == id
+            other &= columns["otherId"] == id
+        if species is not None:
+            subject &= columns["species"] == SPECIES.index(species)
+            other &= columns["otherSpecies"] == SPECIES.index(species)
+        mask &= subject | other
+    return {name: column[mask] for name, column in columns.items()}
+
+def _entity(species:int, id:int) -> str:
+    return f"{SPECIES[species]} {id}"
+
+def describe(columns:dict[str, np.ndarray]):
+    """yields a line of text for each event"""
+    for day, kind, species, id, otherSpecies, otherId, x, y, toX, toY, value in zip(*(columns[name].tolist() for name in COLUMNS)):
+        subject = _entity(species, id)
+        event = EVENTS[kind]
+        if kind == MOVE:
+            text = f"{subject} moves from ({x}, {y}) to ({toX}, {toY}), {value:g} individuals"
+        elif kind == GRAZE:
+            text = f"{subject} grazes {value:g} vegetob at ({x}, {y})"
+        elif kind == HUNT:
+            text = f"{subject} {'kills' if value else 'fails to kill'} {_entity(otherSpecies, otherId)} at ({x}, {y})"
+        elif kind == DEATH:
+            killer = f", killed by {_entity(otherSpecies, otherId)}" if otherId != NONE else ""
+            text = f"{subject} dies at ({x}, {y}) aged {value:g}{killer}"
+        else:
+            text = f"{subject} {'joins' if kind == JOIN else 'leaves'} {_entity(otherSpecies, otherId)} at ({x}, {y})"
+        yield f"day {day:5d} {event:6s} {text}"
+
+def summary(columns:dict[str, np.ndarray]):
+    """yields a line for each day with the number of events of each kind"""
+    yield "  day " + " ".join(f"{event:>7s}" for event in EVENTS)
+    days = columns["day"]
+    if len(days) == 0:
+        return
+    first = int(days.min())
+    counts = np.zeros((int(days.max()) - first + 1, len(EVENTS)), dtype=np.int64)
+    np.add.at(counts, (days - first, columns["kind"]), 1)
+    for row, dayCounts in enumerate(counts):
+        yield f"{first + row:5d} " + " ".join(f"{count:7d}" for count in dayCounts)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Planisuss event trace reader")
+    parser.add_argument("path", help=".npz file written by an EventTrace")
+    parser.add_argument("--kind", choices=EVENTS, default=None, help="only the events of this kind")
+    parser.add_argument("--day", type=int, default=None, help="only the events of this day")
+    parser.add_argument("--id", type=int, default=None, help="only the events involving the creature or group with this id")
+    parser.add_argument("--species", choices=SPECIES, default=None, help="only the events involving a creature or group of this species")
+    parser.add_argument("--summary", action="store_true", help="number of events of each kind per day")
+    args = parser.parse_args()
+
+    events = select(loadTrace(args.path), kind=args.kind, day=args.day, id=args.id, species=args.species)
+    for line in (summary(events) if args.summary else describe(events)):
+        print(line)
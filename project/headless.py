@@ -0,0 +1,153 @@
+"""
+Headless runs of the simulation, without matplotlib and without the pacing of the animation.
+
+A run takes a map (a preset of maps_file.json or explicit noise parameters), a random initial population,
+a number of days and an output folder, then calls Environment.nextDay as fast as possible. The folder gets:
+    - run.json: the parameters of the run and, when it ends, its outcome and duration
+    - statistics.csv (or .npz): the daily statistics, streamed while the run goes on
+    - snapshots/day_XXXXX.npz (and initial.npz): the vegetob and the number of creatures of every cell, every snapshotEvery days
+    - events.npz: the event trace, when requested
+    - simulation.log: the log of the run
+
+Usage (from the project folder):
+    python headless.py --map map1 --days 500 --output runs/map1
+    python headless.py --noise-seed 28 --threshold 0.42 --octaves 33 --days 200 --erbasts 100 --output runs/custom --snapshot-every 10
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+import numpy as np
+from planisuss_constants import *
+from world import Environment
+from logpipeline import setupLogging
+
+MAPS_FILE = "files//maps_file.json"
+
+MAP_PARAMETERS = ["seed", "threshold", "octaves", "persistence", "lacunarity", "scale", "dynamic"]
+
+DEFAULT_MAP = {
+    "seed" : None,
+    "threshold" : 0.2,
+    "octaves" : 8,
+    "persistence" : 0.4,
+    "lacunarity" : 1.8,
+    "scale" : 40.0,
+    "dynamic" : False,
+} # same defaults of Environment
+
+def loadMapPreset(name:str, mapsFile:str = MAPS_FILE) -> dict:
+    """noise parameters of a map of the catalog, as the start menu uses them"""
+    with open(mapsFile, 'r') as f:
+        configs = json.load(f)
+    if name not in configs:
+        raise KeyError(f"{name} is not a map of {mapsFile}, available maps: {', '.join(configs)}")
+    mapConfig = {key: configs[name][key] for key in MAP_PARAMETERS}
+    if mapConfig["seed"] == 1: # only the 6th map uses dynamic generation, see Interface.set_params_env
+        mapConfig["dynamic"] = True
+    return mapConfig
+
+def createEnvironment(mapConfig:dict, **kwargs) -> Environment:
+    return Environment(threshold=mapConfig["threshold"], seed=mapConfig["seed"], octaves=mapConfig["octaves"],
+                       persistence=mapConfig["persistence"], lacunarity=mapConfig["lacunarity"], scale=mapConfig["scale"],
+                       dynamic=mapConfig["dynamic"], **kwargs)
+
+def isExtinct(environment:Environment) -> bool:
+    """True when the Erbasts or the Carvizes are all dead"""
+    return environment.totErbast == 0 or environment.totCarviz == 0
+
+def saveSnapshot(environment:Environment, folder:str, name:str = None):
+    """save the grid of the current day, by default in day_XXXXX.npz"""
+    os.makedirs(folder, exist_ok=True)
+    name = name or f"day_{environment.day:05d}"
+    np.savez_compressed(os.path.join(folder, f"{name}.npz"), day=environment.day, **environment.getGrid().snapshot())
+
+def runHeadless(mapConfig:dict, outputDir:str, days:int = NUMDAYS, numErbast:int = 50, numCarviz:int = 50, seed:int = None,
+                snapshotEvery:int = 0, trace:bool = False, statsFormat:str = "csv", stopWhenExtinct:bool = False) -> dict:
+    """
+    Simulate `days` days and write the results in outputDir, returns the content of run.json.
+    seed is the seed of the random streams of the environment (population and simulation), drawn from the OS if None,
+    stopWhenExtinct ends the run as soon as one of the species has died out
+    """
+    if statsFormat not in ("csv", "npz"):
+        raise ValueError(f"statsFormat must be csv or npz, received {statsFormat}")
+    os.makedirs(outputDir, exist_ok=True)
+    run = {
+        "map" : mapConfig,
+        "days" : days,
+        "erbasts" : numErbast,
+        "carvizes" : numCarviz,
+        "seed" : seed,
+        "snapshotEvery" : snapshotEvery,
+    }
+    runFile = os.path.join(outputDir, "run.json")
+    with open(runFile, "w") as f:
+        json.dump(run, f, indent=4)
+
+    environment = createEnvironment(mapConfig, statsPath=os.path.join(outputDir, f"statistics.{statsFormat}"),
+                                    trace=os.path.join(outputDir, "events.npz") if trace else None, randomSeed=seed)
+    run["seed"] = environment.rng.seed # the run can be replayed even if the seed was not given
+    environment.populate(numErbast, numCarviz)
+    snapshots = os.path.join(outputDir, "snapshots")
+    if snapshotEvery:
+        saveSnapshot(environment, snapshots, "initial")
+
+    start = time.perf_counter()
+    try:
+        for record in environment.days(days):
+            if snapshotEvery and (record.day + 1) % snapshotEvery == 0:
+                saveSnapshot(environment, snapshots)
+            if stopWhenExtinct and isExtinct(environment):
+                logging.warning(f"a species is extinct at day {environment.day}, the run ends")
+                break
+    finally:
+        environment.close()
+    elapsed = time.perf_counter() - start
+
+    run.update({
+        "simulatedDays" : environment.day + 1,
+        "extinct" : isExtinct(environment),
+        "finalErbasts" : environment.totErbast,
+        "finalCarvizes" : environment.totCarviz,
+        "seconds" : round(elapsed, 3),
+    })
+    with open(runFile, "w") as f:
+        json.dump(run, f, indent=4)
+    return run
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Planisuss headless runner")
+    parser.add_argument("--map", default=None, help="name of a map preset of the maps file, overrides the noise parameters")
+    parser.add_argument("--maps-file", default=MAPS_FILE)
+    parser.add_argument("--noise-seed", type=int, default=DEFAULT_MAP["seed"], help="seed of the terrain noise")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_MAP["threshold"])
+    parser.add_argument("--octaves", type=int, default=DEFAULT_MAP["octaves"])
+    parser.add_argument("--persistence", type=float, default=DEFAULT_MAP["persistence"])
+    parser.add_argument("--lacunarity", type=float, default=DEFAULT_MAP["lacunarity"])
+    parser.add_argument("--scale", type=float, default=DEFAULT_MAP["scale"])
+    parser.add_argument("--dynamic", action="store_true", help="land masses grow from the center of the map")
+    parser.add_argument("--erbasts", type=int, default=50, help="initial number of Erbasts")
+    parser.add_argument("--carvizes", type=int, default=50, help="initial number of Carvizes")
+    parser.add_argument("--days", type=int, default=NUMDAYS, help="number of simulated days")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the population and of the simulation")
+    parser.add_argument("--output", required=True, help="folder of the results")
+    parser.add_argument("--snapshot-every", type=int, default=0, help="save the grid every n days, 0 to disable")
+    parser.add_argument("--stats-format", choices=["csv", "npz"], default="csv")
+    parser.add_argument("--trace", action="store_true", help="record the event trace")
+    parser.add_argument("--stop-when-extinct", action="store_true", help="end the run when a species dies out")
+    parser.add_argument("--log-level", default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    args = parser.parse_args()
+
+    if args.map is not None:
+        mapConfig = loadMapPreset(args.map, args.maps_file)
+    else:
+        mapConfig = {"seed": args.noise_seed, "threshold": args.threshold, "octaves": args.octaves, "persistence": args.persistence,
+                     "lacunarity": args.lacunarity, "scale": args.scale, "dynamic": args.dynamic}
+
+    os.makedirs(args.output, exist_ok=True)
+    setupLogging(os.path.join(args.output, "simulation.log"), level=getattr(logging, args.log_level))
+    run = runHeadless(mapConfig, args.output, days=args.days, numErbast=args.erbasts, numCarviz=args.carvizes, seed=args.seed,
+                      snapshotEvery=args.snapshot_every, trace=args.trace, statsFormat=args.stats_format, stopWhenExtinct=args.stop_when_extinct)
+    print(f"{run['simulatedDays']} days in {run['seconds']} s, {run['finalErbasts']} Erbasts and {run['finalCarvizes']} Carvizes left, results in {args.output}")
@@ -6,6 +6,8 @@ from matplotlib.offsetbox import OffsetImage, AnnotationBbox
 from matplotlib.colors import LinearSegmentedColormap
 from matplotlib.patches import Circle, BoxStyle, Rectangle
 from world import *
+from mapcatalog import buildMapCatalog, writeMapsFile, landToRGB, saveImage
+from logpipeline import setupLogging
 from planisuss_constants import *
 from PIL import Image
 from scipy.ndimage import gaussian_filter
@@ -20,21 +22,10 @@ import os
 import json
 import time
 
-# Logging files for debugging the interface and the simulation
-logging.basicConfig(level=logging.INFO, 
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                    filename='animation_debug.log',
-                    filemode='w')
+# Log file for debugging the interface and the simulation, written by a background thread (see logpipeline.py)
+logPipeline = setupLogging("animation_debug.log", level=logging.INFO)
 logger = logging.getLogger('Interface')
 
-log_filename = f"run_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.log"
-logging.basicConfig(
-    filename="planisuss_events.log",
-    filemode="w",        
-    level=logging.INFO,
-    format="%(levelname)s - %(message)s",
-)
-
 class Interface():
 
     """
@@ -134,9 +125,9 @@ class Interface():
         self.stats_pressed = False
         self.interval_val = 2000
 
-    def env_params(self, dynamic):
+    def env_params(self, dynamic, n_samples=50):
         """
-        Generate a set of random parameters for the world generation
+        Generate a set of n_samples random parameters for the world generation
         The world is generated using Brownian motion with a set of parameters
         Parameters:
             - seeds : random seeds for the generation
@@ -149,7 +140,6 @@ class Interface():
             avoiding creation of land masses in the borders
         """
         # getting the parameters
-        n_samples = 50
         seeds = np.random.randint(1, 100, size=n_samples)
         thresholds = np.random.uniform(0.4, 0.6, size=n_samples)
         octaves_p = np.random.randint(30, 50, size=n_samples)
@@ -176,45 +166,12 @@ class Interface():
                 "dynamic": dynamic
             }
 
-        # saving the parameters to a file
-        self.save_to_file()
-        
         return self.WORLD_CONFIGS
 
     def save_to_file(self):
-        """Save map configurations to JSON file"""
-        # encoding the numpy datatypes into datatypes that can be read by json
-        serializable_configs = {}
-        
-        for map_name, config in self.WORLD_CONFIGS.items():
-            serializable_configs[map_name] = {
-                "path" : config["path"],
-                "seed": int(config["seed"]),
-                "threshold": float(config["threshold"]),
-                "octaves": int(config["octaves"]),
-                "persistence": float(config["persistence"]),
-                "lacunarity": float(config["lacunarity"]),
-                "scale": int(config["scale"]),
-                "dynamic": config["dynamic"]
-            }
-
-        # this is the case we want to add new configurations to the existing ones
-        existing_configs = {}
-        if os.path.exists(self.MAPS_FILE):
-            with open(self.MAPS_FILE, 'r') as f:
-                try:
-                    existing_configs = json.load(f)
-                    print(existing_configs)
-                except json.JSONDecodeError:
-                    print("error")
-                    existing_configs = {}
-
-        existing_configs.update(serializable_configs)
-        
-        with open(self.MAPS_FILE, 'w') as f:
-            json.dump(existing_configs, f, indent=4)
-        
-        print(f"Added {len(serializable_configs)} new map configurations to {self.MAPS_FILE}")
+        """Save map configurations to JSON file, adding them to the existing ones"""
+        existing_configs = writeMapsFile(self.WORLD_CONFIGS, self.MAPS_FILE)
+        print(f"Added {len(self.WORLD_CONFIGS)} new map configurations to {self.MAPS_FILE}")
         print(f"Total configurations: {len(existing_configs)}")
 
     def load_configs(self):
@@ -228,17 +185,17 @@ class Interface():
         else:
             print(f"No map configurations found in {self.MAPS_FILE}") # empty configurations handling
 
-    def run_simulation(self, map_selection=False, dynamic=False):
+    def run_simulation(self, map_selection=False, dynamic=False, n_maps=50, workers=None):
         """
         Main method for running the simulation, if map_selection is True then it will not
-        show the menu and the simulation will not start it only serves for map generation.
+        show the menu and the simulation will not start it only serves for map generation:
+        n_maps candidate maps are generated across a pool of workers processes and added to the maps file.
         If map_selection is False then the simulation will start and the maps can be selected
         from the start menu
         """
         if map_selection:
-            env_params = self.env_params(dynamic)
-            for map_name, config in env_params.items():
-                self.set_params_env(map_name)
+            env_params = self.env_params(dynamic, n_maps)
+            self.CHOOSEN_MAPS = buildMapCatalog(env_params, self.MAPS_FILE, workers=workers)
         else:
             plt.ion() 
             self.start_menu()
@@ -410,10 +367,6 @@ class Interface():
         of the initial tests we did for testing some features of the simulation.
         Recommened to use the random type for generating the population
         """
-        grid_shape = environment.getGrid().shape
-        land_cells = [(x, y) for x in range(grid_shape[0]) for y in range(grid_shape[1])
-                    if environment.isLand(x, y)]
-
         if type == "test1":
             erb1 = Erbast((25,25), energy=100, name="erb 1")
             erb2 = Erbast((25,25), energy=5, name="erb 2")
@@ -469,15 +422,7 @@ class Interface():
             environment.add(erb)
 
         if type == "random":
-            for i in range(nErb):
-                (x, y) = random.choice(land_cells)
-                erb = Erbast((x, y), SocialAttitude = random.random())
-                environment.add(erb)
-
-            for i in range(nCarv):
-                (x, y) = random.choice(land_cells)
-                carv = Carviz((x, y), SocialAttitude = random.random())
-                environment.add(carv)
+            environment.populate(nErb, nCarv)
 
     def create_map_and_start(self):
         """
@@ -875,7 +820,7 @@ class Interface():
 
             return
         
-        days = [0] + list(range(1, self.currentDay+1))
+        days = stats.getDays().tolist() # the days kept in memory by the statistics store
         
         if len(days) < 4:
             print("Not enough days to show stats")
@@ -894,12 +839,10 @@ class Interface():
         # Axis for the population growth rates and their growth difference each day
         ax2 = fig_stats.add_subplot(3, 3, 2)
         ax2.grid(True, alpha=0.3)
-        erb_change = [stats["Number of Erbasts"][i+1] - stats["Number of Erbasts"][i] 
-                 for i in range(len(days)-1)]
-        carv_change = [stats["Number of Carvizes"][i+1] - stats["Number of Carvizes"][i] 
-                  for i in range(len(days)-1)]
+        erb_change = stats.change("Number of Erbasts")
+        carv_change = stats.change("Number of Carvizes")
         # computing the difference between the growth rates of Erbasts and Carvizes
-        growth_diff = [erb - carv for erb, carv in zip(erb_change, carv_change)]
+        growth_diff = erb_change - carv_change
         ax2.plot(days[1:], erb_change, label="Erbast", color=self.ERBAST_COLOR)
         ax2.plot(days[1:], carv_change, label="Carviz", color=self.CARVIZ_COLOR)
 
@@ -970,8 +913,7 @@ class Interface():
         ax6.set_xlabel("Days", fontsize=8, color=self.FONT_COLOR)
         ax6.set_ylabel("Predator-Prey Ratio", fontsize=8, color=self.FONT_COLOR)
         ax6.set_title("Predator-Prey Ratio", fontsize=10, color=self.FONT_COLOR)
-        pred_prey_ratio = [car / erb if erb > 0 else 0 
-                           for erb, car in zip(stats["Number of Erbasts"], stats["Number of Carvizes"])]
+        pred_prey_ratio = stats.ratio("Number of Carvizes", "Number of Erbasts")
         ax6.plot(days, pred_prey_ratio, label="Predator-Prey Ratio", color=[247/255, 179/255, 204/255])
         ax6.legend(fontsize=6)
 
@@ -988,8 +930,7 @@ class Interface():
 
         # Plotting success rate of hunts
         ax7b = ax7.twinx()
-        success_rate = [succ_h / num_h if num_h > 0 else 0 
-                        for succ_h, num_h in zip(stats["Successfull Hunts"], stats["Number of Hunts"])]
+        success_rate = stats.ratio("Successfull Hunts", "Number of Hunts")
         ax7b.plot(days, success_rate, label="Success Rate", color=[132/255, 185/255, 191/255], linestyle='--')
         ax7b.set_ylabel("Success Rate", fontsize=8, color=self.FONT_COLOR)
         ax7b.legend(loc='lower right',fontsize=6)
@@ -1033,44 +974,16 @@ class Interface():
         It will color the land cells with a brownish color and the water cells with a blue color
         At the same time a gradient will be applied to smooth the colors of the map
         """
-        grid_rgb = np.zeros((grid.shape[0], grid.shape[1], 3), dtype=np.uint8)
-        get_type = np.vectorize(lambda cell: cell.getCellType()) # Tipo di cella
-        cell_types = get_type(grid) # return an array of cell types
-        base_color_land = [139, 69, 19] 
-        base_color_water = [65, 105, 225]
-        grid_rgb[cell_types == 'land'] = base_color_land
-        grid_rgb[cell_types == "water"] = base_color_water
-
-        land_mask = (cell_types == 'land')
-        water_mask = (cell_types == 'water')
-        gradient_land = np.zeros((grid.shape[0], grid.shape[1]), dtype=np.float32)
-        gradient_water = np.zeros((grid.shape[0], grid.shape[1]), dtype=np.float32)
-        gradient_land[land_mask] = 1.0 # setting the land cells to 1
-        gradient_water[water_mask] = 1.0 # setting the water cells to 1
-
-        self.apply_filter(gradient_land, base_color_land, land_mask, grid_rgb)
-        self.apply_filter(gradient_water, base_color_water, water_mask, grid_rgb)
+        grid_rgb = landToRGB(grid.land)
         
         # creating the images of the maps
         if save and seed is not None:
             filepath = f"{self.MAP_PATHS}//map_random_seed_{seed}.png"
         
             if not os.path.exists(filepath):
-                img = Image.fromarray(grid_rgb)
-                img.save(filepath)
+                saveImage(grid_rgb, filepath)
         
         return grid_rgb
-    
-    def apply_filter(self, gradient_arr, base_color, mask, grid_rgb):
-        """
-        Function to apply a gaussian filter to the gradient array and then apply the color to the grid
-        using the mask
-        The filter will be applied by convolving the smooth gradient array with the base color
-        to simulate a smooth change in the colors in the map
-        """
-        smooth_gradient_land = gaussian_filter(gradient_arr, sigma=1.5)
-        smooth_color_land = np.array(base_color) * smooth_gradient_land[..., np.newaxis]
-        grid_rgb[mask] = np.clip(smooth_color_land[mask], 0, 255).astype(np.uint8)
 
     def start(self):
         """
@@ -0,0 +1,145 @@
+"""
+Non blocking logging for the interface and the simulation.
+
+The records are put in a bounded in-process queue by the thread that logs and written to a rotating
+file by a background listener thread, so the disk never stalls Interface.update or Environment.nextDay.
+    - a full queue drops the record instead of waiting, the drops are counted per logger
+    - a call site (logger and line) that logs more than `burst` records in `period` seconds is
+      rate limited, the suppressed records are counted and reported once the period is over
+    - the log file is rotated when it reaches maxBytes, the log of the previous run is kept as the first backup
+
+Usage:
+    pipeline = setupLogging("animation_debug.log")
+    ...
+    pipeline.stop() # also done at exit
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `burst` records per call site every `period` seconds.
+    When a limited call site logs again after its period, the first record reports how many were suppressed
+    """
+
+    def __init__(self, burst:int = 50, period:float = 1.0, clock = time.monotonic):
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self.clock = clock
+        self.windows = {} # call site -> [start of the period, records let through, records suppressed]
+        self.suppressed = Counter() # logger name -> suppressed records
+        self._lock = threading.Lock()
+
+    def filter(self, record:logging.LogRecord) -> bool:
+        site = (record.name, record.pathname, record.lineno)
+        now = self.clock()
+        with self._lock:
+            window = self.windows.get(site)
+            if window is None or now - window[0] >= self.period:
+                if window is not None and window[2]:
+                    record.msg = f"{record.msg} ({window[2]} similar messages suppressed)"
+                self.windows[site] = [now, 1, 0]
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.suppressed[record.name] += 1
+            return False
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks, the records that don't fit in the queue are dropped and counted"""
+
+    def __init__(self, q:queue.Queue):
+        super().__init__(q)
+        self.dropped = Counter() # logger name -> dropped records
+        self._lock = threading.Lock()
+
+    def enqueue(self, record:logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped[record.name] += 1
+
+class LogPipeline():
+    """Queue, rate limiter and background writer of the log records of the root logger"""
+
+    def __init__(self, filename:str, level:int = logging.INFO, maxBytes:int = 5_000_000, backupCount:int = 3,
+                 queueSize:int = 10_000, burst:int = 50, period:float = 1.0, format:str = FORMAT):
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.filename = filename
+        self.level = level
+        self.fileHandler = logging.handlers.RotatingFileHandler(filename, maxBytes=maxBytes, backupCount=backupCount, delay=True)
+        if backupCount > 0 and os.path.exists(filename) and os.path.getsize(filename) > 0:
+            self.fileHandler.doRollover() # every run starts a new file
+        self.fileHandler.setFormatter(logging.Formatter(format))
+
+        self.rateLimit = RateLimitFilter(burst=burst, period=period)
+        self.queueHandler = DroppingQueueHandler(queue.Queue(maxsize=queueSize))
+        self.queueHandler.addFilter(self.rateLimit)
+        self.listener = logging.handlers.QueueListener(self.queueHandler.queue, self.fileHandler, respect_handler_level=True)
+        self.running = False
+
+    @property
+    def dropped(self) -> int:
+        """records dropped because the queue was full"""
+        return sum(self.queueHandler.dropped.values())
+
+    @property
+    def suppressed(self) -> int:
+        """records suppressed by the rate limiter"""
+        return sum(self.rateLimit.suppressed.values())
+
+    def counters(self) -> dict[str, dict[str, int]]:
+        """dropped and suppressed records per logger"""
+        return {"dropped": dict(self.queueHandler.dropped), "suppressed": dict(self.rateLimit.suppressed)}
+
+    def start(self):
+        """route the records of the root logger through the queue"""
+        if self.running:
+            return
+        root = logging.getLogger()
+        root.addHandler(self.queueHandler)
+        root.setLevel(self.level)
+        self.listener.start()
+        self.running = True
+
+    def stop(self):
+        """write the records still in the queue and the counters, then close the file"""
+        if not self.running:
+            return
+        self.running = False
+        logging.getLogger().removeHandler(self.queueHandler)
+        self.listener.stop()
+        if self.dropped or self.suppressed:
+            counters = self.counters()
+            self.fileHandler.handle(logging.makeLogRecord({
+                "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": f"{self.dropped} log records dropped (queue full): {counters['dropped']}, "
+                       f"{self.suppressed} suppressed (rate limit): {counters['suppressed']}",
+            }))
+        self.fileHandler.close()
+
+_pipeline = None
+
+def setupLogging(filename:str, **kwargs) -> LogPipeline:
+    """start the log pipeline of the process, later calls return the running one"""
+    global _pipeline
+    if _pipeline is None or not _pipeline.running:
+        _pipeline = LogPipeline(filename, **kwargs)
+        _pipeline.start()
+        atexit.register(_pipeline.stop)
+    return _pipeline
@@ -0,0 +1,150 @@
+"""
+Parallel generation of the map catalog.
+
+Every candidate map configuration is turned into its terrain and preview image by a
+pool of worker processes, the catalog (maps_file.json) is written once, atomically,
+after all the workers have finished.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import json
+import logging
+import os
+import tempfile
+import numpy as np
+from PIL import Image
+from scipy.ndimage import gaussian_filter
+from planisuss_constants import *
+from terrain import generateTerrain, terrainCache
+
+BASE_COLOR_LAND = [139, 69, 19]
+BASE_COLOR_WATER = [65, 105, 225]
+
+def _applyFilter(gradient_arr, base_color, mask, grid_rgb):
+    """
+    Apply a gaussian filter to the gradient array and then apply the color to the grid using the mask,
+    to simulate a smooth change in the colors of the map
+    """
+    smooth_gradient = gaussian_filter(gradient_arr, sigma=1.5)
+    smooth_color = np.array(base_color) * smooth_gradient[..., np.newaxis]
+    grid_rgb[mask] = np.clip(smooth_color[mask], 0, 255).astype(np.uint8)
+
+def landToRGB(land:np.ndarray) -> np.ndarray:
+    """
+    Translates a boolean land mask to an RGB matrix, land cells are brownish and water cells are blue,
+    a gradient is applied to smooth the colors of the map
+    """
+    land_mask = land.astype(bool)
+    water_mask = ~land_mask
+    grid_rgb = np.zeros((land.shape[0], land.shape[1], 3), dtype=np.uint8)
+    grid_rgb[land_mask] = BASE_COLOR_LAND
+    grid_rgb[water_mask] = BASE_COLOR_WATER
+
+    _applyFilter(land_mask.astype(np.float32), BASE_COLOR_LAND, land_mask, grid_rgb)
+    _applyFilter(water_mask.astype(np.float32), BASE_COLOR_WATER, water_mask, grid_rgb)
+    return grid_rgb
+
+def saveImage(grid_rgb:np.ndarray, filepath:str):
+    """Save the map preview, the file is replaced atomically so concurrent writers never leave a partial image"""
+    directory = os.path.dirname(filepath) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmpPath = tempfile.mkstemp(dir=directory, suffix=".png")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            Image.fromarray(grid_rgb).save(f, format="PNG")
+        os.replace(tmpPath, filepath)
+    except BaseException:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
+
+def serializeConfig(config:dict) -> dict:
+    """encode the numpy datatypes of a map configuration into datatypes that can be read by json"""
+    return {
+        "path" : config["path"],
+        "seed": int(config["seed"]),
+        "threshold": float(config["threshold"]),
+        "octaves": int(config["octaves"]),
+        "persistence": float(config["persistence"]),
+        "lacunarity": float(config["lacunarity"]),
+        "scale": int(config["scale"]),
+        "dynamic": bool(config["dynamic"])
+    }
+
+def terrainParams(config:dict) -> dict:
+    """parameters used to generate the terrain of a map configuration, only the maps with seed 1 use dynamic generation"""
+    return {
+        "seed": int(config["seed"]),
+        "threshold": float(config["threshold"]),
+        "octaves": int(config["octaves"]),
+        "persistence": float(config["persistence"]),
+        "lacunarity": float(config["lacunarity"]),
+        "scale": float(config["scale"]),
+        "dynamic": True if int(config["seed"]) == 1 else bool(config["dynamic"])
+    }
+
+def buildMap(map_name:str, config:dict, n:int = NUMCELLS, useCache:bool = True, preview:bool = True) -> tuple[str, dict]:
+    """
+    Worker task: generate the terrain of a map (warming the terrain cache) and, if preview, its preview image,
+    the image is not generated again if it already exists
+    """
+    params = terrainParams(config)
+    land, _ = generateTerrain(n, cache = terrainCache if useCache else None, **params)
+    if preview and not os.path.exists(config["path"]):
+        saveImage(landToRGB(land), config["path"])
+    return map_name, serializeConfig(config)
+
+def writeMapsFile(configs:dict, maps_file:str, merge:bool = True) -> dict:
+    """
+    Write the map configurations to the JSON catalog in a single atomic replace.
+    If merge the new configurations are added to the existing ones
+    """
+    existing_configs = {}
+    if merge and os.path.exists(maps_file):
+        with open(maps_file, 'r') as f:
+            try:
+                existing_configs = json.load(f)
+            except json.JSONDecodeError:
+                logging.error(f"{maps_file} is not a valid JSON file, it will be overwritten")
+
+    existing_configs.update({name: serializeConfig(config) for name, config in configs.items()})
+
+    directory = os.path.dirname(maps_file) or "."
+    fd, tmpPath = tempfile.mkstemp(dir=directory, suffix=".json")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(existing_configs, f, indent=4)
+        os.replace(tmpPath, maps_file)
+    except BaseException:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
+    return existing_configs
+
+def buildMapCatalog(configs:dict, maps_file:str, workers:int = None, n:int = NUMCELLS, useCache:bool = True) -> dict:
+    """
+    Generate terrain and preview image of every map configuration across a pool of processes.
+    Maps that fail are logged and left out, the catalog is written once after all workers finish.
+    Configurations sharing a preview path (the path depends only on the seed) are not raced,
+    the preview is drawn by the first of them as in a one at a time build.
+    Returns the whole catalog
+    """
+    built = {}
+    previewPaths = set()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for name, config in configs.items():
+            preview = config["path"] not in previewPaths
+            previewPaths.add(config["path"])
+            futures[name] = pool.submit(buildMap, name, config, n, useCache, preview)
+        for name, future in futures.items():
+            try:
+                map_name, config = future.result()
+                built[map_name] = config
+            except Exception as e:
+                logging.error(f"Generation of {name} failed: {e}")
+
+    catalog = writeMapsFile(built, maps_file)
+    print(f"Added {len(built)} new map configurations to {maps_file}")
+    print(f"Total configurations: {len(catalog)}")
+    return catalog
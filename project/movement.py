@@ -0,0 +1,331 @@
+"""
+Batch movement of the individuals.
+
+Instead of calling rankMoves on every alone Erbast and Carviz, their positions, energies and
+social attitudes are held in arrays and the moves in their neighborhood are scored all at once
+from the per-day count, field and vegetob arrays of the WorldGrid.
+The same batches hold the features of the cell of a social group, so that the votes of its
+members (see SocialGroup.moveChoice) only add their own social attitude, energy and tolerance on top.
+
+The tolerances and the tie-breaks are drawn from the movement stream of the environment, a RandomPool
+(see randomstreams.py) with separate blocks for the integers and the uniforms. The batch takes them in runs,
+the tolerances of all the individuals at once in the order of the per-object rankMoves (individual by
+individual, cell by cell) and the tie-breaks in the same order, so the random numbers are the same of
+rankMoves; the scores are summed in the same order, so for the same random state the batch gives exactly
+the same moves as Animal.moveChoice.
+"""
+
+import numpy as np
+from planisuss_constants import *
+from creatures import Erbast, Carviz, Animal, getOppositeDirection, getCellInDirection, checkCoordsInBoundary
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from world import WorldGrid
+
+def roundScores(scores:np.ndarray) -> np.ndarray:
+    """
+    Round the scores to 2 decimals like the builtin round does.
+    np.round scales by 100 before rounding, which can differ from round when the scaled value is close to .5
+    """
+    rounded = np.round(scores, 2)
+    scaled = scores * 100
+    ambiguous = np.isfinite(scaled) & (np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for idx in zip(*np.nonzero(ambiguous)):
+        rounded[idx] = round(float(scores[idx]), 2)
+    return rounded
+
+def batchOf(individuals:list[Animal]) -> 'IndividualsBatch':
+    """batch of the right species for the individuals"""
+    if individuals and isinstance(individuals[0], Carviz):
+        return CarvizBatch(individuals)
+    return ErbastBatch(individuals)
+
+class IndividualsBatch():
+    """
+    Positions, energies and social attitudes of a list of individuals of the same species.
+    The species batches gather the features of the cells around the individuals (cellFeatures)
+    and evaluate the other individuals of the neighborhood with the random tolerance of each individual (social)
+    """
+
+    def __init__(self, individuals:list[Animal]):
+        self.individuals = individuals
+        self.coords = np.array([ind.getCoords() for ind in individuals], dtype=np.intp).reshape(-1, 2)
+        self.energy = np.array([ind.getEnergy() for ind in individuals], dtype=float)
+        self.socialAttitude = np.array([ind.getSocialAttitude() for ind in individuals], dtype=float)
+        distances = {ind.neighborhoodDistance for ind in individuals}
+        self.neighborhoodDistance = distances.pop() if len(distances) == 1 else None
+        self.features = None
+
+    def __len__(self):
+        return len(self.individuals)
+
+    def prepare(self, worldGrid:'WorldGrid'):
+        """
+        Gather the features of the neighborhood of every individual, row by row.
+        Each cell is gathered once, individuals in the same cell share its features
+        """
+        d = self.neighborhoodDistance
+        self.rng = worldGrid.rng.movement
+        if (self.coords == self.coords[0]).all(): # social group
+            cells, inverse = self.coords[:1], np.zeros(len(self), dtype=np.intp)
+        else:
+            cells, inverse = np.unique(self.coords, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+        ids = worldGrid.getNeighborIds(cells, d) # -1 for water or outside the grid
+        flat = worldGrid.landIndex[np.maximum(ids, 0)]
+        valid = ids >= 0
+        features = self.cellFeatures(worldGrid, valid, flat)
+        self.valid = valid[inverse]
+        self.features = {name: feature[inverse] for name, feature in features.items()}
+        self.rows = {name: feature.tolist() for name, feature in features.items()}
+        self.rows["valid"] = valid.tolist()
+        self.cellOf = inverse.tolist()
+        self.draws = (valid.sum(axis=1) - 1).tolist() # tolerance draws of the individuals of each cell, one for each valid cell but their own
+        self.center = ids.shape[1] // 2
+        self.width = 2 * d + 1
+        offsets = np.abs(np.arange(-d, d + 1))
+        self.reachable = self.valid & (np.maximum.outer(offsets, offsets).reshape(-1) <= 1)
+
+    def cellFeatures(self, worldGrid:'WorldGrid', valid:np.ndarray, flat:np.ndarray) -> dict[str, np.ndarray]:
+        pass
+
+    def social(self, i:int) -> tuple[list[float], float]:
+        pass
+
+    def socialDraws(self, count:np.ndarray, factor:int, high:int) -> tuple[np.ndarray, ...]:
+        """
+        Vectorized tolerance test of social for all the individuals, count is the number of individuals of the species in each cell.
+        Returns the masks of the tolerated cells, of the cells the individuals want to join and of the cells whose individuals
+        would rather join them, and the social weights of the cells
+        """
+        others = self.valid.copy()
+        others[:, self.center] = False
+        tolerance = np.zeros(others.shape)
+        tolerance[others] = self.rng.randints(0, high, int(np.count_nonzero(others))) # row by row, like the calls of social
+        sa = self.socialAttitude[:, None]
+        tolerance = sa * factor + tolerance
+        ours = count[:, self.center, None]
+        weighted = count * sa
+        tolerated = others & (ours + count <= tolerance)
+        tie = tolerated & (ours == count)
+        tieBreaks = np.zeros(tie.shape)
+        tieBreaks[tie] = self.rng.randoms(int(np.count_nonzero(tie)))
+        join = tolerated & ((ours < count) | (tie & (tieBreaks > 0.5)))
+        joined = tolerated & ((tie & (tieBreaks <= 0.5)) | ((ours > count) & (count > 0)))
+        return tolerated, join, joined, weighted
+
+    def presentScores(self, joined:np.ndarray, weighted:np.ndarray, centerTerms:list[np.ndarray]) -> np.ndarray:
+        """sum, cell by cell like social, of the terms of the own cell and of the weights of the joined cells"""
+        contributions = np.where(joined, weighted, 0.0)
+        present = np.zeros(len(self))
+        for k in range(contributions.shape[1]):
+            if k == self.center:
+                for term in centerTerms:
+                    present = present + term
+            else:
+                present = present + contributions[:, k]
+        return present
+
+    def scoreMoves(self, worldGrid:'WorldGrid') -> np.ndarray:
+        pass
+
+    def vote(self, i:int) -> dict[tuple[int, int], float]:
+        pass
+
+    def chooseMoves(self, worldGrid:'WorldGrid') -> np.ndarray:
+        """coordinates chosen by every individual, an array of shape (len(individuals), 2)"""
+        if len(self) == 0:
+            return np.empty((0, 2), dtype=np.intp)
+        self.prepare(worldGrid)
+        scores = np.where(self.reachable, self.scoreMoves(worldGrid), -np.inf)
+        best = np.argmax(scores, axis=1) # first of the best moves, like max over the rankMoves dict
+        dx, dy = np.divmod(best, self.width)
+        d = self.neighborhoodDistance
+        return self.coords + np.stack([dx - d, dy - d], axis=1)
+
+    def moveChoice(self, worldGrid:'WorldGrid') -> dict[Animal, tuple[int, int]]:
+        """same result of calling moveChoice on every individual"""
+        if len(self) > 0 and self.neighborhoodDistance is None: # mixed neighborhoods can't be batched
+            choices = dict()
+            for ind in self.individuals:
+                choices.update(ind.moveChoice(worldGrid))
+            return choices
+        moves = self.chooseMoves(worldGrid)
+        return {ind: (int(x), int(y)) for ind, (x, y) in zip(self.individuals, moves)}
+
+    def _voteDict(self, i:int, scores:list[float]) -> dict[tuple[int, int], float]:
+        """{coords: score} of the reachable cells of the i-th individual, like rankMoves"""
+        x, y = self.individuals[i].getCoords()
+        d = self.neighborhoodDistance
+        return {(x + k // self.width - d, y + k % self.width - d): round(score, 2)
+                for k, score in enumerate(scores) if self.reachable[i, k]}
+
+class ErbastBatch(IndividualsBatch):
+    """Vectorized Erbast.rankMoves"""
+
+    def __init__(self, individuals:list[Erbast]):
+        super().__init__(individuals)
+        self.preferredDirection = [ind.preferredDirection for ind in individuals]
+        self.preferredDirectionIntensity = [ind.preferredDirectionIntensity for ind in individuals]
+
+    def cellFeatures(self, worldGrid:'WorldGrid', valid:np.ndarray, flat:np.ndarray) -> dict[str, np.ndarray]:
+        return {
+            "numErbast": worldGrid.numErbast.take(flat),
+            "numCarviz": np.where(valid, worldGrid.numCarviz.take(flat), 0),
+            "danger": worldGrid.getRingField("numCarviz", Erbast.DANGER_RINGS).take(flat) * Erbast.CARVIZ_DANGER,
+            "vegetob": worldGrid.getVegetobs(flat),
+        }
+
+    def social(self, i:int) -> tuple[list[float], float]:
+        """other erbasts evaluation of the i-th erbast, tolerance draws follow the order of rankMoves"""
+        cell = self.cellOf[i]
+        numErbast, danger, validRow = self.rows["numErbast"][cell], self.rows["danger"][cell], self.rows["valid"][cell]
+        sa = self.individuals[i].getSocialAttitude()
+        ourErbasts = numErbast[self.center]
+        social = [0.0] * len(validRow)
+        p = 0
+        draws = iter(self.rng.randints(0, 10, self.draws[cell]))
+        for k, isValid in enumerate(validRow):
+            if not isValid:
+                continue
+            if k == self.center:
+                p -= danger[k]
+                continue
+            individualTolerance = sa * 5 + next(draws)
+            theirErbasts = numErbast[k]
+            if ourErbasts + theirErbasts <= individualTolerance:
+                if ourErbasts < theirErbasts:
+                    social[k] = theirErbasts * sa
+                elif ourErbasts == theirErbasts:
+                    if self.rng.random() > 0.5:
+                        social[k] = theirErbasts * sa
+                    else:
+                        p += theirErbasts * sa
+                elif theirErbasts > 0:
+                    p += theirErbasts * sa
+            else:
+                social[k] = -(theirErbasts * sa)
+        return social, p
+
+    def _escape(self, i:int) -> int:
+        """
+        update the escape direction of the i-th erbast with the last carviz in its neighborhood,
+        returns the column of the escape cell or None
+        """
+        coords = self.individuals[i].getCoords()
+        d = self.neighborhoodDistance
+        numCarviz = self.rows["numCarviz"][self.cellOf[i]]
+        for k in range(len(numCarviz) - 1, -1, -1):
+            if numCarviz[k] > 0:
+                self.preferredDirection[i] = getOppositeDirection(coords, (coords[0] + k // self.width - d, coords[1] + k % self.width - d))
+                self.preferredDirectionIntensity[i] = 1
+                break
+        escapeCellCoords = getCellInDirection(coords, self.preferredDirection[i])
+        if checkCoordsInBoundary(escapeCellCoords) and escapeCellCoords != coords:
+            k = (escapeCellCoords[0] - coords[0] + d) * self.width + escapeCellCoords[1] - coords[1] + d
+            if self.valid[i, k] and self.preferredDirectionIntensity[i] > Erbast.ESCAPE_THRESHOLD:
+                return k
+        return None
+
+    def _escaped(self, i:int, scores:list, k:int):
+        """add the escape bonus of the i-th erbast to the escape cell and store its escape state"""
+        if k is not None:
+            scores[k] += self.preferredDirectionIntensity[i]
+            self.preferredDirectionIntensity[i] *= Erbast.ESCAPE_DECAY
+        ind = self.individuals[i]
+        ind.preferredDirection, ind.preferredDirectionIntensity = self.preferredDirection[i], self.preferredDirectionIntensity[i]
+
+    def scoreMoves(self, worldGrid:'WorldGrid') -> np.ndarray:
+        f = self.features
+        tolerated, join, joined, weighted = self.socialDraws(f["numErbast"], 5, 10)
+        crowded = self.valid & ~tolerated
+        crowded[:, self.center] = False
+        social = np.where(join, weighted, np.where(crowded, -weighted, 0.0))
+        present = self.presentScores(joined, weighted, [-f["danger"][:, self.center]])
+        scores = (0 - f["danger"]) + social + f["vegetob"] * Erbast.VEG_NEED
+
+        # staying likability evaluation
+        presentVegetob = f["vegetob"][:, self.center]
+        present += 2 - self.energy/MAX_ENERGY * 4
+        present += 1.5 * presentVegetob/MAX_GROWTH - 1
+        present += np.where((self.energy < 15) & (presentVegetob > 5), 10, 0)
+        scores[:, self.center] = present
+
+        # running away from carviz
+        for i in range(len(self)):
+            self._escaped(i, scores[i], self._escape(i))
+
+        return roundScores(scores)
+
+    def vote(self, i:int) -> dict[tuple[int, int], float]:
+        """scores of the i-th erbast, same result of its rankMoves"""
+        social, p = self.social(i)
+        cell = self.cellOf[i]
+        danger, vegetob = self.rows["danger"][cell], self.rows["vegetob"][cell]
+        scores = [((0 - danger[k]) + social[k]) + vegetob[k] * Erbast.VEG_NEED for k in range(len(social))]
+        energy = self.individuals[i].getEnergy()
+        p += 2 - energy/MAX_ENERGY * 4
+        p += 1.5 * vegetob[self.center]/MAX_GROWTH - 1
+        if energy < 15 and vegetob[self.center] > 5:
+            p += 10
+        scores[self.center] = p
+        self._escaped(i, scores, self._escape(i))
+        return self._voteDict(i, scores)
+
+class CarvizBatch(IndividualsBatch):
+    """Vectorized Carviz.rankMoves"""
+
+    def cellFeatures(self, worldGrid:'WorldGrid', valid:np.ndarray, flat:np.ndarray) -> dict[str, np.ndarray]:
+        return {
+            "numCarviz": worldGrid.numCarviz.take(flat),
+            "prey": worldGrid.getRingField("numErbast", Carviz.PREY_RINGS).take(flat) * Carviz.ERBAST_NEED,
+            "vegetob": worldGrid.getVegetobs(flat) * Carviz.VEG_NEED,
+        }
+
+    def social(self, i:int) -> tuple[list[float], float]:
+        """other carvizes evaluation of the i-th carviz, tolerance draws follow the order of rankMoves"""
+        cell = self.cellOf[i]
+        numCarviz, prey, vegetob, validRow = self.rows["numCarviz"][cell], self.rows["prey"][cell], self.rows["vegetob"][cell], self.rows["valid"][cell]
+        sa = self.individuals[i].getSocialAttitude()
+        ourCarvizes = numCarviz[self.center]
+        social = [0.0] * len(validRow)
+        p = 0
+        draws = iter(self.rng.randints(0, 7, self.draws[cell]))
+        for k, isValid in enumerate(validRow):
+            if not isValid:
+                continue
+            if k == self.center:
+                p += prey[k]
+                p += vegetob[k]
+                continue
+            individualTolerance = sa * 4 + next(draws)
+            theirCarvizes = numCarviz[k]
+            if ourCarvizes + theirCarvizes <= individualTolerance:
+                if ourCarvizes < theirCarvizes:
+                    social[k] = theirCarvizes * sa
+                elif ourCarvizes == theirCarvizes:
+                    if self.rng.random() > 0.5:
+                        social[k] = theirCarvizes * sa
+                    else:
+                        p += theirCarvizes * sa
+                elif theirCarvizes > 0:
+                    p += theirCarvizes * sa
+        return social, p
+
+    def scoreMoves(self, worldGrid:'WorldGrid') -> np.ndarray:
+        f = self.features
+        _, join, joined, weighted = self.socialDraws(f["numCarviz"], 4, 7)
+        social = np.where(join, weighted, 0.0)
+        present = self.presentScores(joined, weighted, [f["prey"][:, self.center], f["vegetob"][:, self.center]])
+        scores = f["prey"] + f["vegetob"] + social
+        scores[:, self.center] = present - 1.5
+        return roundScores(scores)
+
+    def vote(self, i:int) -> dict[tuple[int, int], float]:
+        """scores of the i-th carviz, same result of its rankMoves"""
+        social, p = self.social(i)
+        cell = self.cellOf[i]
+        prey, vegetob = self.rows["prey"][cell], self.rows["vegetob"][cell]
+        scores = [(prey[k] + vegetob[k]) + social[k] for k in range(len(social))]
+        scores[self.center] = p - 1.5
+        return self._voteDict(i, scores)
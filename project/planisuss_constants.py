@@ -58,4 +58,13 @@ GROWING = 2          # Vegetob density that grows per day.
 
 # our constants
 
-MAX_GROWTH = 200
\ No newline at end of file
+MAX_GROWTH = 200
+
+# terrain cache
+
+TERRAIN_CACHE_DIR = "files//terrain_cache"    # folder of the generated terrains
+TERRAIN_CACHE_MAX_BYTES = 64 * 1024 * 1024     # size bound of the terrain cache, least recently used terrains are evicted
+
+# random pools
+
+RANDOM_POOL_SIZE = 65536    # numbers drawn at once by the pooled random streams (movement and hunting)
@@ -0,0 +1,138 @@
+"""
+Seeded random generators of an Environment.
+
+Every Environment owns a RandomStreams: one seed is split (numpy SeedSequence) into independent
+child streams, one for each phase of the simulation that draws random numbers. The streams have the
+interface of random.Random, so the creatures draw from them as they did from the random module,
+but two environments never share a generator: runs with the same seed give the same days, whatever
+else is simulated in the same process or in other worker processes.
+
+The movement and hunting phases draw millions of numbers a day, one at a time. Their streams are
+RandomPools: a numpy generator fills large blocks of integers (one block for each range) and of uniforms,
+the draws only take the next number of a block, and whole runs of numbers can be taken at once by the
+vectorized movement (randints, randoms).
+
+    rng = RandomStreams(42)
+    rng.movement.randint(0, 10)
+    rng.movement.randints(0, 10, 25)
+"""
+
+import random
+from itertools import islice, tee
+import numpy as np
+from planisuss_constants import RANDOM_POOL_SIZE
+
+STREAMS = ("terrain", "population", "movement", "struggle", "hunting", "reproduction") # phases with their own generator
+
+POOLED_STREAMS = ("movement", "hunting") # hot loops, see RandomPool
+
+class RandomPool():
+    """
+    Numbers of a numpy Generator drawn in blocks of `size` and handed out one at a time or in runs,
+    a block is drawn again when it is used up.
+    Integers and uniforms have separate blocks (one for each range of the integers), so the sequence of the
+    integers of a range does not depend on the uniforms drawn in between, and the other way round.
+    The blocks are python lists read through iterators, a draw is a call to next
+    """
+
+    def __init__(self, seed:np.random.SeedSequence, size:int = RANDOM_POOL_SIZE):
+        if size < 1:
+            raise ValueError(f"size must be a positive number of draws, received {size}")
+        self.generator = np.random.default_rng(seed)
+        self.size = size
+        self._uniforms = iter(()) # iterator over the block of uniforms
+        self._integers = {} # (low, high) -> iterator over the block of integers of the range
+
+    def _uniformBlock(self):
+        self._uniforms = iter(self.generator.random(self.size).tolist())
+        return self._uniforms
+
+    def _integerBlock(self, low:int, high:int):
+        block = self._integers[(low, high)] = iter(self.generator.integers(low, high, self.size, endpoint=True).tolist())
+        return block
+
+    def random(self) -> float:
+        """uniform in [0, 1)"""
+        try:
+            return next(self._uniforms)
+        except StopIteration:
+            return next(self._uniformBlock())
+
+    def randoms(self, n:int) -> list[float]:
+        """the next n uniforms, the same numbers of n calls to random"""
+        values = list(islice(self._uniforms, n))
+        while len(values) < n:
+            values += islice(self._uniformBlock(), n - len(values))
+        return values
+
+    def randint(self, low:int, high:int) -> int:
+        """integer in [low, high], both included like random.randint"""
+        try:
+            return next(self._integers[(low, high)])
+        except (KeyError, StopIteration):
+            return next(self._integerBlock(low, high))
+
+    def randints(self, low:int, high:int, n:int) -> list[int]:
+        """the next n integers in [low, high], the same numbers of n calls to randint"""
+        values = list(islice(self._integers.get((low, high), ()), n))
+        while len(values) < n:
+            values += islice(self._integerBlock(low, high), n - len(values))
+        return values
+
+    def uniform(self, a:float, b:float) -> float:
+        return a + (b - a) * self.random()
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def sample(self, population, k:int) -> list:
+        """k distinct elements of population in random order (partial Fisher-Yates shuffle)"""
+        items = list(population)
+        n = len(items)
+        if not 0 <= k <= n:
+            raise ValueError(f"sample larger than population or is negative, received {k} of {n}")
+        for i in range(k):
+            j = i + int(self.random() * (n - i))
+            items[i], items[j] = items[j], items[i]
+        return items[:k]
+
+    def getstate(self) -> tuple:
+        """state of the generator and what is left of the blocks, see setstate"""
+        self._uniforms, uniforms = tee(self._uniforms)
+        integers = {}
+        for key, block in self._integers.items():
+            self._integers[key], integers[key] = tee(block)
+        return self.generator.bit_generator.state, list(uniforms), {key: list(block) for key, block in integers.items()}
+
+    def setstate(self, state:tuple):
+        generatorState, uniforms, integers = state
+        self.generator.bit_generator.state = generatorState
+        self._uniforms = iter(uniforms)
+        self._integers = {key: iter(block) for key, block in integers.items()}
+
+class RandomStreams():
+    """
+    Independent generators, one for each name of STREAMS, derived from a single seed: RandomPools of poolSize
+    numbers for the POOLED_STREAMS, random.Random for the others.
+    With seed None the seed is drawn from the OS entropy, it is kept in self.seed so that the run can be replayed
+    """
+
+    def __init__(self, seed:int = None, poolSize:int = RANDOM_POOL_SIZE):
+        sequence = np.random.SeedSequence(seed)
+        self.seed = sequence.entropy
+        for name, child in zip(STREAMS, sequence.spawn(len(STREAMS))):
+            if name in POOLED_STREAMS:
+                setattr(self, name, RandomPool(child, poolSize))
+            else:
+                setattr(self, name, random.Random(int.from_bytes(child.generate_state(4, np.uint64).tobytes(), "little")))
+
+    def getstate(self) -> dict[str, tuple]:
+        """state of every stream, see setstate"""
+        return {name: getattr(self, name).getstate() for name in STREAMS}
+
+    def setstate(self, state:dict[str, tuple]):
+        for name, streamState in state.items():
+            getattr(self, name).setstate(streamState)
+
+    def __repr__(self):
+        return f"RandomStreams(seed={self.seed})"
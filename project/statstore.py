@@ -0,0 +1,174 @@
+"""
+Columnar store of the daily statistics of the simulation.
+
+Each statistic is a column of a preallocated numpy array, one row per day.
+Without a window the array doubles its capacity when it is full, with a window only the
+last days are kept in memory (ring buffer) so that very long runs use a bounded amount of memory.
+
+The completed days can be streamed to disk while the simulation runs:
+    - .csv files get a line per day, flushed immediately so that the file can be tailed
+    - .npz files get a block of days every chunkDays days (and when the store is closed)
+loadStatistics reads both formats back.
+"""
+
+import csv
+import os
+import zipfile
+import numpy as np
+
+class StatisticsStore():
+    """
+    Daily statistics stored by column.
+    store[name] returns the values of a statistic for the days in memory, in chronological order
+    """
+
+    def __init__(self, columns:list[str], capacity:int = 64, window:int = None, path:str = None, chunkDays:int = 256):
+        if window is not None and window < 1:
+            raise ValueError(f"window must be a positive number of days, received {window}")
+        self.columns = list(columns)
+        self.index = {name: i for i, name in enumerate(self.columns)}
+        self.window = window
+        capacity = window if window is not None else max(1, capacity)
+        self.values = np.zeros((capacity, len(self.columns)), dtype=np.float64)
+        self.days = np.zeros(capacity, dtype=np.int64)
+        self.size = 0 # days in memory
+        self.start = 0 # row of the oldest day in memory, moves only when the window is full
+        self.totalDays = 0 # days recorded since the creation of the store
+
+        self.path = path
+        self.chunkDays = chunkDays
+        self._file = None
+        self._writer = None
+        self._chunk = [] # rows not yet written to the .npz file
+        self._chunks = 0
+        if path is not None:
+            self._openStream(path)
+
+    def _openStream(self, path:str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        extension = os.path.splitext(path)[1]
+        if extension == ".csv":
+            self._file = open(path, "w", newline="")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(["day"] + self.columns)
+            self._file.flush()
+        elif extension == ".npz":
+            with zipfile.ZipFile(path, "w") as zf:
+                with zf.open("columns.npy", "w") as f:
+                    np.lib.format.write_array(f, np.array(self.columns))
+        else:
+            raise ValueError(f"statistics can be streamed to .csv or .npz files, received {path}")
+
+    def record(self, day:int, values:dict[str, float]):
+        """add the statistics of a completed day, every column must be given"""
+        row = np.array([values[name] for name in self.columns], dtype=np.float64)
+        capacity = len(self.days)
+        if self.window is None and self.size == capacity:
+            self.values = np.concatenate((self.values, np.zeros_like(self.values)))
+            self.days = np.concatenate((self.days, np.zeros_like(self.days)))
+            capacity *= 2
+        i = (self.start + self.size) % capacity
+        self.values[i] = row
+        self.days[i] = day
+        if self.size < capacity:
+            self.size += 1
+        else: # full window, the oldest day is overwritten
+            self.start = (self.start + 1) % capacity
+        self.totalDays += 1
+        self._stream(day, row)
+
+    def _stream(self, day:int, row:np.ndarray):
+        if self._writer is not None:
+            self._writer.writerow([day] + row.tolist())
+            self._file.flush()
+        elif self.path is not None:
+            self._chunk.append(np.concatenate(([day], row)))
+            if len(self._chunk) >= self.chunkDays:
+                self.flush()
+
+    def flush(self):
+        """write the days still buffered to the .npz file"""
+        if not self._chunk:
+            return
+        with zipfile.ZipFile(self.path, "a") as zf:
+            with zf.open(f"days_{self._chunks:08d}.npy", "w") as f:
+                np.lib.format.write_array(f, np.array(self._chunk))
+        self._chunks += 1
+        self._chunk = []
+
+    def close(self):
+        """flush and close the file the days are streamed to"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+        elif self.path is not None:
+            self.flush()
+
+    def _rows(self) -> np.ndarray:
+        """rows of the days in memory in chronological order"""
+        rows = np.arange(self.start, self.start + self.size)
+        return rows % len(self.days) if self.start else rows
+
+    def __getitem__(self, name:str) -> np.ndarray:
+        column = self.values[:, self.index[name]]
+        if self.start == 0:
+            return column[:self.size]
+        return column[self._rows()]
+
+    def __contains__(self, name:str) -> bool:
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def keys(self) -> list[str]:
+        return list(self.columns)
+
+    def items(self):
+        for name in self.columns:
+            yield name, self[name]
+
+    def getDays(self) -> np.ndarray:
+        """day of each row in memory"""
+        return self.days[:self.size] if self.start == 0 else self.days[self._rows()]
+
+    def latest(self) -> dict[str, float]:
+        """statistics of the last recorded day"""
+        if self.size == 0:
+            return {}
+        row = self.values[(self.start + self.size - 1) % len(self.days)]
+        return dict(zip(self.columns, row.tolist()))
+
+    def change(self, name:str) -> np.ndarray:
+        """day to day change of a statistic, one value less than the days in memory"""
+        return np.diff(self[name])
+
+    def ratio(self, numerator:str, denominator:str) -> np.ndarray:
+        """ratio of two statistics day by day, 0 when the denominator is 0"""
+        num, den = self[numerator], self[denominator]
+        out = np.zeros(len(num))
+        np.divide(num, den, out=out, where=den > 0)
+        return out
+
+def loadStatistics(path:str) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """read the statistics streamed by a StatisticsStore, returns the days and the columns"""
+    extension = os.path.splitext(path)[1]
+    if extension == ".csv":
+        with open(path, newline="") as f:
+            header = next(csv.reader(f))
+        table = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+        columns = header[1:]
+    elif extension == ".npz":
+        with np.load(path) as data:
+            columns = data["columns"].tolist()
+            blocks = [data[key] for key in sorted(data.files) if key.startswith("days_")]
+        table = np.concatenate(blocks) if blocks else np.zeros((0, len(columns) + 1))
+    else:
+        raise ValueError(f"statistics can be read from .csv or .npz files, received {path}")
+    return table[:, 0].astype(np.int64), {name: table[:, i + 1] for i, name in enumerate(columns)}
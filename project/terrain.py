@@ -0,0 +1,265 @@
+"""
+Whole-grid terrain generation for Planisuss.
+
+The island maps are built from fractal brownian motion over 2D perlin noise.
+The reference implementation evaluated noise.pnoise2 once per cell and per octave,
+here the same noise is computed for the full coordinate mesh of an octave at once
+with numpy, reproducing the single precision arithmetic of the noise C extension.
+
+The C extension hashes a lattice corner as PERM[PERM[PERM[i + base] + j + base]], for most bases
+(the seed of a map) the inner lookup of some corners falls past the end of its 512 entries table and
+reads whatever follows it in memory. Here the indexes are wrapped around the table: the noise is
+bit-identical to noise.pnoise2 wherever the C extension stays within its table, the cells near the
+out of table corners differ, so a few cells of the land masks differ from the ones of the scalar loop
+(see benchmarks.benchmarkTerrain).
+
+Generated terrains are stored in a content addressed on-disk cache (TerrainCache),
+so that known maps are loaded instead of being generated again.
+"""
+
+import hashlib
+import json
+import logging
+from functools import lru_cache
+import os
+import tempfile
+from typing import Union
+import numpy as np
+from planisuss_constants import TERRAIN_CACHE_DIR, TERRAIN_CACHE_MAX_BYTES
+
+# permutation and gradient tables of the noise C extension (_noise.h)
+_PERM_BASE = [
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225, 140, 36, 103, 30, 69, 142,
+    8, 99, 37, 240, 21, 10, 23, 190, 6, 148, 247, 120, 234, 75, 0, 26, 197, 62, 94, 252, 219, 203, 117,
+    35, 11, 32, 57, 177, 33, 88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68, 175, 74, 165, 71,
+    134, 139, 48, 27, 166, 77, 146, 158, 231, 83, 111, 229, 122, 60, 211, 133, 230, 220, 105, 92, 41,
+    55, 46, 245, 40, 244, 102, 143, 54, 65, 25, 63, 161, 1, 216, 80, 73, 209, 76, 132, 187, 208, 89,
+    18, 169, 200, 196, 135, 130, 116, 188, 159, 86, 164, 100, 109, 198, 173, 186, 3, 64, 52, 217, 226,
+    250, 124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212, 207, 206, 59, 227, 47, 16, 58, 17, 182,
+    189, 28, 42, 223, 183, 170, 213, 119, 248, 152, 2, 44, 154, 163, 70, 221, 153, 101, 155, 167, 43,
+    172, 9, 129, 22, 39, 253, 19, 98, 108, 110, 79, 113, 224, 232, 178, 185, 112, 104, 218, 246, 97,
+    228, 251, 34, 242, 193, 238, 210, 144, 12, 191, 179, 162, 241, 81, 51, 145, 235, 249, 14, 239, 107,
+    49, 192, 214, 31, 181, 199, 106, 157, 184, 84, 204, 176, 115, 121, 50, 45, 127, 4, 150, 254, 138,
+    236, 205, 93, 222, 114, 67, 29, 24, 72, 243, 141, 128, 195, 78, 66, 215, 61, 156, 180]
+PERM = np.array(_PERM_BASE * 2, dtype=np.intp)
+
+GRAD3 = np.array([
+    [1, 1, 0], [-1, 1, 0], [1, -1, 0], [-1, -1, 0],
+    [1, 0, 1], [-1, 0, 1], [1, 0, -1], [-1, 0, -1],
+    [0, 1, 1], [0, -1, 1], [0, 1, -1], [0, -1, -1],
+    [1, 0, -1], [-1, 0, -1], [0, -1, 1], [0, 1, 1]], dtype=np.float32)
+
+REPEAT = np.float32(1024) # default repeat of noise.pnoise2
+
+def _fade(t):
+    """perlin quintic fade, same operation order of the C extension"""
+    return t * t * t * (t * (t * np.float32(6) - np.float32(15)) + np.float32(10))
+
+def _lerp(t, a, b):
+    return a + t * (b - a)
+
+@lru_cache(maxsize=None)
+def _gradientTables(base:int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Gradient components of the lattice corner (i, j), for i, j in [0, 256), as flat tables of size 256 * 256.
+    The corner hash PERM[PERM[PERM[i + base] + j + base]] with the inner indexes wrapped around the table,
+    PERM is two copies of the same 256 entries so the wrapped lookups equal the ones within the table
+    """
+    i = np.arange(256)[:, np.newaxis]
+    j = np.arange(256)[np.newaxis, :]
+    A = PERM.take((i + base) & 255)
+    hashes = PERM.take(PERM.take((A + j + base) & 255)) & 15
+    return GRAD3[hashes, 0].reshape(-1), GRAD3[hashes, 1].reshape(-1)
+
+def _latticeCoords(x:np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """returns the lattice indexes of the two corners around x and the position of x in the lattice cell"""
+    xf = x.astype(np.float32)
+    # exact equivalent of fmodf(x, 1024)
+    i = np.floor(xf - np.trunc(xf / REPEAT) * REPEAT).astype(np.intp)
+    return i & 255, (i + 1) & 255, xf - np.floor(xf)
+
+def perlinNoiseMesh(x:np.ndarray, y:np.ndarray, base:int = 0) -> np.ndarray:
+    """
+    Vectorized equivalent of noise.pnoise2(x[r], y[c], base = base) over the whole mesh
+    of the 1D coordinates x (rows) and y (columns), returns a float64 array of shape (len(x), len(y)).
+
+    Coordinates dependent computations are done once per row and per column, only the
+    corner gradients and the interpolation run on the full mesh
+    """
+    i, ii, xf = _latticeCoords(np.asarray(x, dtype=np.float64))
+    j, jj, yf = _latticeCoords(np.asarray(y, dtype=np.float64))
+    fx = _fade(xf)[:, np.newaxis]
+    fy = _fade(yf)[np.newaxis, :]
+    one = np.float32(1)
+
+    gradX, gradY = _gradientTables(base)
+    rows = i[:, np.newaxis] * 256
+    nextRows = ii[:, np.newaxis] * 256
+
+    def grad(cornerRows, cornerCols, dx, dy):
+        k = cornerRows + cornerCols[np.newaxis, :]
+        return dx[:, np.newaxis] * gradX.take(k) + dy[np.newaxis, :] * gradY.take(k)
+
+    return _lerp(fy, _lerp(fx, grad(rows, j, xf, yf),
+                               grad(nextRows, j, xf - one, yf)),
+                     _lerp(fx, grad(rows, jj, xf, yf - one),
+                               grad(nextRows, jj, xf - one, yf - one))).astype(np.float64)
+
+def fbmNoiseGrid(n:int, seed:int, octaves:int = 8, persistence:float = 0.4, lacunarity:float = 1.8, scale:float = 40.0) -> np.ndarray:
+    """
+    Fractal brownian motion over the whole n x n mesh, normalized in [0, 1].
+    Every octave is evaluated for all the cells in one batch, octaves are accumulated
+    in the same order of the scalar loop, the result is bit-identical where the noise is (see the module docstring)
+    """
+    coords = np.arange(n) / scale
+
+    grid = np.zeros((n, n))
+    amplitude = 1.0
+    frequency = 1.0
+    for _ in range(octaves):
+        grid += amplitude * perlinNoiseMesh(coords * frequency, coords * frequency, base = seed)
+        amplitude *= persistence
+        frequency *= lacunarity
+
+    min_val = np.min(grid)
+    max_val = np.max(grid)
+    return (grid - min_val) / (max_val - min_val)
+
+def landMask(values:np.ndarray, threshold:float = 0.2, dynamic:bool = False) -> np.ndarray:
+    """
+    Threshold the normalized fbm values, returns a numpy grid of zeros and ones.
+    If dynamic the threshold grows with the distance from the center of the map,
+    avoiding the creation of land masses on the borders
+    """
+    n = values.shape[0]
+    if dynamic:
+        center = n // 2
+        max_dist = center * np.sqrt(2)
+        i = np.arange(n)[:, np.newaxis]
+        j = np.arange(n)[np.newaxis, :]
+        distance = np.sqrt((i - center) ** 2 + (j - center) ** 2)
+        dynamic_treshold = threshold + (1 - threshold) * (distance / max_dist)
+        return np.where(values > dynamic_treshold, 1, 0)
+    return np.where(values > threshold, 1, 0)
+
+def generateTerrain(n:int, seed:int, threshold:float = 0.2, octaves:int = 8, persistence:float = 0.4, lacunarity:float = 1.8, scale:float = 40.0,
+                    dynamic:bool = False, cache:'TerrainCache' = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the boolean land mask and the initial vegetob densities (around 40, zero on water) of a map.
+    The densities are drawn from a generator seeded by the parameters of the map, so a map is always the same
+    whether it is generated or loaded. If a cache is given the terrain is loaded from it when the same map has already been generated,
+    otherwise it is generated and stored
+    """
+    key = TerrainCache.key(n, seed, threshold, octaves, persistence, lacunarity, scale, dynamic)
+    if cache is not None:
+        cached = cache.load(key)
+        if cached is not None:
+            return cached
+
+    values = fbmNoiseGrid(n, seed, octaves=octaves, persistence=persistence, lacunarity=lacunarity, scale=scale)
+    land = landMask(values, threshold, dynamic) > threshold
+    densities = np.zeros((n, n), dtype=np.int16)
+    rng = np.random.default_rng(int(key, 16))
+    densities[land] = 40 + rng.integers(-30, 40, size=np.count_nonzero(land), endpoint=True)
+
+    if cache is not None:
+        cache.save(key, land, densities)
+    return land, densities
+
+class TerrainCache():
+    """
+    On-disk cache of generated terrains.
+    Each terrain is a compressed .npz file holding the land mask and the initial vegetob densities,
+    named after a hash of the parameters that generated it. Files are written atomically, the
+    cache size is bounded by evicting the least recently used terrains (by file modification time,
+    refreshed on each hit)
+    """
+
+    VERSION = 4 # bump when the generation changes, old terrains will no longer be hit
+
+    def __init__(self, directory:str = TERRAIN_CACHE_DIR, maxBytes:int = TERRAIN_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.maxBytes = maxBytes
+
+    @staticmethod
+    def key(n:int, seed:int, threshold:float, octaves:int, persistence:float, lacunarity:float, scale:float, dynamic:bool) -> str:
+        """hash of the terrain parameters, numpy scalars are normalized so that equal maps share the key"""
+        params = {
+            "version": TerrainCache.VERSION,
+            "n": int(n),
+            "seed": int(seed),
+            "threshold": float(threshold),
+            "octaves": int(octaves),
+            "persistence": float(persistence),
+            "lacunarity": float(lacunarity),
+            "scale": float(scale),
+            "dynamic": bool(dynamic)
+        }
+        return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key:str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def load(self, key:str) -> Union[tuple[np.ndarray, np.ndarray], None]:
+        """returns (land mask, vegetob densities) if the terrain is cached, None otherwise"""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                land, vegetob = data["land"], data["vegetob"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Corrupted terrain cache file {path} ({e}), removing it")
+            self._remove(path)
+            return None
+        os.utime(path) # most recently used
+        return land, vegetob
+
+    def save(self, key:str, land:np.ndarray, vegetob:np.ndarray):
+        """store the terrain, then evict the least recently used ones if the cache is too big"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmpPath = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, land=land.astype(bool), vegetob=vegetob.astype(np.int16))
+            os.replace(tmpPath, self._path(key))
+        except OSError as e:
+            logging.warning(f"Could not write terrain cache file for {key}: {e}")
+            self._remove(tmpPath)
+            return
+        self.evict(keep=key)
+
+    def evict(self, keep:str = None):
+        """remove least recently used terrains until the cache fits in maxBytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz") and name != f"{keep}.npz":
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        keptSize = os.path.getsize(self._path(keep)) if keep is not None and os.path.exists(self._path(keep)) else 0
+        totalSize = keptSize + sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if totalSize <= self.maxBytes:
+                break
+            self._remove(path)
+            totalSize -= size
+
+    def clear(self):
+        """remove every cached terrain"""
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".npz"):
+                    self._remove(os.path.join(self.directory, name))
+
+    def _remove(self, path:str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+terrainCache = TerrainCache()
@@ -0,0 +1,18 @@
+import os
+import sys
+import logging
+import pytest
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT) # the modules of the project are imported from its folder, like main.py does
+
+import terrain
+
+@pytest.fixture(autouse=True)
+def projectFolder(monkeypatch, tmp_path):
+    """run from the project folder (relative paths of the files) with the terrain cache in a temporary folder"""
+    monkeypatch.chdir(PROJECT)
+    monkeypatch.setattr(terrain.terrainCache, "directory", str(tmp_path / "terrain_cache"))
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
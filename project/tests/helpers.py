@@ -0,0 +1,91 @@
+"""
+Populations and state comparisons shared by the tests and by benchmarks.py:
+both check that an optimized path leaves the simulation in the same state as its reference
+"""
+
+import numpy as np
+from world import Environment
+from creatures import Erbast, Carviz
+
+def populatedEnvironment(numErbast, numCarviz, seed, herdCells = None, **envParams):
+    """
+    Environment on a fixed map with randomly placed individuals, seed is the seed of its random streams.
+    If herdCells the erbasts are crowded in that number of cells
+    """
+    env = Environment(threshold=0.45, seed=28, octaves=33, persistence=0.32, lacunarity=2.26, scale=22, useCache=False, randomSeed=seed, **envParams)
+    rng = env.rng.population
+    land = np.argwhere(env.getGrid().land)
+    erbastCells = land[rng.sample(range(len(land)), herdCells)] if herdCells else land
+    for _ in range(numErbast):
+        x, y = erbastCells[rng.randrange(len(erbastCells))]
+        env.add(Erbast((int(x), int(y)), SocialAttitude=rng.random()))
+    for _ in range(numCarviz):
+        x, y = land[rng.randrange(len(land))]
+        env.add(Carviz((int(x), int(y)), SocialAttitude=rng.random()))
+    return env
+
+def escapeState(erbasts):
+    return [(erb.preferredDirection, erb.preferredDirectionIntensity) for erb in erbasts]
+
+def setEscapeState(erbasts, state):
+    for erb, (direction, intensity) in zip(erbasts, state):
+        erb.preferredDirection, erb.preferredDirectionIntensity = direction, intensity
+
+def _key(creature) -> tuple[str, int]:
+    """identifies a creature across the copies of an environment"""
+    return type(creature).__name__, creature.id
+
+def _members(group) -> frozenset:
+    """identifies a group across the copies of an environment, new groups get different ids in each copy"""
+    return frozenset(_key(c) for c in group.getComponents())
+
+def _gridState(env) -> dict:
+    """inhabitants, herd and prides of every inhabited cell"""
+    return {
+        cell.getCoords(): (
+            sorted(_key(c) for c in cell.getErbastList()),
+            sorted(_key(c) for c in cell.getCarvizList()),
+            _members(cell.getHerd()) if cell.getHerd() is not None else None,
+            sorted(sorted(_members(pride)) for pride in cell.getPrides()),
+            cell.numErbast,
+            cell.numCarviz,
+        )
+        for cell in env.getGrid().getInhabitedCells()
+    }
+
+def _registryState(env) -> dict:
+    """creatures, social groups and alone individuals of the environment registries"""
+    return {
+        species: (
+            sorted(_key(c) for c in env.creatures[species]),
+            sorted(sorted(_members(group)) for group in env.groups.getGroups(species)),
+            sorted(_key(c) for c in env.groups.getAlone(species)),
+            env.groups.members[species],
+            env.totals[species].energy,
+        )
+        for species in ("Erbast", "Carviz")
+    }
+
+def sameState(env, other) -> bool:
+    """the two environments have the same cells and registries"""
+    return (np.array_equal(env.getGrid().numErbast, other.getGrid().numErbast)
+            and np.array_equal(env.getGrid().numCarviz, other.getGrid().numCarviz)
+            and (env.totErbast, env.totCarviz) == (other.totErbast, other.totCarviz)
+            and _gridState(env) == _gridState(other)
+            and _registryState(env) == _registryState(other))
+
+def consistentCells(env) -> bool:
+    """every living erbast and carviz is listed once, in the cell of its coordinates, and the erbasts of a crowded cell form its herd"""
+    listed = {"Erbast": 0, "Carviz": 0}
+    for cell in env.getGrid().getInhabitedCells():
+        erbasts, carvizes = cell.getErbastList(), cell.getCarvizList()
+        herd = cell.getHerd()
+        if cell.numErbast != len(erbasts) or cell.numCarviz != len(carvizes):
+            return False
+        if any(c.getCoords() != cell.getCoords() or not c.alive for c in erbasts + carvizes):
+            return False
+        if len(erbasts) > 1 and (herd is None or set(herd.getComponents()) != set(erbasts)):
+            return False
+        listed["Erbast"] += len(erbasts)
+        listed["Carviz"] += len(carvizes)
+    return all(listed[species] == len(env.creatures[species]) for species in listed)
@@ -0,0 +1,27 @@
+import numpy as np
+from aggregate import EnsembleAggregate
+
+def _run(status:str, values:list, horizon:int = 6) -> dict:
+    return {"status": status, "horizon": horizon, "statistics": {"day": list(range(len(values))), "Number of Carvizes": values}}
+
+def test_extinct_runs_are_extended_to_the_horizon():
+    aggregate = EnsembleAggregate(["Number of Carvizes"])
+    aggregate.add(_run("completed", [4, 4, 4, 4, 4, 4]))
+    aggregate.add(_run("extinct", [4, 2, 0]))
+    series = aggregate["Number of Carvizes"]
+    assert series.getCount().tolist() == [2] * 6
+    assert series.getMean().tolist() == [4, 3, 2, 2, 2, 2] # not 4 after the extinction, the mean of the survivor alone
+
+def test_days_left_by_timeouts_are_not_extended():
+    aggregate = EnsembleAggregate(["Number of Carvizes"])
+    aggregate.add(_run("completed", [4, 4, 4, 4, 4, 4]))
+    aggregate.add(_run("timeout", [4, 2]))
+    aggregate.add(_run("timeout", [4, 2]))
+    assert np.allclose(aggregate.getCoverage(), [1, 1, 1 / 3, 1 / 3, 1 / 3, 1 / 3])
+
+def test_runs_without_statistics_are_not_counted():
+    aggregate = EnsembleAggregate(["Number of Carvizes"])
+    aggregate.add(_run("completed", [4, 4]))
+    aggregate.add({"status": "error", "error": "worker exited with code 1"})
+    assert aggregate.runs == 1
+    assert aggregate.status == {"completed": 1, "error": 1}
@@ -0,0 +1,47 @@
+import os
+import pytest
+import creatures
+import ensemble
+from creatures import Erbast, Carviz, Herd
+from ensemble import overrideParameters, buildRuns, runMember, runEnsemble, loadResults
+
+def test_override_applies_to_new_creatures():
+    with overrideParameters({"MAX_LIFE_E": 3, "MAX_ENERGY_E": 7, "MAX_LIFE_C": 4, "NEIGHBORHOOD_C": 3, "MEMORY_SOCIAL": 2}):
+        erbast = Erbast((3, 3))
+        carviz = Carviz((3, 3))
+        herd = Herd([Erbast((4, 4)), Erbast((4, 4))])
+        assert (erbast.lifetime, erbast.energy) == (3, 7)
+        assert (carviz.lifetime, carviz.neighborhoodDistance) == (4, 3)
+        assert herd.memory == 2
+    erbast = Erbast((3, 3))
+    assert (erbast.lifetime, erbast.energy) == (creatures.MAX_LIFE_E, creatures.MAX_ENERGY_E)
+
+def test_override_changes_the_simulation():
+    baseline, shortLives = buildRuns({"MAX_LIFE_E": [10, 3]}, ["map1"], [0])
+    baseline["overrides"] = {} # same run without overrides
+    default = runMember(baseline, days=8, stopWhenExtinct=False)
+    overridden = runMember(shortLives, days=8, stopWhenExtinct=False)
+    # erbasts born with a lifetime of 3 days reproduce (and die) from the 4th day on
+    assert default["statistics"]["Number of Erbasts"][:3] == overridden["statistics"]["Number of Erbasts"][:3]
+    assert default["statistics"]["Number of Erbasts"] != overridden["statistics"]["Number of Erbasts"]
+
+def test_constants_bound_at_import_are_refused():
+    with pytest.raises(KeyError):
+        with overrideParameters({"TERRAIN_CACHE_DIR": "elsewhere"}):
+            pass
+
+def test_runs_past_their_timeout_are_killed(monkeypatch, tmp_path):
+    monkeypatch.setattr(ensemble, "KILL_GRACE", 0.0) # killed as soon as the timeout expires, before the first day ends
+    runs = buildRuns({}, ["map1"], [0, 1])
+    received = []
+    outcomes = runEnsemble(runs, str(tmp_path / "results.jsonl"), days=1000, workers=2, timeout=0.0, onResult=received.append)
+    assert outcomes == {"timeout": 2}
+    assert sorted(result["run"] for result in received) == [0, 1]
+    assert all("statistics" not in result for result in loadResults(str(tmp_path / "results.jsonl")))
+
+def test_crashed_workers_are_reported(monkeypatch, tmp_path):
+    monkeypatch.setattr(ensemble, "runMember", lambda *args: os._exit(3)) # the workers are forked with the patched function
+    runs = buildRuns({}, ["map1"], [0, 1, 2])
+    outcomes = runEnsemble(runs, str(tmp_path / "results.jsonl"), days=5, workers=2)
+    assert outcomes == {"error": 3}
+    assert all(result["error"] == "worker exited with code 3" for result in loadResults(str(tmp_path / "results.jsonl")))
@@ -0,0 +1,77 @@
+import copy
+import sys
+import pytest
+from world import Environment
+from randomstreams import RandomStreams
+from benchmarks import objectMoves, batchMoves, groupMoves, baselineMove, orderFreeMoves
+from tests.helpers import populatedEnvironment, escapeState, setEscapeState, sameState, consistentCells
+
+DAYS = 4
+
+def _sameDraws(rng, reference, escaped, run):
+    """runs the two paths from the same random and escape state, returns their results and final states"""
+    randomState, escapes = rng.getstate(), escapeState(escaped)
+    referenceResult = reference()
+    referenceState = (rng.getstate(), escapeState(escaped))
+    rng.setstate(randomState)
+    setEscapeState(escaped, escapes)
+    result = run()
+    return referenceResult, result, referenceState, (rng.getstate(), escapeState(escaped))
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_batch_moves_equal_object_moves(seed):
+    env = populatedEnvironment(200, 100, seed)
+    grid = env.getGrid()
+    for _ in range(DAYS):
+        erbasts, carvizes = env.getAloneErbasts(), env.getAloneCarviz()
+        objectChoices, batchChoices, objectState, batchState = _sameDraws(
+            env.rng.movement, lambda: objectMoves(erbasts, carvizes, grid), erbasts, lambda: batchMoves(erbasts, carvizes, grid))
+        assert len(objectChoices) == len(erbasts) + len(carvizes) > 0
+        assert batchChoices == objectChoices
+        assert batchState == objectState
+        env.nextDay()
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_shared_votes_equal_own_votes(seed):
+    env = populatedEnvironment(600, 200, seed)
+    grid = env.getGrid()
+    for _ in range(DAYS):
+        groups = sorted(env.getHerds() + env.getPrides(), key=lambda group: (type(group).__name__, group.id))
+        members = [c for group in groups for c in group.getComponents()] + env.getHerds()
+        ownChoices, sharedChoices, ownState, sharedState = _sameDraws(
+            env.rng.movement, lambda: groupMoves(groups, grid, False), members, lambda: groupMoves(groups, grid, True))
+        assert groups
+        assert sharedChoices == ownChoices
+        assert sharedState == ownState
+        env.nextDay()
+
+def test_pooled_draws_equal_single_draws():
+    single, pooled = RandomStreams(7, poolSize=16).movement, RandomStreams(7, poolSize=16).movement
+    for n in (5, 16, 40, 1): # within a block and across several blocks
+        assert pooled.randints(0, 10, n) == [single.randint(0, 10) for _ in range(n)]
+        assert pooled.randoms(n) == [single.random() for _ in range(n)]
+        assert pooled.randint(0, 3) == single.randint(0, 3) # integers of another range have their own blocks
+    assert pooled.getstate() == single.getstate()
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_bulk_relocation_equals_baseline(seed):
+    env = populatedEnvironment(800, 150, seed, herdCells=10)
+    applied = []
+    bulkMove = env.move
+    def compare(nextCoords): # the order free moves of the day applied by both paths to copies of the environment
+        bulkEnv, bulkCoords = copy.deepcopy((env, nextCoords))
+        bulkCoords = orderFreeMoves(bulkEnv, bulkCoords)
+        baselineEnv, baselineCoords = copy.deepcopy((bulkEnv, bulkCoords))
+        baselineMove(baselineEnv, baselineCoords)
+        Environment.move(bulkEnv, bulkCoords)
+        applied.append(sameState(bulkEnv, baselineEnv) and consistentCells(bulkEnv))
+        bulkMove(nextCoords)
+    env.move = compare
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 20000)) # deep copies of the creatures graph
+    try:
+        for _ in range(DAYS):
+            env.nextDay()
+    finally:
+        sys.setrecursionlimit(limit)
+    assert applied == [True] * DAYS
@@ -1,106 +1,277 @@
 from collections import defaultdict
-import random
 from creatures import Vegetob, Erbast, Carviz, Animal, SocialGroup, Herd, Pride, Species, DeadCreature
 from planisuss_constants import *
 from typing import Union
 import numpy as np
-import noise
+from terrain import generateTerrain, TerrainCache, terrainCache
+from movement import ErbastBatch, CarvizBatch
+from statstore import StatisticsStore
+from eventtrace import EventTrace, MOVE, GRAZE, HUNT, DEATH, JOIN, SPLIT
+from daystream import DayRecord
+from randomstreams import RandomStreams
 import json
 import logging
-import pprint
+from scipy.ndimage import convolve
 
 ON = 255
 OFF = 0
 
+STATISTICS = [
+    "Number of Erbasts",
+    "Number of Carvizes",
+    "Number of Herds",
+    "Number of Prides",
+    "Average Herd Size",
+    "Average Pride Size",
+    "Average Erbast Energy",
+    "Average Carviz Energy",
+    "Number of Dead Creatures",
+    "Successfull Hunts",
+    "Number of Hunts",
+    "Average Vegetob Density",
+    "Average Erbast Social Attitude",
+    "Average Carviz Social Attitude",
+] # columns of Environment.statistics
+
+class CreatureRegistry():
+    """
+    Insertion ordered set of the living creatures of a species.
+    Adding, removing and membership tests take constant time, iteration follows the order of insertion
+    """
+
+    __slots__ = ("_creatures",)
+
+    def __init__(self, creatures = ()):
+        self._creatures = dict.fromkeys(creatures)
+
+    def append(self, creature:Animal):
+        self._creatures[creature] = None
+
+    def extend(self, creatures:list[Animal]):
+        self._creatures.update(dict.fromkeys(creatures))
+
+    def remove(self, creature:Animal):
+        try:
+            del self._creatures[creature]
+        except KeyError:
+            raise ValueError(f"{creature} is not in the registry") from None
+
+    def removeAll(self, creatures:list[Animal]):
+        for creature in creatures:
+            self.remove(creature)
+
+    def __contains__(self, creature) -> bool:
+        return creature in self._creatures
+
+    def __iter__(self):
+        return iter(self._creatures)
+
+    def __len__(self) -> int:
+        return len(self._creatures)
+
+    def __repr__(self):
+        return repr(list(self._creatures))
+
+class GroupRegistry():
+    """
+    Social groups and alone individuals of an environment, updated by the animals every time they change social group.
+    A group is registered as long as at least one creature of the environment belongs to it
+    """
+
+    def __init__(self):
+        self.groups = {"Erbast": {}, "Carviz": {}} # group -> number of its registered members, in order of registration
+        self.alone = {"Erbast": CreatureRegistry(), "Carviz": CreatureRegistry()}
+        self.members = {"Erbast": 0, "Carviz": 0} # registered creatures that belong to a group
+        self.trace = None # EventTrace of the environment, records joins and splits
+
+    def register(self, animal:Animal):
+        """start following the social group of an animal added to the environment"""
+        if animal.groupRegistry is self:
+            return
+        self._join(animal, animal.getSocialGroup())
+        animal.groupRegistry = self
+
+    def unregister(self, animal:Animal):
+        """stop following an animal removed from the environment"""
+        if animal.groupRegistry is not self:
+            return
+        animal.groupRegistry = None
+        self._leave(animal, animal.getSocialGroup())
+
+    def regroup(self, animal:Animal, previous:Union[SocialGroup, None], group:Union[SocialGroup, None]):
+        self._leave(animal, previous)
+        self._join(animal, group)
+        if self.trace is not None:
+            if group is not None:
+                self.trace.record(JOIN, animal, group, animal.getCoords())
+            elif previous is not None:
+                self.trace.record(SPLIT, animal, previous, animal.getCoords())
+
+    def _join(self, animal:Animal, group:Union[SocialGroup, None]):
+        species = "Erbast" if isinstance(animal, Erbast) else "Carviz"
+        if group is None:
+            self.alone[species].append(animal)
+        else:
+            groups = self.groups[species]
+            groups[group] = groups.get(group, 0) + 1
+            self.members[species] += 1
+
+    def _leave(self, animal:Animal, group:Union[SocialGroup, None]):
+        species = "Erbast" if isinstance(animal, Erbast) else "Carviz"
+        if group is None:
+            self.alone[species].remove(animal)
+        else:
+            groups = self.groups[species]
+            groups[group] -= 1
+            self.members[species] -= 1
+            if groups[group] == 0:
+                del groups[group]
+
+    def numGroups(self, species:str) -> int:
+        return len(self.groups[species])
+
+    def getGroups(self, species:str) -> list[SocialGroup]:
+        return list(self.groups[species])
+
+    def getAlone(self, species:str) -> list[Animal]:
+        return list(self.alone[species])
+
+class RunningTotals():
+    """Running sums over the creatures of a species in an environment, updated by the animals when their values change"""
+
+    __slots__ = ("energy", "socialAttitude")
+
+    def __init__(self):
+        self.energy = 0
+        self.socialAttitude = 0.0
+
+    def register(self, animal:Animal):
+        if animal.totals is self:
+            return
+        self.energy += animal.getEnergy()
+        self.socialAttitude += animal.getSocialAttitude()
+        animal.totals = self
+
+    def unregister(self, animal:Animal):
+        if animal.totals is not self:
+            return
+        animal.totals = None
+        self.energy -= animal.getEnergy()
+        self.socialAttitude -= animal.getSocialAttitude()
+
 class Environment:
     """
     The Environment class is the core of Planisuss world.
     Each living being and the worldGrid itself is contained here and the inizialization
     and update logic of the world is managed by the following functions
     """
-    def __init__(self, threshold=0.2, seed=None, octaves=8, persistence=0.4, lacunarity=1.8, scale=40.0, dynamic=False):
-        self.world = WorldGrid(threshold=threshold, seed=seed, octaves=octaves, persistence=persistence, lacunarity=lacunarity, scale=scale, dynamic=dynamic)
+    def __init__(self, threshold=0.2, seed=None, octaves=8, persistence=0.4, lacunarity=1.8, scale=40.0, dynamic=False, useCache=True, lazyVegetob=False, batchMovement=True, checkGroups=False, statsWindow=None, statsPath=None, trace=None, randomSeed=None):
+        # every random draw of the environment comes from its own streams, runs with the same randomSeed are identical
+        self.rng = RandomStreams(randomSeed)
+        self.world = WorldGrid(threshold=threshold, seed=seed, octaves=octaves, persistence=persistence, lacunarity=lacunarity, scale=scale, dynamic=dynamic,
+                               cache = terrainCache if useCache else None, lazyVegetob=lazyVegetob, rng=self.rng)
         self.creatures = {
-            "Erbast" : [],
-            "Carviz" : []
+            "Erbast" : CreatureRegistry(),
+            "Carviz" : CreatureRegistry()
+        }
+        self.groups = GroupRegistry()
+        self.totals = {
+            "Erbast" : RunningTotals(),
+            "Carviz" : RunningTotals()
         }
+        self.checkGroups = checkGroups # debug, every read of the group registry is checked against a scan of the creatures
         self.deadCreatures = []
+        self.batchMovement = batchMovement # alone individuals choose their moves all at once, see movement.py
         self.totErbast = 0
         self.totCarviz = 0
         self.day = -1
 
-        self.statistics = {
-            "Number of Erbasts" : [],
-            "Number of Carvizes" : [],
-            "Number of Herds" : [],
-            "Number of Prides" : [],
-            "Average Herd Size" : [],
-            "Average Pride Size" : [],
-            "Average Erbast Energy" : [],
-            "Average Carviz Energy" : [],
-            "Number of Dead Creatures" : [],
-            "Successfull Hunts" : [],
-            "Number of Hunts" : [],
-            "Average Vegetob Density" : [],
-            "Average Erbast Social Attitude" : [],
-            "Average Carviz Social Attitude" : [],
-        }
+        # daily statistics, statsWindow keeps only the last days in memory and statsPath streams every day to a .csv or .npz file
+        self.statistics = StatisticsStore(STATISTICS, window=statsWindow, path=statsPath)
+
+        # structured events (moves, grazing, hunts, deaths, joins and splits), trace is an EventTrace or the .npz file to stream them to
+        self.trace = EventTrace(trace) if isinstance(trace, str) else trace
+        self.groups.trace = self.trace
+        if self.trace is not None:
+            self.trace.day = self.day
 
     def computeStatistics(self, totHunts = 0, succesfulHunts = 0):
         """
         Compute statistics for the current day
         """
-        self.statistics["Number of Erbasts"].append(self.totErbast)
-        self.statistics["Number of Carvizes"].append(self.totCarviz)
-        self.statistics["Number of Herds"].append(len(self.getHerds()))
-        self.statistics["Number of Prides"].append(len(self.getPrides()))
-        self.statistics["Average Herd Size"].append(sum([len(herd.getComponents()) for herd in self.getHerds()]) / len(self.getHerds()) if len(self.getHerds()) > 0 else 0)
-        self.statistics["Average Pride Size"].append(sum([len(pride.getComponents()) for pride in self.getPrides()]) / len(self.getPrides()) if len(self.getPrides()) > 0 else 0)
-        self.statistics["Average Erbast Energy"].append(sum([erb.getEnergy() for erb in self.creatures["Erbast"]]) / len(self.creatures["Erbast"]) if len(self.creatures["Erbast"]) > 0 else 0)
-        self.statistics["Average Carviz Energy"].append(sum([carv.getEnergy() for carv in self.creatures["Carviz"]]) / len(self.creatures["Carviz"]) if len(self.creatures["Carviz"]) > 0 else 0)
-        self.statistics["Number of Dead Creatures"].append(len(self.deadCreatures))
-        self.statistics["Number of Hunts"].append(totHunts)
-        self.statistics["Successfull Hunts"].append(succesfulHunts)
-        self.statistics["Average Vegetob Density"].append(sum([cell.getVegetobDensity() for cell in self.world.grid.reshape(-1) if isinstance(cell, LandCell)]) / len([cell for cell in self.world.grid.reshape(-1) if isinstance(cell, LandCell)]))
-        self.statistics["Average Erbast Social Attitude"].append(sum([erb.getSocialAttitude() for erb in self.creatures["Erbast"]]) / len(self.creatures["Erbast"]) if len(self.creatures["Erbast"]) > 0 else 0)
-        self.statistics["Average Carviz Social Attitude"].append(sum([carv.getSocialAttitude() for carv in self.creatures["Carviz"]]) / len(self.creatures["Carviz"]) if len(self.creatures["Carviz"]) > 0 else 0)
+        numHerds, numPrides = self.groups.numGroups("Erbast"), self.groups.numGroups("Carviz")
+        numErbasts, numCarvizes = len(self.creatures["Erbast"]), len(self.creatures["Carviz"])
+        self.statistics.record(self.day, {
+            "Number of Erbasts" : self.totErbast,
+            "Number of Carvizes" : self.totCarviz,
+            "Number of Herds" : numHerds,
+            "Number of Prides" : numPrides,
+            "Average Herd Size" : self.groups.members["Erbast"] / numHerds if numHerds > 0 else 0,
+            "Average Pride Size" : self.groups.members["Carviz"] / numPrides if numPrides > 0 else 0,
+            "Average Erbast Energy" : self.totals["Erbast"].energy / numErbasts if numErbasts > 0 else 0,
+            "Average Carviz Energy" : self.totals["Carviz"].energy / numCarvizes if numCarvizes > 0 else 0,
+            "Number of Dead Creatures" : len(self.deadCreatures),
+            "Successfull Hunts" : succesfulHunts,
+            "Number of Hunts" : totHunts,
+            "Average Vegetob Density" : self.world.getVegetobMean(),
+            "Average Erbast Social Attitude" : self.totals["Erbast"].socialAttitude / numErbasts if numErbasts > 0 else 0,
+            "Average Carviz Social Attitude" : self.totals["Carviz"].socialAttitude / numCarvizes if numCarvizes > 0 else 0,
+        })
+
+    def close(self):
+        """flush and close the files the statistics and the events are streamed to"""
+        self.statistics.close()
+        if self.trace is not None:
+            self.trace.close()
 
     def getGrid(self) -> 'WorldGrid':
-        return self.world.grid
+        return self.world
       
     def getHerds(self) -> list[Herd]:
         """Obtain all herds in environment"""
-        herds = set()
-        for erb in self.creatures["Erbast"]:
-            socG = erb.getSocialGroup()
-            if socG is not None:
-                herds.add(socG)
-        return list(herds)
+        herds = self.groups.getGroups("Erbast")
+        if self.checkGroups:
+            self._checkGroups("Erbast", herds, self.getAlone("Erbast"))
+        return herds
     
     def getPrides(self) -> list[Pride]:
         """Obtain all prides in environment"""
-        prides = set()
-        for carviz in self.creatures["Carviz"]:
-            socG = carviz.getSocialGroup()
-            if socG is not None:
-                prides.add(socG)
-        return list(prides)
+        prides = self.groups.getGroups("Carviz")
+        if self.checkGroups:
+            self._checkGroups("Carviz", prides, self.getAlone("Carviz"))
+        return prides
 
     def getAloneErbasts(self) -> list[Erbast]:
         """Get a list of Erbast that are not in a social group"""
-        return [e for e in self.creatures["Erbast"] if e.inSocialGroup == False]
+        return self.getAlone("Erbast")
     
     def getAloneCarviz(self) -> list[Carviz]:
         """Get a list of Carviz that are not in a social group"""
-        return [c for c in self.creatures["Carviz"] if c.inSocialGroup == False]
+        return self.getAlone("Carviz")
+
+    def getAlone(self, species:str) -> list[Animal]:
+        alone = self.groups.getAlone(species)
+        if self.checkGroups:
+            self._checkGroups(species, self.groups.getGroups(species), alone)
+        return alone
+
+    def _checkGroups(self, species:str, groups:list[SocialGroup], alone:list[Animal]):
+        """compare the group registry with a scan of the creatures of a species"""
+        scannedGroups = set()
+        scannedAlone = set()
+        for creature in self.creatures[species]:
+            if creature.inSocialGroup == False:
+                scannedAlone.add(creature)
+            if creature.getSocialGroup() is not None:
+                scannedGroups.add(creature.getSocialGroup())
+        if scannedGroups != set(groups) or scannedAlone != set(alone):
+            raise Exception(f"the group registry of {species} is not consistent with the creatures, registered groups: {len(groups)}, alone: {len(alone)}, "
+                            f"scanned groups: {len(scannedGroups)}, alone: {len(scannedAlone)}")
     
     def getDeadCreatures(self) -> list[DeadCreature]:
         """Get list of DeadCreatures in the environment"""
         return self.deadCreatures
 
-    def updateGrid(self, newGrid):
-        self.world.updateGrid(newGrid)
-
     def add(self, object:Species):
         """
         Adds an Animal or a SocialGroup to the environment.
@@ -116,7 +287,17 @@ class Environment:
         return True
 
     def isLand(self, x, y):
-        return isinstance(self.getGrid()[x][y], LandCell)
+        return bool(self.world.land[x, y])
+
+    def populate(self, numErbast:int = 50, numCarviz:int = 50):
+        """add Erbasts and Carvizes with a random social attitude on random land cells"""
+        rows, cols = self.getGrid().shape
+        landCells = [(x, y) for x in range(rows) for y in range(cols) if self.isLand(x, y)]
+        rng = self.rng.population
+        for i in range(numErbast):
+            self.add(Erbast(rng.choice(landCells), SocialAttitude = rng.random()))
+        for i in range(numCarviz):
+            self.add(Carviz(rng.choice(landCells), SocialAttitude = rng.random()))
 
     def addAnimal(self, animal:Animal):
         """
@@ -134,14 +315,25 @@ class Environment:
 
         if isinstance(animal, Erbast):
             self.creatures["Erbast"].append(animal) 
-            self.getGrid()[x][y].addAnimal(animal)
+            self._register(animal, "Erbast")
+            self.getGrid()[x, y].addAnimal(animal)
             self.totErbast += 1
 
         elif isinstance(animal, Carviz):
             self.creatures["Carviz"].append(animal)
-            self.getGrid()[x][y].addAnimal(animal)
+            self._register(animal, "Carviz")
+            self.getGrid()[x, y].addAnimal(animal)
             self.totCarviz += 1
 
+    def _register(self, animal:Animal, species:str):
+        """start following the social group and the running sums of an animal added to the environment"""
+        self.groups.register(animal)
+        self.totals[species].register(animal)
+
+    def _unregister(self, animal:Animal, species:str):
+        self.groups.unregister(animal)
+        self.totals[species].unregister(animal)
+
     def changeEnergyAndHandleDeath(self, species:Species, energy:int):
         """Change the energy of a social group or an Animal and handle the death of the individuals"""
         if isinstance(species, SocialGroup):
@@ -161,8 +353,10 @@ class Environment:
         else:
             raise TypeError(f"{species} is not an Animal or a SocialGroup")
 
-    def creatureDeath(self, animal:Animal):
+    def creatureDeath(self, animal:Animal, killer:Species = None):
         """Handles the death of a creature"""
+        if self.trace is not None:
+            self.trace.record(DEATH, animal, killer, animal.getCoords(), value=animal.age)
         animal.die()
         self.addDeadCreature(DeadCreature(animal, self.day))
         self.remove(animal)
@@ -170,7 +364,7 @@ class Environment:
     def addDeadCreature(self, deadCreature:DeadCreature):
         self.deadCreatures.append(deadCreature)
         x,y = deadCreature.getCoords()
-        self.getGrid()[x][y].addDeadCreature(deadCreature)
+        self.getGrid()[x, y].addDeadCreature(deadCreature)
         return self.deadCreatures
 
     def addGroup(self, group:SocialGroup):
@@ -179,12 +373,16 @@ class Environment:
         if isinstance(group, Herd):
             self.totErbast += group.numComponents
             self.creatures["Erbast"].extend(group.getComponents())
-            self.getGrid()[x][y].addGroup(group)
+            for erb in group.getComponents():
+                self._register(erb, "Erbast")
+            self.getGrid()[x, y].addGroup(group)
 
         if isinstance(group, Pride):
             self.totCarviz += group.numComponents    
             self.creatures["Carviz"].extend(group.getComponents())
-            self.getGrid()[x][y].addGroup(group)
+            for carv in group.getComponents():
+                self._register(carv, "Carviz")
+            self.getGrid()[x, y].addGroup(group)
 
     def remove(self, object:Species):
         if isinstance(object, Animal):
@@ -205,15 +403,17 @@ class Environment:
 
         if isinstance(animal, Erbast):
             if animal in self.creatures["Erbast"]:
-                self.getGrid()[x][y].removeAnimal(animal)
+                self.getGrid()[x, y].removeAnimal(animal)
                 self.creatures["Erbast"].remove(animal)
+                self._unregister(animal, "Erbast")
                 self.totErbast -= 1
                 return True
             
         elif isinstance(animal, Carviz):
             if animal in self.creatures["Carviz"]:
-                self.getGrid()[x][y].removeAnimal(animal)
+                self.getGrid()[x, y].removeAnimal(animal)
                 self.creatures["Carviz"].remove(animal)
+                self._unregister(animal, "Carviz")
                 self.totCarviz -= 1
                 return True
             
@@ -229,16 +429,20 @@ class Environment:
         if isinstance(group, Herd):
             if all(el in self.creatures["Erbast"] for el in group.getComponents()):
                 self.totErbast -= group.numComponents
-                self.creatures["Erbast"] = [erb for erb in self.creatures["Erbast"] if erb not in group.getComponents()]
-                self.getGrid()[x][y].removeHerd(group)
+                self.creatures["Erbast"].removeAll(group.getComponents())
+                for erb in group.getComponents():
+                    self._unregister(erb, "Erbast")
+                self.getGrid()[x, y].removeHerd(group)
             else:
                 raise Exception(f"not all components of {group} are in the creatures list")
 
         elif isinstance(group, Pride):
             if all(el in self.creatures["Carviz"] for el in group.getComponents()):
                 self.totCarviz -= group.numComponents
-                self.creatures["Carviz"] = [carv for carv in self.creatures["Carviz"] if carv not in group.getComponents()]
-                self.getGrid()[x][y].removePride(group)
+                self.creatures["Carviz"].removeAll(group.getComponents())
+                for carv in group.getComponents():
+                    self._unregister(carv, "Carviz")
+                self.getGrid()[x, y].removePride(group)
             else:
                 raise Exception(f"not all components of {group} are in the creatures list")
 
@@ -256,15 +460,35 @@ class Environment:
             raise TypeError(f"can't move objects which are not animals or SocialGroups")
         
         
+        movers = dict()
+        departures = defaultdict(list) # cell coords -> species leaving it
         for o, c in nextCoords.items():
+            if isinstance(o, Animal) and not o.alive: # already removed by its death during the movement phase
+                continue
             if isinstance(o, SocialGroup) and len(o.getComponents()) < 2:
-                logging.warning(f"SocialGroup {o} has less than 2 components, removing it")
-                self.remove(o)
+                logging.warning(f"{type(o).__name__} {o.id} has less than 2 components, disbanding it")
+                o.loseComponents(set()) # the last component stays alone, the empty group only leaves its cell
+            movers[o] = tuple(c)
+            departures[o.getCoords()].append(o)
+
+        # the creatures stay in the environment, only cells and coordinates change
+        grid = self.getGrid()
+        for coords, leaving in departures.items():
+            grid[coords].depart(leaving)
+
+        arrivals = defaultdict(list) # cell coords -> species entering it, in moving order
+        for o, c in movers.items():
+            if isinstance(o, SocialGroup) and o.numComponents == 0: # disbanded by its leaving components, the rest stays
                 continue
-            self.remove(o)
-            self._changeCoords(o, c)
-            self.add(o)
-        
+            arrivals[c].append(o)
+        for coords, entering in arrivals.items():
+            for o in entering:
+                if self.trace is not None:
+                    self.trace.record(MOVE, o, coords=o.getCoords(), to=coords, value=o.numComponents if isinstance(o, SocialGroup) else 1)
+                self._changeCoords(o, coords)
+        for coords, entering in arrivals.items():
+            grid[coords].arrive(entering)
+
     def _changeCoords(self, obj:Species,newCoords:tuple):
         """helper func to change the coords of an animal or a socialgroup"""
         if isinstance(obj, Animal):
@@ -285,6 +509,8 @@ class Environment:
         availableVegetobs = grazingCell.getVegetobDensity()
         grazedAmount = grazer.graze(availableVegetobs) # consume specified amount and update energy
         grazingCell.reduceVegetob(grazedAmount) # reduce vegetob density in cell
+        if self.trace is not None:
+            self.trace.record(GRAZE, grazer, coords=grazingCoords, value=grazedAmount)
 
     def getCellSpeciesDict(self, species: list[Species]) -> dict[tuple,list[Species]]:
         """
@@ -329,18 +555,18 @@ class Environment:
             c1Energy = c1.getEnergy()
             c2Energy = c2.getEnergy()
             if c1Energy > c2Energy: # c1 wins
-                self.creatureDeath(c2)
+                self.creatureDeath(c2, c1)
                 p2Carvizes.pop()
                 c1.changeEnergy(-c2Energy)
                 p1Carvizes.sort(key = lambda x : x.getEnergy())
             elif c1Energy < c2Energy:
-                self.creatureDeath(c1)
+                self.creatureDeath(c1, c2)
                 p1Carvizes.pop()
                 c2.changeEnergy(-c1Energy)
                 p2Carvizes.sort(key = lambda x : x.getEnergy())
             else:
-                self.creatureDeath(c1)
-                self.creatureDeath(c2)
+                self.creatureDeath(c1, c2)
+                self.creatureDeath(c2, c1)
                 p1Carvizes.pop()
                 p2Carvizes.pop()
 
@@ -403,9 +629,9 @@ class Environment:
                     lastCarviz = carvizes.pop()
                     secondCarvizEnergy = carvizes[-1].getEnergy()
                     for c in carvizes:
-                        self.creatureDeath(c)
+                        self.creatureDeath(c, lastCarviz)
                     if lastCarviz.getEnergy() <= secondCarvizEnergy:
-                        self.creatureDeath(lastCarviz)
+                        self.creatureDeath(lastCarviz, carvizes[-1])
                     else:
                         lastCarviz.changeEnergy(-secondCarvizEnergy)
 
@@ -425,21 +651,12 @@ class Environment:
 
         totHunts = 0
         succesfulHunts = 0
+        rng = self.rng.hunting
 
         cellHunters = self.getCellSpeciesDict(self.getPrides() + self.getAloneCarviz())
         cellHerds = self.getCellSpeciesDict(self.getHerds())
         cellErbasts = self.getCellSpeciesDict(self.getAloneErbasts())
 
-        # Log energies of carvizes, including those in prides
-        logging.info("CARVIZES ENERGIES\n")
-        for coords, hunters in cellHunters.items():
-            for hunter in hunters:
-                if isinstance(hunter, Carviz):
-                    logging.info(f"{hunter} at {coords} has energy: {hunter.getEnergy()}")
-                elif isinstance(hunter, Pride):
-                    for carviz in hunter.getComponents():
-                        logging.info(f"{carviz} in Pride at {coords} has energy: {carviz.getEnergy()}")
-
         for coords in cellHunters:
             if coords in cellHerds or coords in cellErbasts:
 
@@ -462,7 +679,7 @@ class Environment:
                 elif isinstance(hunter, Carviz):
                     hunterStrength = hunter.getEnergy() * (2 - hunter.getSocialAttitude()) + 1
 
-                erbastLuck = random.randint(1,3)
+                erbastLuck = rng.randint(1,3)
                 huntProbability = self._hunt_probability(erbastEnergy, hunterStrength) * erbastLuck
 
                 totHunts += 1
@@ -471,9 +688,10 @@ class Environment:
 
                     if isinstance(hunter, Pride):
 
-                        if random.random() < huntProbability: # Pride wins
-                            self.creatureDeath(strongestErbast)
-                            logging.info(f"{strongestErbast} has been killed by {hunter}")
+                        if rng.random() < huntProbability: # Pride wins
+                            if self.trace is not None:
+                                self.trace.record(HUNT, hunter, strongestErbast, coords, value=1)
+                            self.creatureDeath(strongestErbast, hunter)
 
                             succesfulHunts += 1
 
@@ -496,19 +714,21 @@ class Environment:
                             else:
                                 break
                         else:
+                            if self.trace is not None:
+                                self.trace.record(HUNT, hunter, strongestErbast, coords, value=0)
                             hunter.changeGroupSociality(-0.1)
                             attempts += 1
                             anyAlive = any(self.changeEnergyAndHandleDeath(hunter, -2).values())
-                            logging.info(f"{hunter} failed to hunt {strongestErbast}, attempt {attempts}. any Alive?: {anyAlive}")
                             if not anyAlive:
                                 break
                     
                     elif isinstance(hunter, Carviz):
                         
-                        if random.random() < huntProbability: # death
-                            self.creatureDeath(strongestErbast)
+                        if rng.random() < huntProbability: # death
+                            if self.trace is not None:
+                                self.trace.record(HUNT, hunter, strongestErbast, coords, value=1)
+                            self.creatureDeath(strongestErbast, hunter)
                             succesfulHunts += 1
-                            logging.info(f"{strongestErbast} has been killed by {hunter}")
                             hunter.changeEnergy(erbastEnergy)
                             hunter.socialAttitude -= 0.1
                             if coords in cellHerds:
@@ -520,23 +740,14 @@ class Environment:
                             else:
                                 break
                         else:
+                            if self.trace is not None:
+                                self.trace.record(HUNT, hunter, strongestErbast, coords, value=0)
                             attempts += 1
                             hunter.socialAttitude += 0.1
                             alive = self.changeEnergyAndHandleDeath(hunter, -2)[hunter]
-                            logging.info(f"{hunter} failed to hunt {strongestErbast}, attempt {attempts}. alive?: {alive}")
                             if not alive:
                                 break
 
-        # Log energies of carvizes, including those in prides again after hunting
-        logging.info("CARVIZES ENERGIES AFTER HUNTING\n")
-        for coords, hunters in cellHunters.items():
-            for hunter in hunters:
-                if isinstance(hunter, Carviz):
-                    logging.info(f"{hunter} at {coords} has energy: {hunter.getEnergy()}")
-                elif isinstance(hunter, Pride):
-                    for carviz in hunter.getComponents():
-                        logging.info(f"{carviz} in Pride at {coords} has energy: {carviz.getEnergy()}")
-
         return totHunts, succesfulHunts
 
     def nextDay(self):
@@ -544,30 +755,29 @@ class Environment:
 
         self.day += 1
 
+        if self.trace is not None:
+            self.trace.day = self.day
+
         logging.info(f"DAY {self.day}\n")
-        logging.info(f"creatures: {self.creatures}")
-        logging.info(f"deadCreatures: {self.deadCreatures}")
-        logging.info(f"herds: {self.getHerds()}")
-        logging.info(f"prides: {self.getPrides()}\n")
         logging.info(f"totErbast: {self.totErbast}")
         logging.info(f"totCarviz: {self.totCarviz}")
         logging.info(f"len Creatures Erbasts: {len(self.creatures['Erbast'])}")
         logging.info(f"len Creatures Carviz: {len(self.creatures['Carviz'])}")
 
         grid = self.getGrid()
-        cells = grid.reshape(-1)
-        landCells = [landC for landC in cells if isinstance(landC,LandCell)]
 
         # 3.1 - GROWING -----------------------------------------------------------------------------------------------
 
-        for cell in landCells:
-            cell.growVegetob()
+        grid.growVegetob()
 
         # 3.2 - MOVEMENT -----------------------------------------------------------------------------------------------
 
         logging.info("MOVEMENT PHASE\n")
 
-        species = self.getAloneErbasts() + self.getHerds() + self.getAloneCarviz() + self.getPrides()
+        if self.batchMovement: # same order of the random draws of the loop below
+            species = [ErbastBatch(self.getAloneErbasts())] + self.getHerds() + [CarvizBatch(self.getAloneCarviz())] + self.getPrides()
+        else:
+            species = self.getAloneErbasts() + self.getHerds() + self.getAloneCarviz() + self.getPrides()
 
         stayingCreatures = []
         nextCoords = dict() # of moving creatures
@@ -592,7 +802,7 @@ class Environment:
                     raise TypeError(f"{c} is not a Carviz, Erbast, Pride or Herd")
 
                 if isinstance(c, SocialGroup) and sum(aliveDict.values()) < 2: # 0 or 1 alive
-                    logging.info(f"Of {c}, all except {sum(aliveDict.values())} are alive during movement due to starvation")
+                    logging.info(f"Of {type(c).__name__} {c.id}, all except {sum(aliveDict.values())} are alive during movement due to starvation")
                     nextCoords.pop(c)
                 else:
                     deadC = [creature for creature,alive in aliveDict.items() if not alive]
@@ -600,7 +810,6 @@ class Environment:
                         if d in nextCoords:
                             nextCoords.pop(d)
                 
-        logging.info(f"NextCoords:\n{pprint.pformat(nextCoords)}")
         self.move(nextCoords)
 
 
@@ -620,7 +829,7 @@ class Environment:
 
         logging.info("STRUGGLE PHASE\n")
 
-        orderCarvizJoins = random.randint(0,1)
+        orderCarvizJoins = self.rng.struggle.randint(0,1)
 
         if orderCarvizJoins == 0:
             self.joinCarvizesToPride()
@@ -637,8 +846,8 @@ class Environment:
 
         # 3.5 - SPAWNING -----------------------------------------------------------------------------------------------
 
-        for c in self.creatures["Erbast"] + self.creatures["Carviz"]:
-            alive, offsprings = c.ageStep()
+        for c in [*self.creatures["Erbast"], *self.creatures["Carviz"]]:
+            alive, offsprings = c.ageStep(rng = self.rng.reproduction)
             if offsprings:
                 for offspring in offsprings:
                     self.add(offspring)
@@ -646,107 +855,298 @@ class Environment:
                 self.creatureDeath(c)
         
 
-        # Log cells with Erbasts
-        logging.info("LANDCELLS WITH ERBASTS\n")
-        for cell in landCells:
+        # check the cells with Erbasts
+        for cell in grid.getInhabitedCells():
             erbast_list = cell.getErbastList()
-            if erbast_list:
-                logging.info(f"LandCell {cell.getCoords()} has Erbasts: {erbast_list}")
-                if len(erbast_list) != cell.numErbast:
-                    logging.error(f"LandCell {cell.getCoords()} has {cell.numErbast} Erbasts but the list has {len(erbast_list)}")
-                    raise Exception(f"LandCell {cell.getCoords()} has {cell.numErbast} Erbasts but the list has {len(erbast_list)}")
-
-        logging.info("LANDCELLS WITH CARVIZES\n")
-        for cell in landCells:
-            carviz_list = cell.getCarvizList()
-            if carviz_list:
-                logging.info(f"LandCell {cell.getCoords()} has Carvizes: {carviz_list}")
+            if len(erbast_list) != cell.numErbast:
+                logging.error(f"LandCell {cell.getCoords()} has {cell.numErbast} Erbasts but the list has {len(erbast_list)}")
+                raise Exception(f"LandCell {cell.getCoords()} has {cell.numErbast} Erbasts but the list has {len(erbast_list)}")
 
         self.computeStatistics(totHunts, succesfulHunts)
 
         logging.warning(f"Statistics for day {self.day}:")
-        for stat, values in self.statistics.items():
-            logging.warning(f"{stat}: {values[-1]}")
+        for stat, value in self.statistics.latest().items():
+            logging.warning(f"{stat}: {value}")
 
         return self.getGrid()
+
+    def days(self, numDays:int = None, changes:Union[bool, tuple[str]] = False, snapshot:bool = False):
+        """
+        Simulate numDays days (endlessly if None) yielding a DayRecord at the end of each,
+        with the coords of the cells changed during the day if changes is given and a snapshot of the grid if snapshot is True.
+        changes is True to compare all the layers of WorldGrid.snapshot or the names of the layers to compare,
+        e.g. ("numErbast", "numCarviz") to ignore the daily growth of the vegetob.
+        See daystream.py to buffer the records or chain their consumers
+        """
+        grid = self.getGrid()
+        if changes is True:
+            changes = tuple(grid.snapshot())
+        previous = grid.snapshot() if changes else None
+        simulated = 0
+        while numDays is None or simulated < numDays:
+            self.nextDay()
+            simulated += 1
+            layers = grid.snapshot() if changes or snapshot else None
+            changedCells = None
+            if changes:
+                changed = np.zeros(grid.shape, dtype=bool)
+                for name in changes:
+                    changed |= layers[name] != previous[name]
+                changedCells = np.argwhere(changed)
+                previous = layers
+            yield DayRecord(self.day, self.statistics.latest(), changedCells, layers if snapshot else None)
     
 class WorldGrid():
     """
     class that handles the creation of the islands, initial flora and fauna,
-    and aquatic zones its main attribute is grid
+    and aquatic zones.
+
+    The grid is stored as a structure of arrays: a boolean land mask, the vegetob densities and the
+    number of Erbasts, Carvizes and DeadCreatures of each cell. The inhabitants of a cell are kept only
+    for the cells that have been inhabited. Indexing the WorldGrid, like a numpy grid, returns
+    LandCell / WaterCell views over these arrays
+
+    The terrain never changes, so the flat index of the land cells is computed once and the land neighbors
+    of a cell are read from the grid of landIds at fixed offsets (see getNeighborIds)
+
+    With lazyVegetob the vegetob is not grown every day: each cell stores the day of its last update
+    and catches up the missed growth only when its density is read
+
+    The number of land cells at each vegetob density is kept up to date by the growth and by setVegetob,
+    so the total density of the land does not need a pass over the grid
     """
-    def __fbmNoise(self, n, threshold = 0.2, seed = None, octaves=8, persistence=0.4, lacunarity=1.8, scale=40.0, dynamic=False):
-        """ Method to generate island like maps. Returns a numpy grid of zeros and 255 """
-        # print(dynamic)
-        if seed is None:
-            seed = random.randint(0, 100)
-        
-        grid = np.zeros((n, n))
-        center = n // 2
-        max_dist = center * np.sqrt(2)
-        for i in range(n):
-            for j in range(n):
-                x = i / scale
-                y = j / scale
-                fbm_value = 0.0
-                amplitude = 1.0
-                frequency = 1.0
-                for _ in range(octaves):
-                    fbm_value += amplitude * noise.pnoise2(x * frequency, y * frequency, base = seed)
-                    amplitude *= persistence
-                    frequency *= lacunarity
-
-                grid[i][j] = fbm_value
-
-        min_val = np.min(grid)
-        max_val = np.max(grid)
-        grid = (grid - min_val) / (max_val - min_val)
-
-        if dynamic:
-            for i in range(n):
-                for j in range(n):
-                    distance = np.sqrt((i - center) ** 2 + (j - center) ** 2)
-                    distance_weight = distance / max_dist
-                    dynamic_treshold = threshold + (1 - threshold) * distance_weight
-                    # logging.info(dynamic_treshold)
-                    grid[i][j] = 1 if grid[i][j] > dynamic_treshold else 0
-        else:
-            grid = np.where(grid > threshold, 1, 0)
-                
-        return grid
+    def __init__(self, type = "fbm", threshold = 0.2, seed=None, octaves=8, persistence=0.4, lacunarity=1.8, scale=40.0, dynamic=False, cache:TerrainCache = None, lazyVegetob=False, rng:RandomStreams = None):
+        self.cache = cache
+        self.rng = rng if rng is not None else RandomStreams() # random streams of the environment, the creatures draw from them
+        self.land, self.vegetob = self.createWorld(type, threshold, seed, octaves, persistence, lacunarity, scale, dynamic)
+        self.lazyVegetob = lazyVegetob
+        self.day = 0 # days of vegetob growth
+        self.vegetobDay = np.zeros(self.shape, dtype=np.int32) # day of the last update of each cell, used by lazyVegetob
+        self.numErbast = np.zeros(self.shape, dtype=np.int32)
+        self.numCarviz = np.zeros(self.shape, dtype=np.int32)
+        self.numDeadCreatures = np.zeros(self.shape, dtype=np.int32)
+        self.inhabitants = {} # coords -> CellInhabitants, only for inhabited cells
+        self.fields = {"numErbast": {}, "numCarviz": {}} # layer -> {ring weights: field}, see getRingField
+
+        self.landIndex = np.flatnonzero(self.land) # flat indices of the land cells, row by row
+        self.landId = np.full(self.shape, -1, dtype=np.int32) # position of each land cell in landIndex, -1 on water
+        self.landId.flat[self.landIndex] = np.arange(len(self.landIndex), dtype=np.int32)
+        self._landCells = [None] * len(self.landIndex) # LandCell views, created on first access
+        self.resetVegetobCounts()
+        self.paddedLandId = {} # radius -> landId padded by the radius with -1, built on first use
 
-    def __init__(self, type = "fbm", threshold = 0.2, seed=None, octaves=8, persistence=0.4, lacunarity=1.8, scale=40.0, dynamic=False):
-        self.grid = self.createWorld(type, threshold, seed, octaves, persistence, lacunarity, scale, dynamic)
     # so that we can crate different types of initial setups
     def createWorld(self, typology = "fbm", threshold = 0.2, seed=None, octaves=8, persistence=0.4, lacunarity=1.8, scale=40.0, dynamic=False):
         """
-        Initialize the world
+        Initialize the world, returns the land mask and the vegetob densities
         Vegetob density starts at around 25
+        If a cache is set, the land mask and the initial vegetob densities are loaded from it
+        when the same map has already been generated
         """
         
         if typology == "fbm":
-            values_grid = self.__fbmNoise(NUMCELLS, threshold, seed=seed, octaves=octaves, persistence=persistence, lacunarity=lacunarity, scale=scale, dynamic=dynamic)
-            grid = np.zeros((NUMCELLS, NUMCELLS), dtype=object)
-            for i in range(NUMCELLS):
-                for j in range(NUMCELLS):
-                    if values_grid[i][j] > threshold:
-                        grid[i][j] = LandCell((i, j), Vegetob(density=40 + random.randint(-30, 40)))
-                    else:
-                        grid[i][j] = WaterCell((i, j))
-        return grid
+            if seed is None:
+                seed = self.rng.terrain.randint(0, 100)
+
+            land, densities = generateTerrain(NUMCELLS, seed, threshold, octaves, persistence, lacunarity, scale, dynamic, cache=self.cache)
+        return land.astype(bool), densities.astype(np.int32)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.land.shape
+
+    def getCell(self, x:int, y:int) -> 'Cell':
+        """view of the cell at coords (x, y)"""
+        i = self.landId[x, y]
+        if i >= 0:
+            return self.getLandCell(i)
+        return WaterCell(self, (int(x), int(y)))
+
+    def getLandCell(self, i:int) -> 'LandCell':
+        """view of the i-th land cell of the flat land index"""
+        cell = self._landCells[i]
+        if cell is None:
+            x, y = divmod(int(self.landIndex[i]), self.shape[1])
+            cell = self._landCells[i] = LandCell(self, (x, y))
+        return cell
+
+    def getLandCells(self) -> list['LandCell']:
+        """views of all the land cells, row by row"""
+        return [self.getLandCell(i) for i in range(len(self.landIndex))]
+
+    def _paddedLandId(self, d:int) -> np.ndarray:
+        """landId padded by d cells of -1 on every side, one grid per radius"""
+        padded = self.paddedLandId.get(d)
+        if padded is None:
+            padded = self.paddedLandId[d] = np.pad(self.landId, d, constant_values=-1)
+        return padded
+
+    def getNeighborIds(self, cells:np.ndarray, d:int) -> np.ndarray:
+        """
+        LandIds of the cells within radius d (a (2d+1)x(2d+1) square) of each of the given (x, y) cells.
+        Row i holds the square around the i-th cell, row by row, -1 where there is water or the grid ends
+        """
+        padded = self._paddedLandId(d)
+        dx, dy = np.divmod(np.arange((2 * d + 1) ** 2), 2 * d + 1)
+        return padded[cells[:, :1] + dx, cells[:, 1:2] + dy]
+
+    def getRingField(self, layer:str, weights:tuple) -> np.ndarray:
+        """
+        Counts of the given layer ("numErbast" or "numCarviz") convolved with a ring kernel,
+        weights[k] multiplies the counts of the cells in the k-th ring around each cell.
+        Every cell gets the contributions of all its rings, whatever the view of the mover reading it: cells at the edge
+        of a neighborhood count creatures up to len(weights) - 1 cells beyond it, and the unreachable cells get their bonus too.
+        Fields are cached until the layer changes, hence they are computed once per day and shared by all the movers
+        """
+        field = self.fields[layer].get(weights)
+        if field is None:
+            d = len(weights) - 1
+            rings = np.maximum(*np.abs(np.mgrid[-d:d+1, -d:d+1]))
+            kernel = np.asarray(weights, dtype=float)[rings]
+            field = self.fields[layer][weights] = convolve(getattr(self, layer).astype(float), kernel, mode="constant", cval=0.0)
+        return field
+
+    def invalidateFields(self, layer:str):
+        """drop the cached fields of a layer that changed"""
+        if self.fields[layer]:
+            self.fields[layer].clear()
+
+    def getLandNeighborhood(self, coords:tuple, d:int) -> list['LandCell']:
+        """land cells within radius d from coords (included if land), row by row"""
+        x, y = coords
+        if self.landId[x, y] < 0:
+            return []
+        square = self._paddedLandId(d)[x:x + 2 * d + 1, y:y + 2 * d + 1] # the padding shifts the square by d
+        return [self.getLandCell(j) for j in square.ravel().tolist() if j >= 0]
+
+    def snapshot(self) -> dict[str, np.ndarray]:
+        """copy of the vegetob densities and of the number of creatures of every cell"""
+        return {
+            "vegetob" : self.currentVegetob().copy(),
+            "numErbast" : self.numErbast.copy(),
+            "numCarviz" : self.numCarviz.copy(),
+            "numDeadCreatures" : self.numDeadCreatures.copy(),
+        }
 
-    def updateGrid(self, newGrid):
-        self.grid = newGrid
+    def getInhabitedCells(self) -> list['LandCell']:
+        """views of the land cells that have been inhabited, row by row"""
+        return [self.getLandCell(self.landId[coords]) for coords in sorted(self.inhabitants)]
+
+    def growVegetob(self, times:int = 1):
+        """
+        Grow the Vegetob of every land cell at once,
+        times > 1 catches up several days of growth in a single update.
+        With lazyVegetob only the day advances, cells grow when they are read
+        """
+        self.day += times
+        self._growVegetobCounts(times)
+        if not self.lazyVegetob:
+            self.vegetob[self.land] = Vegetob.grow(self.vegetob[self.land], times)
+            self.vegetobDay[:] = self.day
+
+    def resetVegetobCounts(self):
+        """count the land cells at each vegetob density, to be called if the vegetob array is written directly"""
+        self.vegetobCounts = np.bincount(self.currentVegetob().take(self.landIndex), minlength=MAX_GROWTH + 1).astype(np.int64)
+        self.vegetobTotal = int(self.vegetobCounts @ np.arange(len(self.vegetobCounts)))
+
+    def _growVegetobCounts(self, times:int):
+        """every density grows by the same amount, up to MAX_GROWTH: the counts shift and pile up at MAX_GROWTH"""
+        step = min(GROWING * times, MAX_GROWTH)
+        if step <= 0:
+            return
+        counts = self.vegetobCounts
+        saturated = counts[MAX_GROWTH - step:].sum()
+        counts[step:MAX_GROWTH + 1] = counts[:MAX_GROWTH + 1 - step].copy()
+        counts[:step] = 0
+        counts[MAX_GROWTH] = saturated
+        counts[MAX_GROWTH + 1:] = 0
+        self.vegetobTotal = int(counts @ np.arange(len(counts)))
+
+    def getVegetobMean(self) -> float:
+        """average vegetob density of the land cells"""
+        return self.vegetobTotal / len(self.landIndex) if len(self.landIndex) > 0 else 0
+
+    def getVegetob(self, coords:tuple) -> int:
+        """vegetob density of the cell at coords, catching up the growth it missed"""
+        elapsed = self.day - self.vegetobDay[coords]
+        if elapsed:
+            self.vegetob[coords] = Vegetob.grow(self.vegetob[coords], int(elapsed)) if self.land[coords] else 0
+            self.vegetobDay[coords] = self.day
+        return int(self.vegetob[coords])
+
+    def setVegetob(self, coords:tuple, density:int):
+        if self.land[coords]:
+            previous = self.getVegetob(coords)
+            self.vegetobCounts[previous] -= 1
+            self.vegetobCounts[density] += 1
+            self.vegetobTotal += int(density) - previous
+        self.vegetob[coords] = density
+        self.vegetobDay[coords] = self.day
+
+    def getVegetobs(self, flat:np.ndarray) -> np.ndarray:
+        """current vegetob densities of the cells at the given flat indices, cells are not updated"""
+        vegetob = self.vegetob.take(flat)
+        if not self.lazyVegetob:
+            return vegetob
+        return np.where(self.land.take(flat), Vegetob.grow(vegetob, self.day - self.vegetobDay.take(flat)), vegetob)
+
+    def currentVegetob(self) -> np.ndarray:
+        """vegetob densities of the whole grid at the current day, cells are not updated"""
+        if not self.lazyVegetob:
+            return self.vegetob
+        return np.where(self.land, Vegetob.grow(self.vegetob, self.day - self.vegetobDay), self.vegetob)
+
+    def __getitem__(self, key):
+        """
+        numpy like indexing: grid[x, y] returns a cell, grid[x] a row and
+        grid[x_min:x_max, y_min:y_max] a numpy array of cells
+        """
+        if isinstance(key, tuple) and len(key) == 2 and not isinstance(key[0], slice) and not isinstance(key[1], slice):
+            return self.getCell(*key)
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        rows = np.arange(self.shape[0])[key[0]]
+        cols = np.arange(self.shape[1])[key[1]]
+        cells = np.empty((np.size(rows), np.size(cols)), dtype=object)
+        for i, x in enumerate(np.atleast_1d(rows)):
+            for j, y in enumerate(np.atleast_1d(cols)):
+                cells[i, j] = self.getCell(x, y)
+        return cells.reshape(np.shape(rows) + np.shape(cols))
+
+    def __iter__(self):
+        for x in range(self.shape[0]):
+            yield self[x]
+
+    def reshape(self, *shape) -> np.ndarray:
+        """numpy array of all the cells with the given shape"""
+        return self[:, :].reshape(*shape)
+
+class CellInhabitants():
+    """Living and dead inhabitants of a LandCell"""
+
+    __slots__ = ("creatures", "deadCreatures", "herd", "prides")
+
+    def __init__(self):
+        self.creatures = {
+            "Erbast" : [],
+            "Carviz" : []
+        }
+        self.deadCreatures = []
+        self.herd = None
+        self.prides = []
 
 class Cell():
     """
     Each Grid unit is a cell. Cells contain several information about
-    the species that habits it, the amount of vegetation and so on
+    the species that habits it, the amount of vegetation and so on.
+    Cells are views over the WorldGrid arrays, two cells are equal if they have the same coords
     """
 
-    def __init__(self, coordinates:tuple):
+    __slots__ = ("world", "coords")
+
+    def __init__(self, world:WorldGrid, coordinates:tuple):
+        self.world = world
         self.coords = coordinates
-        pass
 
     def getCoords(self) -> tuple:
         return self.coords
@@ -754,6 +1154,12 @@ class Cell():
     def getCellType(self):
         pass
 
+    def __eq__(self, other):
+        return isinstance(other, Cell) and self.coords == other.coords and self.world is other.world
+
+    def __hash__(self):
+        return hash(self.coords)
+
     def __repr__(self):
         return f"Cell {self.coords}"
 
@@ -762,54 +1168,93 @@ class WaterCell(Cell):
     WaterCells can't contain living being... for now...
     """
 
-    def __init__(self, coordinates:tuple):
-        super().__init__(coordinates = coordinates)
+    __slots__ = ()
 
     def getCellType(self):
         return "water"
     
     def __repr__(self):
         return f"WaterCell {self.coords}"
-    
+
+_NO_INHABITANTS = CellInhabitants()
+
 class LandCell(Cell):
     """
     LandCells host life
     """
 
-    def __init__(self, coordinates:tuple, vegetobPopulation: Vegetob):
-        super().__init__(coordinates = coordinates)
-        self.vegetob = vegetobPopulation
-        self.creatures = {
-            "Erbast" : [],
-            "Carviz" : []
-        }
-        self.deadCreatures = []
-        self.herd = None
-        self.prides = []
-        self.numErbast = 0
-        self.numCarviz = 0
-        self.numDeadCreatures = 0
+    __slots__ = ()
+
+    def _inhabitants(self) -> CellInhabitants:
+        """inhabitants of the cell, created when the cell is inhabited for the first time"""
+        inhabitants = self.world.inhabitants.get(self.coords)
+        if inhabitants is None:
+            inhabitants = self.world.inhabitants[self.coords] = CellInhabitants()
+        return inhabitants
+
+    @property
+    def creatures(self) -> dict[str, list]:
+        return self._inhabitants().creatures
+
+    @property
+    def deadCreatures(self) -> list:
+        return self._inhabitants().deadCreatures
+
+    @property
+    def herd(self) -> Union[Herd, None]:
+        return self.world.inhabitants.get(self.coords, _NO_INHABITANTS).herd
+
+    @herd.setter
+    def herd(self, herd:Union[Herd, None]):
+        self._inhabitants().herd = herd
+
+    @property
+    def prides(self) -> list:
+        return self._inhabitants().prides
+
+    @property
+    def numErbast(self) -> int:
+        return int(self.world.numErbast[self.coords])
+
+    @numErbast.setter
+    def numErbast(self, value:int):
+        self.world.numErbast[self.coords] = value
+        self.world.invalidateFields("numErbast")
+
+    @property
+    def numCarviz(self) -> int:
+        return int(self.world.numCarviz[self.coords])
+
+    @numCarviz.setter
+    def numCarviz(self, value:int):
+        self.world.numCarviz[self.coords] = value
+        self.world.invalidateFields("numCarviz")
+
+    @property
+    def numDeadCreatures(self) -> int:
+        return int(self.world.numDeadCreatures[self.coords])
+
+    @numDeadCreatures.setter
+    def numDeadCreatures(self, value:int):
+        self.world.numDeadCreatures[self.coords] = value
 
     def getVegetobDensity(self):
         """Get Vegetob Density in the cell"""
-        return self.vegetob.density
+        return self.world.getVegetob(self.coords)
     
     def growVegetob(self, times:int = 1):
         """Grow the Vegetob population in the cell"""
-        self.vegetob.grow(times)
+        self.world.setVegetob(self.coords, Vegetob.grow(self.getVegetobDensity(), times))
 
     def reduceVegetob(self, amount:int = 5):
+        """apply grazing effects on the Vegetob population in the cell"""
         if not isinstance(amount, int):
             raise TypeError(f"amount must be an integer, received {type(amount)}")
-        """apply grazing effects on the Vegetob population in the cell"""
-        self.vegetob.reduce(amount)
+        self.world.setVegetob(self.coords, Vegetob.reduce(self.getVegetobDensity(), amount))
 
     def addAnimal(self, animal:'Animal'):
         """add an animal from the inhabitants list"""
 
-        logging.info(f"Trying to add at coords: {self.coords}, the animal: {animal}, "
-             f"numErbast: {self.numErbast}, numCarviz: {self.numCarviz}, herd: {self.herd}")
-        
         if isinstance(animal, Erbast):
             if self.numErbast == 0:
                 self.creatures["Erbast"].append(animal)
@@ -838,10 +1283,6 @@ class LandCell(Cell):
     def removeAnimal(self, animal:'Animal'): 
         """Remove an animal from the inhabitants list"""
 
-        logging.info(f"Trying to remove at coords: {self.coords}, the animal: {animal}, "
-             f"numErbast: {self.numErbast}, numCarviz: {self.numCarviz}, herd: {self.herd}")
-
-
         if isinstance(animal, Erbast):
             if animal in self.creatures["Erbast"]:
 
@@ -859,7 +1300,6 @@ class LandCell(Cell):
                     self.creatures["Erbast"].clear()
                     self.numErbast = 0 # as addAnimal will increment it
                     self.herd = None
-                    logging.info(f"trying to remove {animal} from the cell {self}, herd: {self.herd}, numErbast: {self.numErbast}. The result of loseComponent is: {result}")
                     self.addAnimal(individuals[1])
 
                 elif self.numErbast > 2 and self.herd: 
@@ -887,8 +1327,6 @@ class LandCell(Cell):
         add a Herd or a Pride to the landCell and eventually resolve conflicts / join groups
         """
 
-        logging.info(f"trying to add group {group} at coords: {self.coords}, numErbast: {self.numErbast}, numCarviz: {self.numCarviz}, herd: {self.herd}")
-
         if isinstance(group, Herd):
             if self.herd is not None:
                 self.numErbast += group.numComponents
@@ -911,12 +1349,9 @@ class LandCell(Cell):
     def removeHerd(self, herd:'Herd'):
         """Remove the herd from the landCell"""
 
-        logging.info(f"Trying to remove herd {herd} at coords: {self.coords}, numErbast: {self.numErbast}, "
-             f"numCarviz: {self.numCarviz}, herd: {self.herd}")
-
-
         if self.herd is not None:
-            self.creatures["Erbast"] = [erb for erb in self.creatures["Erbast"] if erb not in herd.getComponents()]
+            components = set(herd.getComponents())
+            self.creatures["Erbast"] = [erb for erb in self.creatures["Erbast"] if erb not in components]
             self.numErbast -= self.herd.numComponents
             if self.numErbast < 2:
                 self.herd = None
@@ -929,25 +1364,104 @@ class LandCell(Cell):
     def removePride(self, pride:'Pride'):
         """Remove the pride from the landCell"""
 
-        logging.info(f"Trying to remove pride at coords: {self.coords}, numErbast: {self.numErbast}, "
-             f"numCarviz: {self.numCarviz}, herd: {self.herd}")
-
-
-        self.creatures["Carviz"] = [car for car in self.creatures["Carviz"] if car not in pride.getComponents()]
+        components = set(pride.getComponents())
+        self.creatures["Carviz"] = [car for car in self.creatures["Carviz"] if car not in components]
         self.numCarviz -= pride.numComponents
         self.prides.remove(pride)
 
+    def depart(self, movers:list[Species]):
+        """
+        Remove at once the individuals and groups leaving the cell during the movement phase.
+        The individuals leaving a group that stays in the cell are taken out of it first
+        """
+
+        leavers = defaultdict(dict) # group -> components leaving it, in moving order so that runs are reproducible
+        for o in movers:
+            if isinstance(o, Animal) and o.getSocialGroup() is not None:
+                leavers[o.getSocialGroup()][o] = None
+        for group, leaving in leavers.items():
+            group.loseComponents(leaving)
+
+        groups = set()
+        erbasts, carvizes = set(), set()
+        for o in movers:
+            if isinstance(o, SocialGroup):
+                groups.add(o)
+                (erbasts if isinstance(o, Herd) else carvizes).update(o.getComponents())
+            else:
+                (erbasts if isinstance(o, Erbast) else carvizes).add(o)
+
+        inhabitants = self._inhabitants()
+        if erbasts:
+            inhabitants.creatures["Erbast"] = [erb for erb in inhabitants.creatures["Erbast"] if erb not in erbasts]
+            self.numErbast = len(inhabitants.creatures["Erbast"])
+        if inhabitants.herd is not None and (inhabitants.herd in groups or inhabitants.herd.numComponents < 2):
+            inhabitants.herd = None
+        if carvizes:
+            inhabitants.creatures["Carviz"] = [car for car in inhabitants.creatures["Carviz"] if car not in carvizes]
+            self.numCarviz = len(inhabitants.creatures["Carviz"])
+        if inhabitants.prides:
+            # len of the components, SocialGroup.loseComponent leaves numComponents unchanged when it disbands a group
+            inhabitants.prides = [pride for pride in inhabitants.prides if pride not in groups and len(pride.getComponents()) >= 2]
+
+    def arrive(self, movers:list[Species]):
+        """
+        Add at once the individuals and groups entering the cell during the movement phase.
+        The erbasts of the cell end up in a single herd, the same one they would join arriving one at a time
+        """
+
+        inhabitants = self._inhabitants()
+        erbasts = []
+        for o in movers:
+            if isinstance(o, Pride): # pride logic handled by struggle
+                inhabitants.prides.append(o)
+                inhabitants.creatures["Carviz"].extend(o.getComponents())
+            elif isinstance(o, Carviz):
+                inhabitants.creatures["Carviz"].append(o)
+            else:
+                erbasts.append(o)
+        if len(erbasts) < len(movers):
+            self.numCarviz = len(inhabitants.creatures["Carviz"])
+        if not erbasts:
+            return
+
+        present = inhabitants.creatures["Erbast"]
+        herd = inhabitants.herd
+        joining = erbasts
+        if herd is None:
+            # the first herd arriving before two individuals meet keeps its identity, otherwise a new herd is formed
+            joining = present + erbasts
+            for i, o in enumerate(joining):
+                if isinstance(o, Herd):
+                    herd = o
+                    joining = joining[:i] + joining[i+1:]
+                    break
+                if i == 1:
+                    herd = Herd(joining[:2])
+                    joining = joining[2:]
+                    break
+
+        for o in erbasts:
+            if isinstance(o, Herd):
+                present.extend(o.getComponents())
+            else:
+                present.append(o)
+        if herd is not None:
+            herd.absorb(joining)
+            inhabitants.herd = herd
+        self.numErbast = len(present)
+
     def getErbastList(self):
         """Get a list of all Erbast inhabitants in the cell"""
-        return self.creatures["Erbast"]
+        return self.world.inhabitants.get(self.coords, _NO_INHABITANTS).creatures["Erbast"]
 
     def getCarvizList(self):
         """Get a list of all Carviz inhabitants in the cell"""
-        return self.creatures["Carviz"]
+        return self.world.inhabitants.get(self.coords, _NO_INHABITANTS).creatures["Carviz"]
     
     def getDeadCreaturesList(self):
         """Get a list of all DeadCreatures in the cell"""
-        return self.deadCreatures
+        return self.world.inhabitants.get(self.coords, _NO_INHABITANTS).deadCreatures
 
     def getCellType(self):
         return "land"
@@ -956,7 +1470,7 @@ class LandCell(Cell):
         return self.herd
     
     def getPrides(self):
-        return self.prides
+        return self.world.inhabitants.get(self.coords, _NO_INHABITANTS).prides
     
     def __repr__(self):
         return f"LandCell {self.coords}"